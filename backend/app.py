@@ -1,78 +1,49 @@
-﻿import os, json, time, asyncio, base64, mimetypes, logging
+﻿import os, json, time, asyncio, base64, hashlib, mimetypes, logging
 if __name__ == "__main__":
     raise SystemExit("Run with: python -m uvicorn backend.app:app --reload --port 8000")
+from contextlib import asynccontextmanager
 from datetime import datetime as dt, timezone
-from typing import Optional
+from typing import Any, Optional
 from typing import Tuple
 
-from fastapi import FastAPI, HTTPException, Header
-from typing import Optional
+from fastapi import APIRouter, FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.responses import Response
 from starlette.responses import JSONResponse
-import asyncio
+from starlette.responses import StreamingResponse
+from starlette.requests import Request
 import io
-import json
-import os
-import pytesseract
 import posixpath
 import httpx
 from pydantic import BaseModel
-from dotenv import load_dotenv
-from pathlib import Path
-_here = Path(__file__).parent
-load_dotenv(_here / ".env")              # backend/.env
-load_dotenv(_here.parent / ".env")       # project root .env (optional)
-load_dotenv()                            # process env fallback
-# --- Tesseract bootstrap (Windows-friendly) ---
-import os
-import pytesseract
-
-# Prefer explicit env; fall back to common install path
-tcmd = os.getenv("TESSERACT_CMD") or r"C:\\Program Files\\Tesseract-OCR\\tesseract.exe"
-
-# Make sure the process PATH includes the folder (some installs need this)
-tdir = os.path.dirname(tcmd)
-if tdir and os.path.isdir(tdir):
-    os.environ["PATH"] = tdir + os.pathsep + os.environ.get("PATH", "")
-
-# Tell pytesseract which exe to use
-pytesseract.pytesseract.tesseract_cmd = tcmd
-
-# Boot diagnostics
-print("[BOOT][tesseract] cmd =", repr(pytesseract.pytesseract.tesseract_cmd))
-try:
-    print("[BOOT][tesseract] version =", pytesseract.get_tesseract_version())
-except Exception as e:
-    print("[BOOT][tesseract] version_error =", e)
-# --- end bootstrap ---
 from io import BytesIO
-try:
-    from PIL import Image
-except Exception:
-    Image = None
 from .services import ocr  # ensure tests can monkeypatch backend.services.ocr
+from .ocr import cache as ocr_cache
+from .services import azure_read
+from .services import events as status_events
+from .services import bundle as graded_bundle
+from .services import graded_pdf
+from .services import pdf_regen
+from .services import jobs
+from .services import ocr_batch
+from .services import http as shared_http
+from .services import fastjson
+from .services.uploads import UploadRepository
+from .services.answer_keys import AnswerKeyStore
 # Local OCR provider: avoid heavy import (torch) at module import time
 _get_local_ocr_provider = None  # set by local import inside handler when needed
 def _normalize_local_text(t: str) -> str:
     return (t or "").strip()
-# Lazy-safe PDF flattener (reportlab may be unavailable)
-try:
-    from .services.report import flatten_to_pdf as _flatten_to_pdf
-except Exception:
-    def _flatten_to_pdf(*_args, **_kwargs):
+# Lazy-safe PDF flattener (reportlab may be unavailable; it loads on first use)
+from .services import report as _report
+def _flatten_to_pdf(*args, **kwargs):
+    try:
+        return _report.flatten_to_pdf(*args, **kwargs)
+    except ModuleNotFoundError:
         return None
 
 # --- Guarded imports so tests can run without these packages installed ---
 
-# Supabase Python client (create_client, Client)
-try:
-    from supabase import create_client, Client  # type: ignore
-except ModuleNotFoundError:
-    create_client = None  # type: ignore
-    class Client:         # minimal stub for type hints/tests
-        ...
-
 # Postgrest exception type (raised by supabase-py v2)
 try:
     from postgrest.exceptions import APIError as PostgrestAPIError  # type: ignore
@@ -81,34 +52,40 @@ except ModuleNotFoundError:
         ...
 
 # ---- Project config / services (keep your existing imports) ----
-from .config import HF_TOKEN, HF_MODEL_ID, OCR_PROVIDER, REQUIRE_OWNER, summary
+from .config import Settings, summary
 from .services.grader import (
     parse_questions,
     generate_autokeys,
     grade,
+    grade_many,
+    Graded,
     build_overlay_for_result,
     RUBRIC_VERSION,
     PROMPT_VERSION,
 )
 try:
-    from .regioner import infer_regions  # type: ignore
+    from .regioner import answer_sections, infer_regions  # type: ignore
     from .stamper import stamp_pdf       # type: ignore
 except Exception:
     # Fallback tiny shims if optional modules are unavailable
-    def infer_regions(ocr_boxes):  # type: ignore
+    def infer_regions(ocr_boxes, question_ids=None):  # type: ignore
         return {"q5": [], "q6a": [], "q6b": []}
-    def stamp_pdf(image_bytes, regions, verdicts):  # type: ignore
+    def answer_sections(ocr_boxes, question_ids=None):  # type: ignore
+        return ("", {})
+    def stamp_pdf(image_bytes, regions, verdicts, ocr_boxes=None):  # type: ignore
         return image_bytes
 
+
+def __getattr__(name: str):
+    # pytesseract (and PIL with it) loads on first use, not on import
+    if name == "pytesseract":
+        import pytesseract
+        return pytesseract
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # ---------------------------------------
-# App logger + env bootstrap
+# App logger + settings
 # ---------------------------------------
-_here = Path(__file__).resolve().parent
-# Load env from backend/.env explicitly (and keep process env intact)
-load_dotenv(_here / ".env")
-load_dotenv(_here.parent / ".env", override=False)  # optional parent fallback
-load_dotenv()
-
 logger = logging.getLogger("backend")
 if not logger.handlers:
     logging.basicConfig(
@@ -116,42 +93,52 @@ if not logger.handlers:
         format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     )
 
+# Read once per import; see backend/config.py for the variables
+settings = Settings.from_env()
+
 # OCR status constants (lowercase per tests)
 OCR_PENDING = "pending"
 OCR_RUNNING = "running"
 OCR_DONE    = "done"
 OCR_ERROR   = "error"
 
+HANDWRITINGOCR_MOCK = settings.handwritingocr_mock
+REQUIRE_OWNER = settings.require_owner
+OCR_PROVIDER = settings.ocr_provider
+DEV_MODE = settings.dev_mode
+_OCR_DEV: dict[str, dict] = {}
+
+# HF TrOCR via Inference API (helper config)
+SUBMISSIONS_BUCKET = settings.submissions_bucket
+HF_API_TOKEN = settings.hf_api_token
+TROCR_MODEL = settings.trocr_model
+
 # ---------------------------------------
-# Supabase client (lazy init; test-friendly)
+# Supabase clients (created by the lifespan hook; tests assign these)
 # ---------------------------------------
-# Now pull them in
-HANDWRITINGOCR_MOCK = os.getenv("HANDWRITINGOCR_MOCK", "1") == "1"
-REQUIRE_OWNER = os.getenv("REQUIRE_OWNER", "1") == "1"
-
-SUPABASE_URL = os.getenv("SUPABASE_URL") or None
-SUPABASE_KEY = os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE_KEY") or None
-SUPABASE_BUCKET = (
-    os.getenv("SUPABASE_BUCKET")
-    or os.getenv("SUPABASE_STORAGE_BUCKET")
-    or os.getenv("STORAGE_BUCKET")
-    or None
-)
-OCR_PROVIDER = (os.getenv("OCR_PROVIDER") or "mock").strip()
+supabase: Any = None
+supabase_sr: Any = None
 
-print("[boot] supabase url:", SUPABASE_URL)
-_key_preview = (str(SUPABASE_KEY)[:10] + "…") if SUPABASE_KEY else "<unset>"
-print("[boot] supabase key preview:", _key_preview)
 
-supabase: Client | None = None
-if create_client and SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception as e:
-        # In tests/offline CI this is fineâ€”tests will monkeypatch `app.supabase`
-        print("[boot] create_client failed (ignored for tests):", repr(e))
-        supabase = None
-print("[boot] supabase client:", "ready" if supabase else "NONE")
+def init_clients(s: Optional[Settings] = None) -> None:
+    """Create the Supabase client once; assigned clients are kept.
+
+    One service-role client serves both names: the RLS-bound reads and the
+    service-role writes used the same URL and key anyway.
+    """
+    global supabase, supabase_sr
+    s = s or settings
+    if supabase_sr is None and s.supabase_url and s.supabase_service_key:
+        try:
+            from supabase import create_client  # type: ignore
+            supabase_sr = create_client(s.supabase_url, s.supabase_service_key)
+        except Exception as e:
+            logger.warning("[boot] create_client failed: %r", e)
+    if supabase is None:
+        supabase = supabase_sr
+    if supabase_sr is None:
+        logger.warning("Missing SUPABASE_SERVICE_ROLE_KEY; SR client disabled. RLS reads/writes may fail.")
+
 
 def _require_supabase_config():
     """
@@ -161,184 +148,99 @@ def _require_supabase_config():
     if supabase is None:
         raise HTTPException(status_code=503, detail="Supabase client unavailable (tests may patch this)")
 
-print("[boot] supabase url:", SUPABASE_URL)
-_key_preview = (str(SUPABASE_KEY)[:10] + "…") if SUPABASE_KEY else "<unset>"
-print("[boot] supabase key preview:", _key_preview)
-
 
 class StartOCRBody(BaseModel):
     upload_id: str
     model: str | None = None
 
- # NOTE: tests will monkeypatch this global. Keep it as a simple module-level var.
-supabase: Client | None = None
-if create_client and SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    except Exception as e:
-        print("[boot] create_client failed (ignored for tests):", repr(e))
-        supabase = None
-print("[boot] supabase client:", "ready" if supabase else "NONE")
-
-# No-op Supabase stub to avoid crashes when env/client are missing.
-class _NoopSupa:
-    class _NoopResp:
-        def __init__(self):
-            self.data = None
-            self.error = None
-    class _NoopTable:
-        def insert(self, *a, **k): return self
-        def upsert(self, *a, **k): return self
-        def update(self, *a, **k): return self
-        def delete(self, *a, **k): return self
-        def select(self, *a, **k): return self
-        def eq(self, *a, **k): return self
-        def single(self): return self
-        def maybe_single(self): return self
-        def execute(self): return _NoopSupa._NoopResp()
-    class _NoopStorageBucket:
-        def create_signed_url(self, *a, **k): return {"signedURL": None}
-    class _NoopStorage:
-        def from_(self, *a, **k): return _NoopSupa._NoopStorageBucket()
-    def table(self, *_a, **_k): return _NoopSupa._NoopTable()
-    @property
-    def storage(self): return _NoopSupa._NoopStorage()
-
-if supabase is None:
+
+def _use_tesseract_dir(cmd: Optional[str]) -> None:
+    # Windows installs need the executable's folder on PATH
+    tdir = os.path.dirname(cmd or "")
+    if tdir and os.path.isdir(tdir) and tdir not in os.environ.get("PATH", "").split(os.pathsep):
+        os.environ["PATH"] = tdir + os.pathsep + os.environ.get("PATH", "")
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    s: Settings = app.state.settings
+    init_clients(s)
+    _use_tesseract_dir(s.tesseract_cmd)
+    logger.info(
+        "[boot] provider=%s bucket=%s supabase=%s dev_mode=%s origins=%s",
+        s.ocr_provider, s.submissions_bucket, bool(supabase), s.dev_mode, _allowed,
+    )
+    if s.ocr_provider.lower() == "trocr_local":
+        try:
+            import PIL  # noqa: F401
+        except ModuleNotFoundError:
+            logger.error("Pillow not installed; trocr_local requires pillow. pip install pillow")
+    # Warm OCR worker pool (OCR_POOL_WORKERS>0): models load once, off the request path
+    _ocr_pool = None
+    if s.ocr_provider.lower() in ("trocr_local", "trocr"):
+        from .ocr import pool as _ocr_pool
+        _ocr_pool.start_from_env()
+    # Job workers run in their own processes; relay their status writes
+    relay = None
+    if jobs.queue_enabled():
+        relay = asyncio.create_task(status_events.relay(
+            jobs.get_store(), on_event=lambda ev: uploads_repo.invalidate(ev["upload_id"])))
     try:
-        logger.warning("[boot] Supabase disabled; using no-op client")
-    except Exception:
-        print("[boot] Supabase disabled; using no-op client")
-    supabase = _NoopSupa()
-app = FastAPI()
-from fastapi.middleware.cors import CORSMiddleware
-FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
-ALT_ORIGINS = ["http://127.0.0.1:5173", "http://localhost:5173"]
-DEV_MODE = os.getenv("DEV_MODE", "0") not in ("0", "", "false", "False")
-_OCR_DEV: dict[str, dict] = {}
+        yield
+    finally:
+        if relay is not None:
+            relay.cancel()
+        if _ocr_pool is not None:
+            _ocr_pool.stop()
+        # Shared outbound HTTP pool (providers, signed-URL downloads)
+        await ocr_batch.stop()
+        await azure_read.stop()
+        await shared_http.aclose()
+
+
+# Routes register on the router; create_app() mounts it
+router = APIRouter()
 # Explicit CORS allowlist for Vite dev server
 _allowed = ["http://localhost:5173", "http://127.0.0.1:5173"]
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=_allowed,
-    allow_methods=["GET", "POST", "OPTIONS", "PATCH"],
-    allow_headers=["*"],
-    allow_credentials=True,
-    max_age=600,
-)
-logger.info("[boot] CORS installed first")
+
+
+def create_app(s: Optional[Settings] = None) -> FastAPI:
+    """The ASGI app: routes, CORS and the lifespan hook that creates clients."""
+    application = FastAPI(lifespan=_lifespan)
+    application.state.settings = s or settings
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=_allowed,
+        allow_methods=["GET", "POST", "OPTIONS", "PATCH"],
+        allow_headers=["*"],
+        allow_credentials=True,
+        max_age=600,
+    )
+    application.include_router(router)
+    return application
 
 # Explicit preflight for graded PDF endpoint
-@app.options("/api/uploads/{upload_id}/pdf")
+@router.options("/api/uploads/{upload_id}/pdf")
 def _preflight_pdf(upload_id: str) -> Response:
     return Response(status_code=200)
 
 # Generic OPTIONS handler for safety (CORS preflight)
-@app.options("/api/{path:path}")
+@router.options("/api/{path:path}")
 async def options_any(path: str) -> Response:
     return Response(status_code=204)
 
-# Boot summary line for quick verification
-try:
-    logger.info(
-        "[boot] env | SUPABASE_URL=%s KEY=%s BUCKET=%s | OCR_PROVIDER=%s | DEV_MODE=%s",
-        bool(SUPABASE_URL), bool(SUPABASE_KEY), bool(os.getenv("SUBMISSIONS_BUCKET")), OCR_PROVIDER, DEV_MODE,
-    )
-except Exception:
-    pass
-
 # Explicit preflight routes so nothing else intercepts
-@app.options("/api/ocr/start")
+@router.options("/api/ocr/start")
 def _preflight_start() -> Response:
     return Response(status_code=204)
 
-@app.options("/api/ocr/status/{_upload_id}")
+@router.options("/api/ocr/status/{_upload_id}")
 def _preflight_status(_upload_id: str) -> Response:
     return Response(status_code=204)
 
-logger.info("[boot] version=%s", "0.1.0")
-logger.info("[boot] SUPABASE_URL=%s", SUPABASE_URL)
-logger.info("[boot] CORS allow_origins=%s", _allowed)
-logger.info(
-    "[boot] OCR_PROVIDER=%s hf_token_present=%s",
-    (os.getenv("OCR_PROVIDER", "mock") or "mock"),
-    bool(os.getenv("HF_TOKEN")),
-)
-if (os.getenv("OCR_PROVIDER", "mock").lower() == "trocr_local") and (Image is None):
-    try:
-        logger.error("Pillow not installed; trocr_local requires pillow. pip install pillow")
-    except Exception:
-        pass
-logger.info("[boot] FRONTEND_ORIGIN=%s", FRONTEND_ORIGIN)
-logger.info("[boot] DEV_MODE=%s", "1" if DEV_MODE else "0")
-
-# Log the registered OCR read route for sanity
-try:
-    logger.info("[boot] GET /api/uploads/{id}/ocr ready (SR read)")
-except Exception:
-    pass
-
-# Supabase env + clients (top-level)
-# Explicit env loads as requested
-try:
-    load_dotenv("backend/.env")
-    load_dotenv(".env", override=False)
-except Exception:
-    pass
-
-# Normalize keys: treat SUPABASE_KEY as service-role, keep anon separate
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SR_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-ANON_KEY = os.getenv("SUPABASE_ANON_KEY")
-SUPABASE_BUCKET = (
-    os.getenv("SUPABASE_BUCKET")
-    or os.getenv("SUPABASE_STORAGE_BUCKET")
-    or os.getenv("STORAGE_BUCKET")
-    or None
-)
-
-# HF TrOCR via Inference API (helper config)
-SUBMISSIONS_BUCKET = os.getenv("SUBMISSIONS_BUCKET", "submissions")
-HF_API_TOKEN = os.getenv("HF_API_TOKEN")
-TROCR_MODEL = os.getenv("TROCR_MODEL", "microsoft/trocr-base-handwritten")
-
-_missing_url = not bool(SUPABASE_URL)
-_missing_key = not bool(ANON_KEY)
-_missing_bucket = not bool(SUBMISSIONS_BUCKET)
-if _missing_url or _missing_key or _missing_bucket:
-    logger.warning(
-        "Supabase env missing: URL=%s, KEY=%s, BUCKET=%s",
-        _missing_url,
-        _missing_key,
-        _missing_bucket,
-    )
-
-supabase_sr = (
-    create_client(SUPABASE_URL, SR_KEY)
-    if (create_client and SUPABASE_URL and SR_KEY)
-    else None
-)
-supabase = (
-    create_client(SUPABASE_URL, SR_KEY)
-    if (create_client and SUPABASE_URL and SR_KEY)
-    else None
-)
-bucket = os.getenv("SUBMISSIONS_BUCKET", "submissions")
-hf_token_present = bool(os.getenv("HF_API_TOKEN"))
-print("[BOOT] bucket=", bucket)
-print("[BOOT] provider=", os.getenv("OCR_PROVIDER"))
-print("[BOOT] trocr_model=", os.getenv("TROCR_MODEL"))
-print("[BOOT] has_service_role=", "yes" if os.getenv("SUPABASE_SERVICE_ROLE_KEY") else "no")
-print("[BOOT] hf_token_present=", hf_token_present)
-try:
-    logger.info("[boot] supabase_sr active=%s", bool(supabase_sr))
-except Exception:
-    pass
-if supabase_sr is None:
-    try:
-        logger.warning("Missing SUPABASE_SERVICE_ROLE_KEY; SR client disabled. RLS reads/writes may fail.")
-    except Exception:
-        pass
+# Short-TTL cache of uploads rows shared by the endpoints below
+uploads_repo = UploadRepository(lambda: supabase_sr or supabase)
+answer_keys = AnswerKeyStore(lambda: supabase_sr or supabase)
 
 # --- Supabase write helpers using service-role client ---
 def _sb_error_snapshot(resp):
@@ -369,6 +271,9 @@ def _update_upload_sr(uid: str, payload: dict):
         except Exception:
             pass
         raise HTTPException(status_code=500, detail="OCR persist failed (RLS?)")
+    uploads_repo.write_through(uid, payload, rows)
+    # Push ocr_status transitions to /api/ocr/events subscribers
+    status_events.publish(uid, payload, rows)
     return r
 
 # Override safe updater to route writes via service-role
@@ -381,13 +286,13 @@ def _utc_iso():
 
 BOOT_VERSION = "1.0.3"
 # â”€â”€ Health â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€â”€
-@app.get("/health")
-@app.get("/api/health")
+@router.get("/health")
+@router.get("/api/health")
 def health():
     return {"ok": True, "service": "graderai-ocr"}
 
-@app.get("/healthz")
-@app.get("/api/healthz")
+@router.get("/healthz")
+@router.get("/api/healthz")
 def healthz():
     return {"ok": True}
 
@@ -459,7 +364,7 @@ def resolve_upload_path(upload_id: str, owner_id: str | None = None) -> str | No
         return None
 
 # Debug config probe (no secrets)
-@app.get("/api/debug/config")
+@router.get("/api/debug/config")
 def debug_config():
     provider = OCR_PROVIDER
     return {
@@ -469,8 +374,43 @@ def debug_config():
         "supabase_ready": bool(supabase),
     }
 
+@router.get("/api/debug/ocr_pool")
+def debug_ocr_pool():
+    from .ocr.pool import get_pool as _get_ocr_pool
+    pool = _get_ocr_pool()
+    if pool is None:
+        return {"enabled": False, "queue_depth": 0}
+    return {"enabled": True, **pool.stats()}
+
+@router.get("/api/debug/http")
+def debug_http():
+    return shared_http.stats()
+
+@router.get("/api/debug/events")
+def debug_events():
+    return status_events.hub.stats()
+
+@router.get("/api/debug/pdf_regen")
+def debug_pdf_regen():
+    return pdf_regen.stats()
+
+@router.get("/api/debug/uploads_cache")
+def debug_uploads_cache():
+    return uploads_repo.stats()
+
+@router.get("/api/debug/answer_keys")
+def debug_answer_keys():
+    return answer_keys.stats()
+
+@router.get("/api/debug/ocr_batch")
+def debug_ocr_batch():
+    sched = ocr_batch.current()
+    return sched.stats() if sched else {"lanes": {}, "batches": 0}
+
 def _bytes_to_pil(b: bytes):
-    if not Image:
+    try:
+        from PIL import Image
+    except ModuleNotFoundError:
         raise RuntimeError("Pillow (PIL) is not installed; required for trocr_local.")
     return Image.open(BytesIO(b)).convert("RGB")
 
@@ -509,7 +449,131 @@ def _run_local_provider(provider, blob: bytes, storage_path: str, model_name: st
     except TypeError as e:
         raise
 
-@app.post("/api/ocr/start")
+def _persist_ocr_result(upload_id: str, text: str, boxes: dict, meta: dict) -> None:
+    # Persist boxes & text together in a single update
+    try:
+        _done = {
+            "extracted_text": text,
+            "ocr_boxes": boxes,
+            "ocr_meta": meta,
+            "ocr_completed_at": dt.utcnow().isoformat(),
+            "ocr_status": OCR_DONE,
+        }
+        _r = supabase.table("uploads").update(_done).eq("id", upload_id).execute()
+        uploads_repo.write_through(upload_id, _done, getattr(_r, "data", None))
+        status_events.publish(upload_id, _done, getattr(_r, "data", None))
+    except Exception as _e:
+        # Fallback to safe updater if needed
+        _safe_update_upload(upload_id, {
+            "extracted_text": text,
+            "ocr_boxes": boxes,
+            "ocr_meta": meta,
+            "ocr_completed_at": _utc_iso(),
+            "ocr_status": OCR_DONE,
+        })
+
+async def _ocr_run_upload(upload_id: str, storage_path: str, model: str | None = None) -> dict:
+    """
+    Run the configured OCR provider on one upload and persist text, boxes and
+    meta on its row. Shared by /api/ocr/start and the bulk scheduler.
+    """
+    prov = (os.getenv("OCR_PROVIDER") or "tesseract").strip().lower()
+
+    if prov == "tesseract":
+        result = await asyncio.to_thread(run_ocr_tesseract, storage_path)
+    elif prov in ("hf_trocr_api", "hf_tr_ocr_api"):
+        result = await run_ocr_hf_trocr_api(storage_path)
+    elif prov in ("azure", "azure_vision"):
+        result = await run_ocr_azure_vision(storage_path)
+    elif prov in ("trocr_local", "trocr"):
+        result = await asyncio.to_thread(run_ocr_trocr_local, storage_path, model)
+    else:
+        result = {"text": "", "meta": {"error": f"unknown_provider:{prov}"}}
+
+    text = result.get("text") or ""
+    meta = result.get("meta") or {}
+    boxes = result.get("boxes") or {}
+    status = OCR_DONE if text else OCR_ERROR
+    err = meta.get("error")
+
+    # Supabase calls block; keep them off the loop the scheduler lanes share
+    await asyncio.to_thread(_persist_ocr_result, upload_id, text, boxes, meta)
+
+    # Log counts
+    try:
+        pages = (boxes or {}).get("pages") or []
+        line_count = sum(len((p or {}).get("lines") or []) for p in pages)
+        logger.info("saved_ocr boxes_count=%s text_len=%s", line_count, len(text))
+    except Exception:
+        pass
+    return {"ok": True, "chars": len(text or ""), "status": status, "error": err}
+
+# --- Background jobs (JOBS_MODE=queue); run by `python -m backend.worker` ---
+def _enqueue_ocr_job(upload_id: str, owner_id: str | None, model: str | None = None) -> dict:
+    job = jobs.get_store().enqueue("ocr", upload_id=upload_id, owner_id=owner_id, payload={"model": model})
+    _safe_update_upload(upload_id, {
+        "ocr_status": jobs.QUEUED,
+        "ocr_updated_at": _utc_iso(),
+        "ocr_error": None,
+    })
+    return {"ok": True, "status": jobs.QUEUED, "upload_id": upload_id, "job_id": job["id"]}
+
+async def _job_ocr(job: dict) -> dict:
+    upload_id = job["upload_id"]
+    client = supabase_sr or supabase
+    row = await asyncio.to_thread(_select_upload_row, client, upload_id) if client else None
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    storage_path = row.get("storage_path")
+    if not storage_path:
+        raise HTTPException(status_code=400, detail="Missing storage_path")
+    await asyncio.to_thread(_safe_update_upload, upload_id, {
+        "ocr_status": OCR_RUNNING,
+        "ocr_started_at": _utc_iso(),
+        "ocr_updated_at": _utc_iso(),
+        "ocr_error": None,
+    })
+    result = await _ocr_run_upload(upload_id, storage_path, (job.get("payload") or {}).get("model"))
+    if result.get("status") != OCR_DONE:
+        raise RuntimeError(result.get("error") or "ocr returned empty text")
+    return result
+
+async def _job_grade(job: dict) -> dict:
+    row = uploads_repo.get(job["upload_id"], supabase)
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    payload, _grade_json = await _grade_upload(row, job.get("owner_id"))
+    return payload
+
+def _job_failed(job: dict, error: str, final: bool) -> None:
+    """Reflect a failed attempt on the upload row (retrying -> queued)."""
+    if job.get("kind") != "ocr" or not job.get("upload_id"):
+        return
+    fields = {"ocr_error": error, "ocr_updated_at": _utc_iso()}
+    if final:
+        fields.update({"ocr_status": OCR_ERROR, "ocr_completed_at": _utc_iso()})
+    else:
+        fields["ocr_status"] = jobs.QUEUED
+    try:
+        _safe_update_upload(job["upload_id"], fields)
+    except Exception as e:
+        logger.warning("job status write-back failed job=%s: %s", job.get("id"), e)
+
+JOB_HANDLERS = {"ocr": _job_ocr, "grade": _job_grade}
+
+@router.get("/api/jobs/{job_id}")
+def job_status(
+    job_id: str,
+    x_owner_id: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
+    job = jobs.get_store().get(job_id)
+    owner = x_owner_id or x_user_id
+    if not job or ((not DEV_MODE) and REQUIRE_OWNER and str(job.get("owner_id")) != str(owner)):
+        return JSONResponse(status_code=404, content={"detail": "not_found"})
+    return jobs.public(job)
+
+@router.post("/api/ocr/start")
 async def ocr_start(
     body: StartOCRBody,
     x_owner_id: Optional[str] = Header(None),
@@ -586,74 +650,26 @@ async def ocr_start(
         except Exception:
             pass
         try:
-            resp0 = (
-                client
-                .table("uploads")
-                .select("id, owner_id, storage_path, mime_type, extracted_text, ocr_status, ocr_error, ocr_boxes, graded_pdf_path, verdicts")
-                .eq("id", upload_id)
-                .limit(1)
-                .execute()
-            )
-            rows = (getattr(resp0, "data", None) or [])
+            row = uploads_repo.get(upload_id, client)
         except Exception as e:
             logger.error("uploads.select failed id=%s: %s", upload_id, e, exc_info=True)
             raise HTTPException(status_code=500, detail={"detail": "internal_error", "message": "uploads.select failed"})
-        if not rows:
+        if not row:
             raise HTTPException(status_code=404, detail="Upload not found")
-        row = rows[0]
 
         # Provider selection based on OCR_PROVIDER
         storage_path = row.get("storage_path")
         if not storage_path:
             raise HTTPException(status_code=400, detail="Missing storage_path")
+        if jobs.queue_enabled():
+            return _enqueue_ocr_job(upload_id, caller_id, body.model)
         _safe_update_upload(upload_id, {
             "ocr_status": "running",
             "ocr_started_at": _utc_iso(),
             "ocr_updated_at": _utc_iso(),
             "ocr_error": None,
         })
-        prov = (os.getenv("OCR_PROVIDER") or "tesseract").strip().lower()
-
-        if prov == "tesseract":
-            result = await asyncio.to_thread(run_ocr_tesseract, storage_path)
-        elif prov in ("hf_trocr_api", "hf_tr_ocr_api"):
-            result = await asyncio.to_thread(run_ocr_hf_trocr_api, storage_path)
-        elif prov in ("azure", "azure_vision"):
-            result = await run_ocr_azure_vision(storage_path)
-        else:
-            result = {"text": "", "meta": {"error": f"unknown_provider:{prov}"}}
-
-        text = result.get("text") or ""
-        meta = result.get("meta") or {}
-        boxes = result.get("boxes") or {}
-        status = OCR_DONE if text else OCR_ERROR
-        err = meta.get("error")
-
-        # Persist boxes & text together in a single update
-        try:
-            supabase.table("uploads").update({
-                "extracted_text": text,
-                "ocr_boxes": boxes,
-                "ocr_completed_at": dt.utcnow().isoformat(),
-                "ocr_status": OCR_DONE,
-            }).eq("id", upload_id).execute()
-        except Exception as _e:
-            # Fallback to safe updater if needed
-            _safe_update_upload(upload_id, {
-                "extracted_text": text,
-                "ocr_boxes": boxes,
-                "ocr_completed_at": _utc_iso(),
-                "ocr_status": OCR_DONE,
-            })
-
-        # Log counts
-        try:
-            pages = (boxes or {}).get("pages") or []
-            line_count = sum(len((p or {}).get("lines") or []) for p in pages)
-            logger.info("saved_ocr boxes_count=%s text_len=%s", line_count, len(text))
-        except Exception:
-            pass
-        return {"ok": True, "chars": len(text or ""), "status": status, "error": err}
+        return await _ocr_run_upload(upload_id, storage_path, body.model)
 
         # trocr_local: download bytes from Storage and run provider
         if (os.getenv("OCR_PROVIDER", "mock").lower() == "trocr_local"):
@@ -1068,7 +1084,143 @@ def _ocr_status_common(upload_id: str, owner_id: Optional[str]):
     updated = row.get("ocr_updated_at") or row.get("updated_at")
     return {"status": status, "updated_at": updated}
 
-@app.get("/api/ocr/status")
+class BatchOCRBody(BaseModel):
+    upload_ids: list[str]
+    model: str | None = None
+
+def _ocr_provider_name() -> str:
+    return (os.getenv("OCR_PROVIDER") or "tesseract").strip().lower()
+
+async def _ocr_batch_item(upload_id: str, batch) -> dict:
+    """Scheduler runner: authz + path lookup for one upload, then OCR it.
+    Supabase calls run in threads so one lane never stalls the others."""
+    client = supabase_sr or supabase
+    row = await asyncio.to_thread(_select_upload_row, client, upload_id) if client else None
+    # Hide other owners' uploads behind not_found, like the status endpoint
+    if not row or ((not DEV_MODE) and REQUIRE_OWNER and batch.owner_id and str(row.get("owner_id")) != str(batch.owner_id)):
+        return {"status": OCR_ERROR, "error": "not_found"}
+    storage_path = row.get("storage_path")
+    if not storage_path:
+        return {"status": OCR_ERROR, "error": "missing_storage_path"}
+    await asyncio.to_thread(_safe_update_upload, upload_id, {
+        "ocr_status": OCR_RUNNING,
+        "ocr_started_at": _utc_iso(),
+        "ocr_updated_at": _utc_iso(),
+        "ocr_error": None,
+    })
+    return await _ocr_run_upload(upload_id, storage_path, batch.model)
+
+@router.post("/api/ocr/batch", status_code=202)
+async def ocr_batch_start(
+    body: BatchOCRBody,
+    x_owner_id: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
+    """
+    Queue OCR for many uploads at once and return a batch id immediately.
+    Progress: GET /api/ocr/batch/{batch_id}.
+    """
+    owner = x_owner_id or x_user_id
+    if REQUIRE_OWNER and not DEV_MODE and not owner:
+        raise HTTPException(status_code=401, detail="Missing owner id")
+    ids = [str(u) for u in body.upload_ids if u]
+    if not ids:
+        raise HTTPException(status_code=400, detail="upload_ids is required")
+    if len(ids) > ocr_batch.max_items():
+        raise HTTPException(status_code=413, detail=f"At most {ocr_batch.max_items()} uploads per batch")
+    batch = ocr_batch.get_scheduler(_ocr_batch_item).submit(owner, ids, _ocr_provider_name(), body.model)
+    return batch.progress()
+
+@router.get("/api/ocr/batch/{batch_id}")
+def ocr_batch_status(
+    batch_id: str,
+    items: bool = False,
+    x_owner_id: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
+    sched = ocr_batch.current()
+    batch = sched.get(batch_id) if sched else None
+    owner = x_owner_id or x_user_id
+    if batch is None or ((not DEV_MODE) and REQUIRE_OWNER and str(batch.owner_id) != str(owner)):
+        return JSONResponse(status_code=404, content={"detail": "not_found"})
+    return batch.to_dict() if items else batch.progress()
+
+class StatusBatchBody(BaseModel):
+    upload_ids: list[str]
+
+@router.post("/api/ocr/status:batch")
+def ocr_status_batch(
+    body: StatusBatchBody,
+    x_owner_id: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Statuses for many uploads in one round-trip:
+      {"statuses": {upload_id: {status, text_len[, error]}}, "not_found": [...]}
+    Same contract and owner rule as GET /api/ocr/status/{upload_id}; uploads
+    owned by someone else are reported as not_found. Responses carry an ETag;
+    send it back as If-None-Match to get 304 when nothing changed.
+    """
+    owner = x_owner_id or x_user_id
+    ids = list(dict.fromkeys(str(u) for u in body.upload_ids if u))
+    if len(ids) > ocr_batch.max_items():
+        raise HTTPException(status_code=413, detail=f"At most {ocr_batch.max_items()} ids per request")
+
+    statuses: dict = {}
+    pending_ids = ids
+    if DEV_MODE:
+        for uid in ids:
+            d = _OCR_DEV.get(uid)
+            if d is not None:
+                st = str(d.get("status") or "pending").lower()
+                st = {"running": "processing", "error": "failed"}.get(st, st)
+                statuses[uid] = {"status": st, "text_len": len((d.get("text") or "").strip())}
+        pending_ids = [uid for uid in ids if uid not in statuses]
+
+    check_owner = (not DEV_MODE) and REQUIRE_OWNER and owner
+    for row in _safe_select_statuses(pending_ids):
+        if check_owner and str(row.get("owner_id")) != str(owner):
+            continue
+        statuses[str(row.get("id"))] = _derive_status(row)
+
+    payload = {
+        "statuses": {uid: statuses[uid] for uid in ids if uid in statuses},
+        "not_found": [uid for uid in ids if uid not in statuses],
+    }
+    etag = '"' + hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
+@router.get("/api/ocr/events")
+async def ocr_events(
+    request: Request,
+    owner_id: Optional[str] = None,
+    x_owner_id: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events stream of OCR status transitions for all of the
+    caller's uploads. EventSource can't set headers, so the owner may also
+    be passed as ?owner_id=. Reconnects resume from Last-Event-ID.
+    """
+    owner = x_owner_id or x_user_id or owner_id
+    if not owner:
+        raise HTTPException(status_code=401, detail="Missing owner id")
+    try:
+        resume = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume = None
+    return StreamingResponse(
+        status_events.stream(status_events.hub, str(owner), resume, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/api/ocr/status")
 def ocr_status_q(
     upload_id: str,
     x_owner_id: Optional[str] = Header(None),
@@ -1076,7 +1228,7 @@ def ocr_status_q(
 ):
     return _ocr_status_common(upload_id, x_owner_id or x_user_id)
 
-@app.get("/api/ocr/status/{upload_id}")
+@router.get("/api/ocr/status/{upload_id}")
 def ocr_status_path(
     upload_id: str,
     x_owner_id: Optional[str] = Header(None),
@@ -1102,33 +1254,12 @@ def ocr_status_path(
         if (not DEV_MODE) and REQUIRE_OWNER and owner and str(row.get("owner_id")) != str(owner):
             return JSONResponse(status_code=404, content={"detail": "not_found"})
 
-        # Compute status per contract
-        has_err = bool(row.get("ocr_error"))
-        text = (row.get("extracted_text") or row.get("ocr_text") or "").strip()
-        text_len = len(text)
-        has_completed = bool(row.get("ocr_completed_at")) or text_len > 0
-        has_started = bool(row.get("ocr_started_at"))
-
-        if has_err:
-            st = "failed"
-        elif has_completed:
-            st = "done"
-        elif has_started:
-            st = "processing"
-        else:
-            st = "pending"
-
-        payload = {"status": st, "text_len": text_len if text_len else 0}
-        if st == "failed":
-            err = row.get("ocr_error")
-            if err:
-                payload["error"] = err
-        return payload
+        return _derive_status(row)
     except Exception:
         # Never return 500 for status; treat as not found to keep UI resilient
         return JSONResponse(status_code=404, content={"detail": "not_found"})
     
-@app.get("/api/config")
+@router.get("/api/config")
 def config_probe():
     return summary(safe=True)
 
@@ -1160,17 +1291,9 @@ def _is_uuid(val: str) -> bool:
     
 def _select_upload_row(supabase, upload_id: str):
     """
-    Returns dict(row) or None. Converts Supabase 'maybe_single' responses safely.
+    Returns dict(row) or None. Full row, served from uploads_repo when fresh.
     """
-    resp = (
-        supabase.table("uploads")
-        .select("id, owner_id, storage_path, status, extracted_text, graded_pdf_path, ocr_boxes, verdicts")
-        .eq("id", upload_id)
-        .maybe_single()
-        .execute()
-    )
-    # supabase-py returns resp.data=None when not found
-    return resp.data if getattr(resp, "data", None) else None
+    return uploads_repo.get(upload_id, supabase)
 
 
 # --- Safe DB helpers to avoid 500s on transient PostgREST errors ---
@@ -1179,15 +1302,59 @@ def _safe_update_upload(uid: str, payload: dict):
     return _update_upload_sr(uid, payload)
 
 
+_STATUS_COLUMNS = "id,owner_id,status,extracted_text,ocr_status,ocr_error,ocr_started_at,ocr_completed_at,ocr_updated_at,graded_pdf_path"
+STATUS_BATCH_CHUNK = 200  # ids per .in_() query; keeps the PostgREST URL short
+
+def _derive_status(row: dict) -> dict:
+    """Status contract shared by the single and batch status endpoints."""
+    has_err = bool(row.get("ocr_error"))
+    text = (row.get("extracted_text") or row.get("ocr_text") or "").strip()
+    text_len = len(text)
+    has_completed = bool(row.get("ocr_completed_at")) or text_len > 0
+    has_started = bool(row.get("ocr_started_at"))
+
+    if has_err:
+        st = "failed"
+    elif has_completed:
+        st = "done"
+    elif has_started:
+        st = "processing"
+    else:
+        st = "pending"
+
+    payload = {"status": st, "text_len": text_len if text_len else 0}
+    if st == "failed":
+        err = row.get("ocr_error")
+        if err:
+            payload["error"] = err
+    return payload
+
+def _safe_select_statuses(uids: list[str]) -> list[dict]:
+    """Status rows for many uploads, one .in_() query per chunk of ids."""
+    if not supabase or not uids:
+        return []
+    rows: list[dict] = []
+    for i in range(0, len(uids), STATUS_BATCH_CHUNK):
+        try:
+            r = (
+                supabase.table("uploads")
+                .select(_STATUS_COLUMNS)
+                .in_("id", uids[i:i + STATUS_BATCH_CHUNK])
+                .execute()
+            )
+        except PostgrestAPIError as e:
+            logger.warning("safe_select_statuses failed: %s", e)
+            continue
+        rows.extend(getattr(r, "data", None) or [])
+    return rows
+
 def _safe_select_status(uid: str):
     try:
         if not supabase:
             return None
         r = (
             supabase.table("uploads")
-            .select(
-                "id,owner_id,status,extracted_text,ocr_status,ocr_error,ocr_started_at,ocr_completed_at,ocr_updated_at,graded_pdf_path"
-            )
+            .select(_STATUS_COLUMNS)
             .eq("id", uid)
             .execute()
         )
@@ -1235,11 +1402,16 @@ def _download_bytes_from_storage(storage_path: str) -> bytes:
         raise RuntimeError(f"Not Found: bucket={bucket} rel='{rel_path}'")
     return blob
 
-def run_ocr_hf_trocr_api(storage_path: str):
-    img_bytes = _download_bytes_from_storage(storage_path)
+async def run_ocr_hf_trocr_api(storage_path: str):
+    img_bytes = await asyncio.to_thread(_download_bytes_from_storage, storage_path)
+    ckey, cached = ocr_cache.lookup(img_bytes, "hf_trocr_api", TROCR_MODEL)
+    if cached:
+        cached["meta"]["source"] = storage_path
+        return cached
     api = f"https://api-inference.huggingface.co/models/{TROCR_MODEL}"
     headers = {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
-    r = httpx.post(api, headers=headers, content=img_bytes, timeout=45)
+    async with shared_http.client(timeout=45) as client:
+        r = await client.post(api, headers=headers, content=img_bytes)
     meta = {"provider": "hf_trocr_api", "model": TROCR_MODEL, "source": storage_path, "status": r.status_code}
     if r.status_code >= 400:
         meta["error"] = r.text[:500]
@@ -1248,37 +1420,97 @@ def run_ocr_hf_trocr_api(storage_path: str):
     text = " ".join(d.get("generated_text", "") for d in data) if isinstance(data, list) else ""
     if not text:
         meta["warn"] = f"Unexpected HF response: {str(data)[:300]}"
-    return {"text": text.strip(), "meta": meta}
+        return {"text": "", "meta": meta}
+    return ocr_cache.store(ckey, {"text": text.strip(), "meta": meta})
 
-def run_ocr_tesseract(storage_path: str):
-    import io, numpy as np
-    from PIL import Image, ImageOps, ImageFilter
+def run_ocr_trocr_local(storage_path: str, model_name: str | None = None):
+    """
+    Local TrOCR via backend.ocr.run_ocr. With OCR_SEGMENT=lines the provider
+    returns per-line boxes in meta; lift them out so they persist as ocr_boxes.
+    """
+    from .ocr.run_ocr import get_provider, normalize
+    from .ocr.pool import get_pool as _get_ocr_pool
     blob = _download_bytes_from_storage(storage_path)
-    im = Image.open(io.BytesIO(blob)).convert("L")
+    # Prefer the warm worker pool; fall back to an in-process provider
+    provider = _get_ocr_pool()
+    if provider is None:
+        _name, _model, provider = get_provider("trocr_local")
+    text, meta = _run_local_provider(provider, blob, storage_path, model_name)
+    meta = dict(meta or {})
+    boxes = meta.pop("ocr_boxes", None)
+    meta.setdefault("provider", "trocr_local")
+    return {"text": normalize(text), "meta": meta, "boxes": boxes}
+
+# Bump when _tesseract_page preprocessing changes (invalidates cached results)
+_TESSERACT_PREPROC = "autocontrast2-x2-unsharp"
+
+def _tesseract_page(im):
+    from PIL import ImageOps, ImageFilter
+    from .ocr import tesseract as _tess
 
     # lightweight preproc (works well for faint pencil)
     im = ImageOps.autocontrast(im, cutoff=2)      # boost contrast
     im = im.resize((im.width*2, im.height*2))     # upsample helps LSTM
     im = im.filter(ImageFilter.UnsharpMask(radius=2, percent=120, threshold=3))
 
-    cfgs = [
-        "--oem 1 --psm 7 -l eng",    # single line
-        "--oem 1 --psm 11 -l eng",   # sparse text
-        "--oem 1 --psm 6 -l eng",    # block
-        "--oem 1 --psm 13 -l eng",   # raw line
-    ]
-    best = {"text": "", "meta": {"provider":"tesseract", "tried": cfgs, "chosen": None}}
-    for cfg in cfgs:
-        try:
-            txt = pytesseract.image_to_string(im, config=cfg) or ""
-        except Exception as e:
-            best["meta"].setdefault("errors", []).append(f"{cfg}: {e}")
-            continue
-        if len(txt.strip()) > len(best["text"].strip()):
-            best["text"] = txt.strip()
-            best["meta"]["chosen"] = cfg
+    # PSM configs run in parallel on a bounded pool; early exit on high confidence
+    try:
+        best = _tess.sweep(im, tesseract_cmd=settings.tesseract_cmd)
+    finally:
+        im.close()
+    # boxes come back in upsampled coordinates; map to the page
+    for ln in best["lines"]:
+        ln["bbox"] = [v // 2 for v in ln["bbox"]]
     return best
 
+def run_ocr_tesseract(storage_path: str):
+    """
+    Tesseract over every page. PDFs are rasterized one page at a time
+    (OCR_PDF_DPI) and each page is released once recognized.
+    """
+    from .ocr.pages import iter_pages
+    from .ocr import tesseract as _tess
+    from .ocr.pages import pdf_dpi
+    blob = _download_bytes_from_storage(storage_path)
+    ckey, cached = ocr_cache.lookup(blob, "tesseract", _tess.sweep_signature(), f"{_TESSERACT_PREPROC}:dpi{pdf_dpi()}")
+    if cached:
+        return cached
+    texts: list[str] = []
+    pages_meta: list[dict] = []
+    boxes = {"width": None, "height": None, "unit": "pixel", "pages": []}
+    for number, im in iter_pages(blob, os.path.basename(storage_path or ""), mode="L"):
+        res = _tesseract_page(im)
+        txt = res["text"]
+        if txt:
+            texts.append(txt)
+        pm = res["meta"]
+        pages_meta.append({
+            "number": number,
+            "chosen": pm.get("chosen"),
+            "early_exit": pm.get("early_exit"),
+            "text_len": len(txt),
+            "timings_ms": pm.get("timings_ms"),
+            "confidences": pm.get("confidences"),
+            **({"errors": pm["errors"]} if pm.get("errors") else {}),
+        })
+        boxes["pages"].append({"number": number, "width": im.width, "height": im.height, "text": txt, "lines": res.get("lines") or []})
+        if boxes["width"] is None:
+            boxes["width"], boxes["height"] = im.width, im.height
+    wins: dict[str, int] = {}
+    for pm in pages_meta:
+        if pm["chosen"]:
+            wins[pm["chosen"]] = wins.get(pm["chosen"], 0) + 1
+    meta = {
+        "provider": "tesseract",
+        "tried": _tess.CONFIGS,
+        "chosen": pages_meta[0]["chosen"] if pages_meta else None,
+        "wins": wins,
+        "page_count": len(pages_meta),
+        "pages": pages_meta,
+    }
+    result = {"text": "\n\n".join(texts), "meta": meta, "boxes": boxes}
+    return ocr_cache.store(ckey, result) if texts else result
+
 async def run_ocr_azure_vision(storage_path: str):
     """
     Azure Computer Vision Read v3.2 via REST.
@@ -1290,14 +1522,18 @@ async def run_ocr_azure_vision(storage_path: str):
     if not endpoint or not key:
         return {"text": "", "meta": {"provider": "azure_vision", "error": "missing_endpoint_or_key"}}
 
-    img_bytes = _download_bytes_from_storage(storage_path)
+    # storage client is sync; keep the event loop free for the other lanes
+    img_bytes = await asyncio.to_thread(_download_bytes_from_storage, storage_path)
     if not img_bytes:
         return {"text": "", "meta": {"provider": "azure_vision", "error": "empty_image_bytes"}}
+    ckey, cached = ocr_cache.lookup(img_bytes, "azure_vision", "read-v3.2")
+    if cached:
+        return cached
 
     analyze_url = f"{endpoint}/vision/v3.2/read/analyze"
     headers = {"Ocp-Apim-Subscription-Key": key, "Content-Type": "application/octet-stream"}
 
-    async with httpx.AsyncClient(timeout=45) as client:
+    async with shared_http.client(timeout=45) as client:
         resp = await client.post(analyze_url, headers=headers, content=img_bytes)
         if resp.status_code not in (200, 202):
             return {"text": "", "meta": {"provider": "azure_vision", "status": resp.status_code, "error": resp.text}}
@@ -1305,95 +1541,105 @@ async def run_ocr_azure_vision(storage_path: str):
         if not op_loc:
             return {"text": "", "meta": {"provider": "azure_vision", "error": "missing_operation_location"}}
 
-        for _ in range(20):
-            await asyncio.sleep(0.75)
-            r = await client.get(op_loc, headers={"Ocp-Apim-Subscription-Key": key})
-            data = r.json()
-            status = (data.get("status") or "").lower()
-            if status == "failed":
-                return {"text": "", "meta": {"provider": "azure_vision", "status": status, "result": data}}
-            if status == "succeeded":
-                # Build text and minimal ocr_boxes structure (tolerant to v3/v4 shapes)
-                try:
-                    ar = data.get("analyzeResult", {}) or {}
-                    pages_v4 = ar.get("pages") or []
-                    read_results = ar.get("readResults") or []
-
-                    text_lines: list[str] = []
-                    ocr_boxes = {"width": None, "height": None, "unit": None, "pages": []}
-
-                    if pages_v4:
-                        # Prefer v4 pages shape
-                        first = pages_v4[0]
-                        ocr_boxes["width"] = first.get("width")
-                        ocr_boxes["height"] = first.get("height")
-                        ocr_boxes["unit"] = first.get("unit") or "pixel"
-                        for p in pages_v4:
-                            lines_out = []
-                            for ln in (p.get("lines") or []):
-                                txt = ln.get("content") or ln.get("text") or ""
-                                if txt:
-                                    text_lines.append(txt)
-                                poly = ln.get("polygon") or ln.get("boundingBox") or []
-                                try:
-                                    xs = [float(poly[i]) for i in range(0, len(poly), 2)]
-                                    ys = [float(poly[i]) for i in range(1, len(poly), 2)]
-                                    if xs and ys:
-                                        min_x, min_y = min(xs), min(ys)
-                                        max_x, max_y = max(xs), max(ys)
-                                        bbox = [min_x, min_y, max_x - min_x, max_y - min_y]
-                                    else:
-                                        bbox = None
-                                except Exception:
-                                    bbox = None
-                                lines_out.append({"text": txt, "bbox": bbox})
-                            ocr_boxes["pages"].append({
-                                "number": p.get("pageNumber") or p.get("page") or None,
-                                "lines": lines_out,
-                            })
-                    elif read_results:
-                        # Legacy v3 readResults lines
-                        first = read_results[0] if read_results else {}
-                        # No width/height/unit in v3 readResults; leave None
-                        for pg in read_results:
-                            lines_out = []
-                            for ln in (pg.get("lines") or []):
-                                txt = ln.get("text") or ln.get("content") or ""
-                                if txt:
-                                    text_lines.append(txt)
-                                poly = ln.get("boundingBox") or ln.get("polygon") or []
-                                try:
-                                    xs = [float(poly[i]) for i in range(0, len(poly), 2)]
-                                    ys = [float(poly[i]) for i in range(1, len(poly), 2)]
-                                    if xs and ys:
-                                        min_x, min_y = min(xs), min(ys)
-                                        max_x, max_y = max(xs), max(ys)
-                                        bbox = [min_x, min_y, max_x - min_x, max_y - min_y]
-                                    else:
-                                        bbox = None
-                                except Exception:
-                                    bbox = None
-                                lines_out.append({"text": txt, "bbox": bbox})
-                            ocr_boxes["pages"].append({
-                                "number": pg.get("page") or None,
-                                "lines": lines_out,
-                            })
-                    else:
-                        # Unknown shape; return raw
-                        return {"text": "", "meta": {"provider": "azure_vision", "status": status, "raw": data}}
+    from .ocr.pages import page_count
+    # opening a PDF with fitz blocks; count pages off the loop
+    pages = await asyncio.to_thread(page_count, img_bytes, storage_path)
+    try:
+        data = await azure_read.get_poller().wait(
+            op_loc,
+            key,
+            pages=pages,
+            retry_after=resp.headers.get("retry-after"),
+        )
+    except azure_read.ReadDeadlineExceeded as e:
+        return {"text": "", "meta": {"provider": "azure_vision", "error": "timeout", "polls": e.polls, "deadline_s": e.deadline_s}}
+    except azure_read.ReadError as e:
+        return {"text": "", "meta": {"provider": "azure_vision", "status": e.status_code, "error": e.body}}
+    status = (data.get("status") or "").lower()
+    if status == "failed":
+        return {"text": "", "meta": {"provider": "azure_vision", "status": status, "result": data}}
+    if status == "succeeded":
+        # Build text and minimal ocr_boxes structure (tolerant to v3/v4 shapes)
+        try:
+            ar = data.get("analyzeResult", {}) or {}
+            pages_v4 = ar.get("pages") or []
+            read_results = ar.get("readResults") or []
+
+            text_lines: list[str] = []
+            ocr_boxes = {"width": None, "height": None, "unit": None, "pages": []}
+
+            if pages_v4:
+                # Prefer v4 pages shape
+                first = pages_v4[0]
+                ocr_boxes["width"] = first.get("width")
+                ocr_boxes["height"] = first.get("height")
+                ocr_boxes["unit"] = first.get("unit") or "pixel"
+                for p in pages_v4:
+                    lines_out = []
+                    for ln in (p.get("lines") or []):
+                        txt = ln.get("content") or ln.get("text") or ""
+                        if txt:
+                            text_lines.append(txt)
+                        poly = ln.get("polygon") or ln.get("boundingBox") or []
+                        try:
+                            xs = [float(poly[i]) for i in range(0, len(poly), 2)]
+                            ys = [float(poly[i]) for i in range(1, len(poly), 2)]
+                            if xs and ys:
+                                min_x, min_y = min(xs), min(ys)
+                                max_x, max_y = max(xs), max(ys)
+                                bbox = [min_x, min_y, max_x - min_x, max_y - min_y]
+                            else:
+                                bbox = None
+                        except Exception:
+                            bbox = None
+                        lines_out.append({"text": txt, "bbox": bbox})
+                    ocr_boxes["pages"].append({
+                        "number": p.get("pageNumber") or p.get("page") or None,
+                        "lines": lines_out,
+                    })
+            elif read_results:
+                # Legacy v3 readResults lines
+                first = read_results[0] if read_results else {}
+                # No width/height/unit in v3 readResults; leave None
+                for pg in read_results:
+                    lines_out = []
+                    for ln in (pg.get("lines") or []):
+                        txt = ln.get("text") or ln.get("content") or ""
+                        if txt:
+                            text_lines.append(txt)
+                        poly = ln.get("boundingBox") or ln.get("polygon") or []
+                        try:
+                            xs = [float(poly[i]) for i in range(0, len(poly), 2)]
+                            ys = [float(poly[i]) for i in range(1, len(poly), 2)]
+                            if xs and ys:
+                                min_x, min_y = min(xs), min(ys)
+                                max_x, max_y = max(xs), max(ys)
+                                bbox = [min_x, min_y, max_x - min_x, max_y - min_y]
+                            else:
+                                bbox = None
+                        except Exception:
+                            bbox = None
+                        lines_out.append({"text": txt, "bbox": bbox})
+                    ocr_boxes["pages"].append({
+                        "number": pg.get("page") or None,
+                        "lines": lines_out,
+                    })
+            else:
+                # Unknown shape; return raw
+                return {"text": "", "meta": {"provider": "azure_vision", "status": status, "raw": data}}
 
-                except Exception as e:
-                    return {"text": "", "meta": {"provider": "azure_vision", "status": status, "parse_error": str(e), "raw": data}}
+        except Exception as e:
+            return {"text": "", "meta": {"provider": "azure_vision", "status": status, "parse_error": str(e), "raw": data}}
 
-                return {
-                    "text": "\n".join(text_lines).strip(),
-                    "meta": {"provider": "azure_vision", "status": status},
-                    "boxes": ocr_boxes,
-                }
-        return {"text": "", "meta": {"provider": "azure_vision", "error": "timeout"}}
+        return ocr_cache.store(ckey, {
+            "text": "\n".join(text_lines).strip(),
+            "meta": {"provider": "azure_vision", "status": status},
+            "boxes": ocr_boxes,
+        })
+    return {"text": "", "meta": {"provider": "azure_vision", "status": status, "raw": data}}
 
 async def _download_bytes(url: str) -> bytes:
-    async with httpx.AsyncClient(timeout=60) as client:
+    async with shared_http.client(timeout=60) as client:
         r = await client.get(url)
         r.raise_for_status()
         return r.content
@@ -1444,7 +1690,7 @@ async def _call_handwritingocr(image_bytes: bytes, signed_url: str) -> dict:
         "imageBase64",
         "b64",
     ]
-    async with httpx.AsyncClient(timeout=120) as client:
+    async with shared_http.client(timeout=120) as client:
         # If not in debug mode and a specific method is configured, use only that exact combo
         if not HANDWRITINGOCR_DEBUG and HANDWRITINGOCR_METHOD != "auto":
             H = header_sets[0]
@@ -1567,7 +1813,33 @@ class StartGradeBody(BaseModel):
     upload_id: str
 
 
-@app.post("/api/grade")
+def _grading_key(row: dict, text: str):
+    """(questions, keys, rubric_version) to grade an upload with: its
+    assignment's compiled key, else derived from the submission's text."""
+    key = answer_keys.get(row.get("assignment_id"))
+    if key is not None:
+        return key.questions, key.keys, key.rubric_version
+    questions = parse_questions(text)
+    return questions, generate_autokeys(questions), RUBRIC_VERSION
+
+
+def _answer_sections(row: dict, questions) -> Optional[tuple]:
+    """Per-question answer text from the upload's OCR line boxes, or None
+    (grade the whole text) when there are no boxes or no numbered lines."""
+    boxes = row.get("ocr_boxes")
+    try:
+        if isinstance(boxes, str):
+            boxes = json.loads(boxes)
+        if not isinstance(boxes, dict) or not boxes.get("pages"):
+            return None
+        sections = answer_sections(boxes, [q.id for q in questions])
+    except Exception as e:
+        logger.warning("answer_sections failed upload=%s: %s", row.get("id"), e)
+        return None
+    return sections if sections[1] else None
+
+
+@router.post("/api/grade")
 async def start_grade(
     body: StartGradeBody,
     x_owner_id: Optional[str] = Header(None),
@@ -1577,19 +1849,23 @@ async def start_grade(
     caller_id = x_owner_id or x_user_id
 
     # 1) Fetch upload and authz
-    resp = (
-        supabase.table("uploads")
-        .select("*")
-        .eq("id", body.upload_id)
-        .maybe_single()
-        .execute()
-    )
-    row = resp.data
+    row = _select_upload_row(supabase, body.upload_id)
     if not row:
         raise HTTPException(404, "Upload not found")
     if not _owner_matches(row, caller_id):
         raise HTTPException(403, "Forbidden")
 
+    if jobs.queue_enabled():
+        job = jobs.get_store().enqueue("grade", upload_id=str(row["id"]), owner_id=caller_id)
+        return {"ok": True, "status": "queued", "upload_id": row["id"], "job_id": job["id"]}
+    payload, grade_json = await _grade_upload(row, caller_id)
+    # the grade goes out exactly as encoded for the DB write
+    return fastjson.response({k: v for k, v in payload.items() if k != "grade"}, grade=grade_json)
+
+
+async def _grade_upload(row: dict, caller_id: Optional[str]) -> tuple[dict, bytes]:
+    """OCR (if needed), grade, render and store artifacts for one upload row.
+    Returns the response payload and the grade encoded as JSON once."""
     # 2) Ensure we have OCR text (perform OCR inline if missing)
     text = (row.get("extracted_text") or "").strip()
     if not text:
@@ -1690,10 +1966,9 @@ async def start_grade(
             row["ocr_error"] = str(e)
             raise HTTPException(status_code=500, detail=f"OCR failed: {e}")
 
-    # 3) Parse -> autokey -> grade
-    questions = parse_questions(text)
-    keys = generate_autokeys(questions)
-    result: GradeResult = grade(questions, keys, text)
+    # 3) Assignment key (or parse -> autokey) -> grade
+    questions, keys, rubric_version = _grading_key(row, text)
+    result: Graded = grade(questions, keys, text, _answer_sections(row, questions))
     result.submission_id = row["id"]
 
     # mark needs_review if OCR looked weak
@@ -1706,7 +1981,7 @@ async def start_grade(
         result.needs_review = True
 
     # Stamp versions
-    result.rubric_version = RUBRIC_VERSION
+    result.rubric_version = rubric_version
     result.prompt_version = PROMPT_VERSION
 
     # 4) Build overlay and (placeholder) PDF
@@ -1741,6 +2016,8 @@ async def start_grade(
         logger.warning("pdf upload failed: %s", e)
 
     # 6) Update DB row with grading metadata
+    graded = result.to_dict()
+    grade_json = fastjson.dumps(graded)
     try:
         verdicts = [
             {
@@ -1749,7 +2026,7 @@ async def start_grade(
                 "score": i.score,
                 "max_score": i.max_score,
             }
-            for i in getattr(result, "items", [])
+            for i in result.items
         ]
         supabase.table("uploads").update({
             "rubric_version": result.rubric_version,
@@ -1757,9 +2034,10 @@ async def start_grade(
             "needs_review": result.needs_review,
             "graded_pdf_path": pdf_key,
             "overlay_path": overlay_key,
-            "grade_json": json.dumps(result.model_dump()),
+            "grade_json": grade_json.decode("utf-8"),
             "verdicts": verdicts,
         }).eq("id", row["id"]).execute()
+        uploads_repo.invalidate(row["id"])
     except Exception as e:
         logger.warning("uploads update failed: %s", e)
 
@@ -1771,10 +2049,10 @@ async def start_grade(
         "needs_review": result.needs_review,
         "overlay_path": overlay_key,
         "graded_pdf_path": pdf_key,
-        "grade": result.model_dump(),
-    }
+        "grade": graded,
+    }, grade_json
 
-@app.options("/api/grade")
+@router.options("/api/grade")
 async def grade_options() -> Response:
     return Response(status_code=200)
 
@@ -1784,42 +2062,106 @@ class StartGradeStartBody(BaseModel):
     text: str | None = None
 
 
-@app.post("/api/grade/start")
+@router.post("/api/grade/start")
 def start_grade_start(
     body: StartGradeStartBody,
     x_user_id: Optional[str] = Header(None),
     x_owner_id: Optional[str] = Header(None),
 ):
     caller_id = x_owner_id or x_user_id
-    resp = (
-        supabase.table("uploads")
-        .select("id, owner_id, extracted_text, ocr_text, graded_pdf_path, verdicts")
-        .eq("id", body.upload_id)
-        .maybe_single()
-        .execute()
-    )
-    row = resp.data
+    row = _select_upload_row(supabase, body.upload_id)
     if not row:
         raise HTTPException(status_code=404, detail="Upload not found")
     if REQUIRE_OWNER and caller_id and str(row.get("owner_id")) != str(caller_id):
         raise HTTPException(status_code=403, detail="Forbidden")
 
     student_text = (body.text or row.get("extracted_text") or row.get("ocr_text") or "").strip()
-    qs = parse_questions(student_text)
-    keys = generate_autokeys(qs)
-    result = grade(qs, keys, student_text)
-    return {
+    qs, keys, _rubric_version = _grading_key(row, student_text)
+    # explicit text overrides the stored OCR, boxes included
+    sections = None if body.text else _answer_sections(row, qs)
+    result = grade(qs, keys, student_text, sections)
+    return fastjson.response({
         "ok": True,
         "total_score": result.total_score,
-        "items": [item.model_dump() for item in result.items],
-    }
+        "items": [item.to_dict() for item in result.items],
+    })
+
+
+class BatchGradeBody(BaseModel):
+    upload_ids: list[str]
+    include_items: bool = False  # per-question grades (built only when asked for)
+
+
+_GRADE_BATCH_COLUMNS = "id, owner_id, user_id, assignment_id, extracted_text, ocr_text, ocr_boxes"
+
+
+def _grade_batch_max() -> int:
+    return int(os.getenv("GRADE_BATCH_MAX") or 500)
+
+
+@router.post("/api/grade/batch")
+def grade_batch(
+    body: BatchGradeBody,
+    x_user_id: Optional[str] = Header(None),
+    x_owner_id: Optional[str] = Header(None),
+):
+    """Grade many uploads' OCR text without storage writes. Uploads sharing
+    an assignment answer key are scored together in one columnar pass."""
+    _require_supabase_config()
+    caller_id = x_owner_id or x_user_id
+    ids = list(dict.fromkeys(str(u) for u in body.upload_ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Missing upload_ids")
+    if len(ids) > _grade_batch_max():
+        raise HTTPException(status_code=413, detail={"detail": "batch_too_large", "max": _grade_batch_max()})
+
+    q = supabase.table("uploads").select(_GRADE_BATCH_COLUMNS).in_("id", ids)
+    if REQUIRE_OWNER and caller_id:
+        q = q.eq("owner_id", caller_id)
+    try:
+        found = {str(r["id"]): r for r in getattr(q.execute(), "data", None) or []}
+    except PostgrestAPIError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request: {getattr(e, 'message', str(e))}")
+
+    skipped = []
+    groups: dict = {}  # id(keys) -> (questions, keys, rubric_version, [(upload_id, text, sections)])
+    for uid in ids:
+        row = found.get(uid)
+        if row is None:
+            skipped.append({"upload_id": uid, "error": "Upload not found"})
+            continue
+        text = (row.get("extracted_text") or row.get("ocr_text") or "").strip()
+        if not text:
+            skipped.append({"upload_id": uid, "error": "OCR text missing — run OCR"})
+            continue
+        questions, keys, rubric_version = _grading_key(row, text)
+        sections = _answer_sections(row, questions)
+        groups.setdefault(id(keys), (questions, keys, rubric_version, []))[3].append((uid, text, sections))
+
+    results = {}
+    for questions, keys, rubric_version, members in groups.values():
+        grades = grade_many(questions, keys, [m[1] for m in members], [m[2] for m in members])
+        totals, review = grades.totals, grades.needs_review
+        for i, (uid, _text, _sections) in enumerate(members):
+            out = {
+                "upload_id": uid,
+                "total_score": float(totals[i]),
+                "total_max": float(len(questions)),
+                "needs_review": bool(review[i]),
+                "rubric_version": rubric_version,
+            }
+            if body.include_items:
+                out["items"] = [item.to_dict() for item in grades.result(i).items]
+            results[uid] = out
+
+    return fastjson.response({"ok": True, "results": [results[u] for u in ids if u in results], "skipped": skipped})
 
 
 class VerdictsBody(BaseModel):
     per_question: dict[str, str]
 
 
-@app.post("/api/uploads/{upload_id}/verdicts")
+@router.post("/api/uploads/{upload_id}/verdicts")
 def set_upload_verdicts(
     upload_id: str,
     body: VerdictsBody,
@@ -1829,14 +2171,7 @@ def set_upload_verdicts(
     _require_supabase_config()
     caller_id = x_owner_id or x_user_id
 
-    resp = (
-        supabase.table("uploads")
-        .select("id, owner_id, verdicts")
-        .eq("id", upload_id)
-        .maybe_single()
-        .execute()
-    )
-    row = getattr(resp, "data", None)
+    row = _select_upload_row(supabase, upload_id)
     if not row:
         raise HTTPException(status_code=404, detail="Upload not found")
     if REQUIRE_OWNER and caller_id and str(row.get("owner_id")) != str(caller_id):
@@ -1852,11 +2187,12 @@ def set_upload_verdicts(
         if k:
             norm[str(k)] = val
 
-    supabase.table("uploads").update({"verdicts": norm}).eq("id", row["id"]).execute()
+    r = supabase.table("uploads").update({"verdicts": norm}).eq("id", row["id"]).execute()
+    uploads_repo.write_through(row["id"], {"verdicts": norm}, getattr(r, "data", None))
     return {"status": "ok", "verdicts": norm}
 
 
-@app.post("/api/uploads/{upload_id}/pdf")
+@router.post("/api/uploads/{upload_id}/pdf")
 def build_stamped_pdf(
     upload_id: str,
     x_user_id: Optional[str] = Header(None),
@@ -1867,14 +2203,7 @@ def build_stamped_pdf(
     caller_id = x_owner_id or x_user_id
     try:
         # Fetch upload row and authz
-        resp = (
-            supabase.table("uploads")
-            .select("id, owner_id, storage_path, ocr_boxes, verdicts")
-            .eq("id", upload_id)
-            .maybe_single()
-            .execute()
-        )
-        row = getattr(resp, "data", None)
+        row = _select_upload_row(supabase, upload_id)
         if not row:
             raise HTTPException(status_code=404, detail="Upload not found")
         if REQUIRE_OWNER and caller_id and str(row.get("owner_id")) != str(caller_id):
@@ -1889,50 +2218,69 @@ def build_stamped_pdf(
         if not storage_path:
             raise HTTPException(status_code=404, detail="Missing storage_path")
 
-        # Download original submission bytes from submissions bucket
-        original_bytes = _download_bytes_from_storage(storage_path)
-
-        # Build regions and stamp the PDF
-        regions = infer_regions(row.get("ocr_boxes"))
-        pdf_bytes = stamp_pdf(original_bytes, regions, row.get("verdicts"))
+        # Stamp (or restamp only the changed verdicts of) the cached PDF
+        regen = pdf_regen.regenerate(
+            str(row["id"]),
+            storage_path=storage_path,
+            ocr_boxes=row.get("ocr_boxes"),
+            verdicts=row.get("verdicts"),
+            load_original=lambda: _download_bytes_from_storage(storage_path),
+            infer_regions=infer_regions,
+        )
+        pdf_bytes = regen.pdf_bytes
+        timings = dict(regen.timings_ms)
 
         # Upload to graded-pdfs bucket under graded/{owner}/{id}.pdf
         owner_id = row.get("owner_id") or caller_id or "unknown"
         key = f"graded/{owner_id}/{row['id']}.pdf"
         bucket = "graded-pdfs"
-        try:
-            # Log size before upload
-            try:
-                logger.info("graded_pdf_bytes=%s path=%s", len(pdf_bytes or b""), key)
-            except Exception:
-                pass
-            supabase.storage.from_(bucket).upload(
-                key,
-                pdf_bytes,
-                {"content-type": "application/pdf", "upsert": True},
-            )
-        except Exception as e:
+        if regen.mode == pdf_regen.UNCHANGED and row.get("graded_pdf_path") == key:
+            pass  # stored object already has these marks
+        else:
+            t_up = time.perf_counter()
             try:
-                logger.exception("graded upload failed: %s", e)
-            except Exception:
-                pass
-            raise HTTPException(status_code=500, detail=f"upload_failed: {e}")
+                # Log size before upload
+                try:
+                    logger.info("graded_pdf_bytes=%s path=%s mode=%s", len(pdf_bytes or b""), key, regen.mode)
+                except Exception:
+                    pass
+                supabase.storage.from_(bucket).upload(
+                    key,
+                    pdf_bytes,
+                    {"content-type": "application/pdf", "upsert": True},
+                )
+            except Exception as e:
+                try:
+                    logger.exception("graded upload failed: %s", e)
+                except Exception:
+                    pass
+                raise HTTPException(status_code=500, detail=f"upload_failed: {e}")
 
-        # Update DB and sign URL
-        try:
-            supabase.table("uploads").update({
-                "graded_pdf_path": key,
-                "ocr_updated_at": _utc_iso(),
-            }).eq("id", row["id"]).execute()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"persist_failed: {e}")
+            # Update DB and sign URL
+            try:
+                supabase.table("uploads").update({
+                    "graded_pdf_path": key,
+                    "ocr_updated_at": _utc_iso(),
+                }).eq("id", row["id"]).execute()
+                uploads_repo.invalidate(row["id"])
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"persist_failed: {e}")
+            timings["upload_ms"] = int((time.perf_counter() - t_up) * 1000)
+            timings["total_ms"] += timings["upload_ms"]
+        pdf_regen.record(regen.mode, timings["total_ms"])
 
         try:
             signed = supabase.storage.from_(bucket).create_signed_url(key, 86400)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"sign_url_failed: {e}")
 
-        return {"path": key, "signedUrl": (signed or {}).get("signedURL")}
+        return {
+            "path": key,
+            "signedUrl": (signed or {}).get("signedURL"),
+            "mode": regen.mode,
+            "changed": regen.changed,
+            "timings_ms": timings,
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -1943,7 +2291,155 @@ def build_stamped_pdf(
         raise HTTPException(status_code=500, detail=f"pdf_error: {e}")
 
 
-@app.get("/api/uploads/{upload_id}/pdf/debug")
+class AnswerKeyBody(BaseModel):
+    text: str  # the teacher's key sheet, numbered like the worksheet
+    answers: Optional[dict[str, str]] = None  # question id -> answer, overrides the sheet
+    rubric_version: Optional[str] = None
+
+
+def _answer_key_payload(key) -> dict:
+    return {
+        "assignment_id": key.assignment_id,
+        "rubric_version": key.rubric_version,
+        "questions": [q.model_dump() for q in key.questions],
+        "keys": [k.model_dump() for k in key.keys],
+    }
+
+
+@router.put("/api/assignments/{assignment_id}/answer-key")
+def put_answer_key(
+    assignment_id: str,
+    body: AnswerKeyBody,
+    x_user_id: Optional[str] = Header(None),
+    x_owner_id: Optional[str] = Header(None),
+):
+    """Compile the assignment's answer key once; every submission of the
+    assignment is then graded against it."""
+    _require_supabase_config()
+    caller_id = x_owner_id or x_user_id
+    if not (body.text or "").strip():
+        raise HTTPException(status_code=400, detail="Missing key text")
+    current = answer_keys.get(assignment_id)
+    if REQUIRE_OWNER and caller_id and current and current.owner_id and current.owner_id != str(caller_id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        key = answer_keys.save(assignment_id, body.text, body.answers, body.rubric_version, caller_id)
+    except PostgrestAPIError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request: {getattr(e, 'message', str(e))}")
+    if not key.questions:
+        logger.info("answer key for assignment=%s has no numbered questions", assignment_id)
+    return {"ok": True, **_answer_key_payload(key)}
+
+
+@router.get("/api/assignments/{assignment_id}/answer-key")
+def get_answer_key(
+    assignment_id: str,
+    x_user_id: Optional[str] = Header(None),
+    x_owner_id: Optional[str] = Header(None),
+):
+    _require_supabase_config()
+    caller_id = x_owner_id or x_user_id
+    key = answer_keys.get(assignment_id)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Answer key not found")
+    if REQUIRE_OWNER and caller_id and key.owner_id and key.owner_id != str(caller_id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return _answer_key_payload(key)
+
+
+class GradedBundleBody(BaseModel):
+    format: str = "pdf"  # "pdf" (one merged file) | "zip" (one PDF per student)
+    upload_ids: Optional[list[str]] = None  # subset of the assignment, in this order
+
+
+_BUNDLE_COLUMNS = "id, owner_id, assignment_id, storage_path, original_name, ocr_boxes, verdicts"
+
+def _stamp_for_bundle(row: dict) -> bytes:
+    storage_path = row["storage_path"]
+    return pdf_regen.regenerate(
+        str(row["id"]),
+        storage_path=storage_path,
+        ocr_boxes=row.get("ocr_boxes"),
+        verdicts=row.get("verdicts"),
+        load_original=lambda: _download_bytes_from_storage(storage_path),
+        infer_regions=infer_regions,
+    ).pdf_bytes
+
+
+@router.post("/api/assignments/{assignment_id}/graded-bundle")
+async def build_graded_bundle(
+    assignment_id: str,
+    body: Optional[GradedBundleBody] = None,
+    x_user_id: Optional[str] = Header(None),
+    x_owner_id: Optional[str] = Header(None),
+):
+    """Graded PDFs for a whole class set: one merged PDF or a zip of
+    per-student PDFs, stamped in parallel and streamed from disk."""
+    _require_supabase_config()
+    caller_id = x_owner_id or x_user_id
+    body = body or GradedBundleBody()
+    fmt = (body.format or "pdf").lower()
+    if fmt not in ("pdf", "zip"):
+        raise HTTPException(status_code=400, detail={"detail": "invalid_format", "allowed": ["pdf", "zip"]})
+
+    q = supabase.table("uploads").select(_BUNDLE_COLUMNS).eq("assignment_id", assignment_id)
+    if caller_id:
+        q = q.eq("owner_id", caller_id)
+    try:
+        rows = getattr(q.execute(), "data", None) or []
+    except PostgrestAPIError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request: {getattr(e, 'message', str(e))}")
+    if body.upload_ids is not None:
+        by_id = {str(r.get("id")): r for r in rows}
+        rows = [by_id[str(u)] for u in dict.fromkeys(body.upload_ids) if str(u) in by_id]
+    else:
+        rows.sort(key=lambda r: (str(r.get("original_name") or "").lower(), str(r.get("id"))))
+    if not rows:
+        raise HTTPException(status_code=404, detail="No uploads in assignment")
+    if len(rows) > graded_bundle.max_uploads():
+        raise HTTPException(status_code=413, detail={"detail": "bundle_too_large", "max": graded_bundle.max_uploads()})
+
+    skip = {}
+    for r in rows:
+        if not r.get("storage_path"):
+            skip[str(r["id"])] = "missing storage_path"
+        elif not r.get("ocr_boxes"):
+            skip[str(r["id"])] = "OCR boxes missing — run OCR"
+        elif not r.get("verdicts"):
+            skip[str(r["id"])] = "Verdicts not set"
+
+    bundle = graded_bundle.Bundle(rows, _stamp_for_bundle, skip)
+    bundle.start()
+    filename = f"assignment-{assignment_id}-graded"
+    if fmt == "zip":
+        return StreamingResponse(
+            graded_bundle.zip_stream(bundle),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.zip"', "X-Bundle-Count": str(len(rows))},
+        )
+
+    try:
+        items = await bundle.all()
+        included = [it for it in items if it.path]
+        if not included:
+            raise HTTPException(status_code=409, detail={"detail": "nothing_to_bundle", **graded_bundle.manifest(items)})
+        merged = await asyncio.to_thread(bundle.merge, items)
+    except BaseException:
+        bundle.close()
+        raise
+    return StreamingResponse(
+        graded_bundle.pdf_stream(bundle, merged),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}.pdf"',
+            "Content-Length": str(os.path.getsize(merged)),
+            "X-Bundle-Count": str(len(included)),
+            "X-Bundle-Skipped": ",".join(it.upload_id for it in items if not it.path),
+        },
+    )
+
+
+@router.get("/api/uploads/{upload_id}/pdf/debug")
 def debug_download_graded_pdf(
     upload_id: str,
     x_user_id: Optional[str] = Header(None),
@@ -1953,14 +2449,7 @@ def debug_download_graded_pdf(
     _require_supabase_config()
     caller_id = x_owner_id or x_user_id
     try:
-        resp = (
-            supabase.table("uploads")
-            .select("id, owner_id, graded_pdf_path")
-            .eq("id", upload_id)
-            .maybe_single()
-            .execute()
-        )
-        row = getattr(resp, "data", None)
+        row = _select_upload_row(supabase, upload_id)
         if not row:
             raise HTTPException(status_code=404, detail="Upload not found")
         if REQUIRE_OWNER and caller_id and str(row.get("owner_id")) != str(caller_id):
@@ -1983,8 +2472,37 @@ def debug_download_graded_pdf(
         raise HTTPException(status_code=500, detail=f"pdf_debug_error: {e}")
 
 
+@router.get("/api/uploads/{upload_id}/graded.pdf")
+async def download_graded_pdf(
+    upload_id: str,
+    request: Request,
+    x_user_id: Optional[str] = Header(None),
+    x_owner_id: Optional[str] = Header(None),
+):
+    """Stream the graded PDF from the local cache with ETag/Range support."""
+    _require_supabase_config()
+    caller_id = x_owner_id or x_user_id
+    row = _select_upload_row(supabase, upload_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if REQUIRE_OWNER and caller_id and str(row.get("owner_id")) != str(caller_id):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    path = row.get("graded_pdf_path")
+    if not path:
+        raise HTTPException(status_code=404, detail="No graded_pdf_path")
+
+    # Both PDF writers bump one of these when they replace the object
+    key = graded_pdf.version_key(path, row.get("ocr_updated_at"), row.get("grade_json"))
+    try:
+        entry = await graded_pdf.fetch(supabase.storage, "graded-pdfs", path, key)
+    except Exception as e:
+        logger.warning("graded_pdf fetch failed id=%s path=%s: %s", upload_id, path, e)
+        raise HTTPException(status_code=502, detail="graded_pdf_download_failed")
+    return graded_pdf.respond(entry, request.headers, f"graded-{row['id']}.pdf")
+
+
 # Upload deletion (storage-first, then DB)
-@app.delete("/api/uploads/{upload_id}")
+@router.delete("/api/uploads/{upload_id}")
 async def delete_upload(upload_id: str):
 
     try:
@@ -2011,6 +2529,7 @@ async def delete_upload(upload_id: str):
     # 2) Delete DB row
     try:
         supabase.table("uploads").delete().eq("id", upload_id).execute()
+        uploads_repo.invalidate(upload_id)
     except PostgrestAPIError as e:
         raise HTTPException(status_code=400, detail=f"DB delete failed: {getattr(e, 'message', str(e))}")
 
@@ -2018,7 +2537,7 @@ async def delete_upload(upload_id: str):
 
 
 
-@app.get("/api/uploads/{id}/ocr")
+@router.get("/api/uploads/{id}/ocr")
 async def get_upload_ocr(
     id: str,
     x_owner_id: Optional[str] = Header(None),
@@ -2042,15 +2561,7 @@ async def get_upload_ocr(
         pass
 
     # SR-only read for RLS-protected table
-    resp = (
-        supabase_sr
-        .table("uploads")
-        .select("id, owner_id, ocr_text, extracted_text, ocr_meta, ocr_status, ocr_error, ocr_boxes")
-        .eq("id", upload_id)
-        .maybe_single()
-        .execute()
-    )
-    row = getattr(resp, "data", None)
+    row = _select_upload_row(supabase_sr, upload_id)
     if not row:
         raise HTTPException(status_code=404, detail="Not found")
 
@@ -2084,3 +2595,4 @@ async def get_upload_ocr(
     return payload
 
 
+app = create_app()
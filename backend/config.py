@@ -1,10 +1,38 @@
 # backend/config.py
+"""
+Environment-backed settings, read in one place.
+
+``load_env()`` reads backend/.env and then the project root .env, once per
+process, without overriding variables that are already set.
+``Settings.from_env()`` snapshots what the app reads at startup; it only
+looks at ``os.environ``, so building one is cheap and side-effect free.
+"""
 import os
-from dotenv import load_dotenv; load_dotenv()
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+_HERE = Path(__file__).resolve().parent
+_env_loaded = False
+
+
+def load_env() -> None:
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    load_dotenv(_HERE / ".env")         # backend/.env
+    load_dotenv(_HERE.parent / ".env")  # project root .env (optional)
+
+
+load_env()
 
 # Product defaults (in code)
 DEFAULT_OCR_PROVIDER = "hf"
 DEFAULT_HF_MODEL_ID  = "microsoft/trocr-base-handwritten"  # <- your default
+WINDOWS_TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
 # Secrets/flags (env or .env)
 HF_TOKEN      = os.getenv("HF_TOKEN")              # required for HF
@@ -12,6 +40,41 @@ OCR_PROVIDER  = os.getenv("OCR_PROVIDER", DEFAULT_OCR_PROVIDER)
 HF_MODEL_ID   = os.getenv("HF_MODEL_ID", DEFAULT_HF_MODEL_ID)
 REQUIRE_OWNER = os.getenv("REQUIRE_OWNER", "1") == "1"
 
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default) not in ("0", "", "false", "False")
+
+
+@dataclass(frozen=True)
+class Settings:
+    supabase_url: Optional[str]
+    supabase_service_key: Optional[str]  # SUPABASE_SERVICE_ROLE_KEY, else SUPABASE_KEY
+    submissions_bucket: str
+    ocr_provider: str
+    tesseract_cmd: Optional[str]  # None: "tesseract" on PATH
+    hf_api_token: Optional[str]
+    trocr_model: str
+    dev_mode: bool
+    require_owner: bool
+    handwritingocr_mock: bool
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        load_env()
+        return cls(
+            supabase_url=os.getenv("SUPABASE_URL") or None,
+            supabase_service_key=os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY") or None,
+            submissions_bucket=os.getenv("SUBMISSIONS_BUCKET", "submissions"),
+            ocr_provider=(os.getenv("OCR_PROVIDER") or "mock").strip(),
+            tesseract_cmd=os.getenv("TESSERACT_CMD") or (WINDOWS_TESSERACT_CMD if os.name == "nt" else None),
+            hf_api_token=os.getenv("HF_API_TOKEN"),
+            trocr_model=os.getenv("TROCR_MODEL", "microsoft/trocr-base-handwritten"),
+            dev_mode=_flag("DEV_MODE", "0"),
+            require_owner=os.getenv("REQUIRE_OWNER", "1") == "1",
+            handwritingocr_mock=os.getenv("HANDWRITINGOCR_MOCK", "1") == "1",
+        )
+
+
 def summary(safe: bool = True) -> dict:
     out = {
         "ocr_provider": OCR_PROVIDER,
@@ -35,6 +35,7 @@ class QuestionGrade(BaseModel):
     criteria: List[CriterionScore] = Field(default_factory=list)
     rationale: str = ""
     low_confidence: bool = False
+    evidence: List[List[int]] = Field(default_factory=list)  # [start, end) spans in the student text
 
 
 class GradeResult(BaseModel):
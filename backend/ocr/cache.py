@@ -0,0 +1,193 @@
+"""
+Content-addressed OCR result cache.
+
+Results are keyed on SHA-256 of the file bytes plus provider, model and a
+preprocessing version (for Tesseract, "model" also carries the sweep
+settings, see ``tesseract.sweep_signature``), so identical uploads (re-uploaded templates, re-runs
+of /api/ocr/start) skip OCR entirely. Two tiers:
+  - an in-process LRU of recent results
+  - an on-disk JSON store, size-bounded, evicting least recently used files
+
+Config (env):
+  OCR_CACHE            0 disables the cache (default 1)
+  OCR_CACHE_DIR        on-disk store (default <tmp>/graderai-ocr-cache)
+  OCR_CACHE_MAX_MB     on-disk size bound (default 512)
+  OCR_CACHE_MEM_ITEMS  in-process LRU capacity (default 256)
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MB = 512
+DEFAULT_MEM_ITEMS = 256
+
+
+def cache_key(file_bytes: bytes, provider: str, model: str = "", preproc: str = "") -> str:
+    digest = hashlib.sha256(file_bytes or b"").hexdigest()
+    return hashlib.sha256(f"{digest}|{provider}|{model}|{preproc}".encode("utf-8")).hexdigest()
+
+
+class OCRCache:
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+        mem_items: int = DEFAULT_MEM_ITEMS,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.mem_items = mem_items
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.lookups = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_items:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (value, tier) where tier is "memory", "disk" or None on miss."""
+        with self._lock:
+            self.lookups += 1
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return self._mem[key], "memory"
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                value = json.load(fh)
+            os.utime(path)  # bump recency for LRU eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None, None
+        with self._lock:
+            self.hits["disk"] += 1
+            self._remember(key, value)
+        return value, "disk"
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("ocr_cache write failed: %s", e)
+            return
+        with self._lock:
+            # keep an independent copy so callers can't mutate the cached entry
+            self._remember(key, json.loads(data))
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+        self._evict()
+
+    def _scan(self):
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for fn in files:
+                if not fn.endswith(".json"):
+                    continue
+                p = os.path.join(root, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_bytes:
+                return
+        entries = self._scan()
+        total = sum(size for _m, size, _p in entries)
+        if total > self.max_bytes:
+            for _mtime, size, p in sorted(entries):
+                try:
+                    os.remove(p)
+                except OSError:
+                    continue
+                total -= size
+                key = os.path.basename(p)[:-5]
+                with self._lock:
+                    self._mem.pop(key, None)
+                if total <= self.max_bytes:
+                    break
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits["memory"] + self.hits["disk"],
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+            }
+
+
+_cache: Optional[OCRCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[OCRCache]:
+    """Process-wide cache, or None when OCR_CACHE=0."""
+    global _cache
+    if os.getenv("OCR_CACHE", "1") == "0":
+        return None
+    directory = os.getenv("OCR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "graderai-ocr-cache")
+    with _cache_lock:
+        if _cache is None or _cache.directory != directory:
+            _cache = OCRCache(
+                directory,
+                max_bytes=int(float(os.getenv("OCR_CACHE_MAX_MB") or DEFAULT_MAX_MB) * 1024 * 1024),
+                mem_items=int(os.getenv("OCR_CACHE_MEM_ITEMS") or DEFAULT_MEM_ITEMS),
+            )
+        return _cache
+
+
+def lookup(file_bytes: bytes, provider: str, model: str = "", preproc: str = "") -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Return (key, cached_result). key is None when caching is disabled.
+    A hit's meta["cache"] carries the tier and running hit/miss counters."""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    key = cache_key(file_bytes, provider, model, preproc)
+    value, tier = cache.get(key)
+    if value is None:
+        return key, None
+    value = dict(value)
+    value["meta"] = {**(value.get("meta") or {}), "cache": {"hit": True, "tier": tier, **cache.stats()}}
+    return key, value
+
+
+def store(key: Optional[str], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Persist a fresh result under key; stamps meta["cache"] as a miss."""
+    cache = get_cache()
+    if cache is None or key is None:
+        return result
+    cache.put(key, result)
+    result["meta"] = {**(result.get("meta") or {}), "cache": {"hit": False, "tier": None, **cache.stats()}}
+    return result
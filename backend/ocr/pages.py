@@ -0,0 +1,76 @@
+"""
+Page iteration for OCR inputs.
+
+PDFs are rasterized one page at a time with PyMuPDF; images (including
+multi-frame TIFFs) yield one frame per page. Each yielded image is closed
+when the consumer asks for the next page, so only one page is resident no
+matter how long the packet is.
+"""
+import io
+import os
+from typing import Iterator, Optional, Tuple
+
+from PIL import Image, ImageSequence
+
+try:
+    import fitz  # PyMuPDF
+except ModuleNotFoundError:  # PDF input unavailable; images still work
+    fitz = None
+
+DEFAULT_PDF_DPI = 200
+
+
+def pdf_dpi() -> int:
+    return int(os.getenv("OCR_PDF_DPI") or DEFAULT_PDF_DPI)
+
+
+def is_pdf(file_bytes: bytes, filename: str = "") -> bool:
+    return (filename or "").lower().endswith(".pdf") or (file_bytes or b"")[:5] == b"%PDF-"
+
+
+def page_count(file_bytes: bytes, filename: str = "") -> int:
+    """Number of pages without rasterizing anything."""
+    if is_pdf(file_bytes, filename):
+        if fitz is None:
+            return 1
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            return doc.page_count
+    try:
+        with Image.open(io.BytesIO(file_bytes)) as src:
+            return getattr(src, "n_frames", 1)
+    except Exception:
+        return 1
+
+
+def iter_pages(
+    file_bytes: bytes,
+    filename: str = "",
+    *,
+    dpi: Optional[int] = None,
+    mode: str = "RGB",
+) -> Iterator[Tuple[int, Image.Image]]:
+    """Yield (page_number, image) lazily, 1-based, converted to ``mode``."""
+    if is_pdf(file_bytes, filename):
+        if fitz is None:
+            raise RuntimeError("PyMuPDF (fitz) is not installed; required for PDF OCR.")
+        dpi = dpi or pdf_dpi()
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            for idx in range(doc.page_count):
+                pix = doc.load_page(idx).get_pixmap(dpi=dpi)
+                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                del pix
+                if mode != "RGB":
+                    img = img.convert(mode)
+                try:
+                    yield idx + 1, img
+                finally:
+                    img.close()
+        return
+
+    with Image.open(io.BytesIO(file_bytes)) as src:
+        for idx, frame in enumerate(ImageSequence.Iterator(src)):
+            img = frame.convert(mode)
+            try:
+                yield idx + 1, img
+            finally:
+                img.close()
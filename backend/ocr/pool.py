@@ -0,0 +1,395 @@
+"""
+Warm OCR worker pool.
+
+A fixed number of worker processes each construct the local provider once
+and preload the configured models, then serve ``run`` / ``run_batch`` calls
+from their own multiprocessing queue. The API process only enqueues jobs
+(to the worker with the fewest outstanding ones) and resolves futures from
+a result queue, so no request ever pays for ``transformers.pipeline``
+construction and the model weights live in the workers rather than in
+whichever request handler touched them first.
+
+Every worker process holds its own copy of the weights, so memory is
+OCR_POOL_WORKERS copies per pool. The pool belongs to the API process that
+starts it; run one pool per host: a single uvicorn worker with
+OCR_POOL_WORKERS sized to the box, not several uvicorn workers each
+starting their own pool. ``start_from_env`` enforces this with a host-wide
+lock file: a second process on the host gets no pool and logs why.
+
+A worker serves its queue in order, so the pool always knows which job a
+worker is on: the oldest one assigned to it without a result. A worker that
+dies (OOM, segfault in native code) fails that job immediately; its other
+jobs move to a fresh queue that its replacement serves. Replacements start
+after a backoff that doubles with each consecutive crash, and once the pool
+has restarted workers OCR_POOL_MAX_RESTARTS times it gives up: pending jobs
+fail and ``submit`` raises PoolUnavailable.
+
+Config (env):
+  OCR_POOL_WORKERS       number of worker processes; 0 disables the pool (default)
+  OCR_POOL_MODELS        comma-separated model ids to preload
+  OCR_POOL_TIMEOUT       seconds a caller waits for a result (default 300)
+  OCR_POOL_MAX_RESTARTS  worker restarts before the pool gives up (default 10)
+  OCR_POOL_LOCK          host-wide lock file (default <tmp>/graderai-ocr-pool.lock)
+"""
+import importlib
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows: one pool per host is not enforced
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FACTORY = "backend.ocr.providers.trocr_local:TrOCRLocal"
+# Same ids as trocr_local.PRINTED / HANDWRITTEN (not imported: that pulls in torch)
+DEFAULT_MODELS = ["microsoft/trocr-base-printed", "microsoft/trocr-base-handwritten"]
+DEFAULT_TIMEOUT = 300.0
+DEFAULT_MAX_RESTARTS = 10
+RESTART_BACKOFF_S = 0.5
+RESTART_BACKOFF_MAX_S = 30.0
+
+_READY = "__ready__"
+_FAILED = "__failed__"
+
+Job = Tuple[int, str, Dict[str, Any]]
+
+
+def _load_factory(path: str):
+    mod, _, attr = path.partition(":")
+    return getattr(importlib.import_module(mod), attr)
+
+
+def _worker_main(idx: int, factory: str, models: List[str], jobs, results) -> None:
+    """Worker process: build the provider once, warm models, serve jobs."""
+    try:
+        provider = _load_factory(factory)()
+        get_pipe = getattr(provider, "_get_pipe", None)
+        for mid in models:
+            if callable(get_pipe):
+                get_pipe(mid)
+    except Exception as e:
+        results.put((_FAILED, idx, f"{type(e).__name__}: {e}"))
+        return
+    results.put((_READY, idx, None))
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        job_id, method, kwargs = job
+        try:
+            out = getattr(provider, method)(**kwargs)
+            results.put((job_id, True, out))
+        except Exception as e:
+            results.put((job_id, False, f"{type(e).__name__}: {e}"))
+
+
+class PoolUnavailable(RuntimeError):
+    pass
+
+
+class OCRWorkerPool:
+    def __init__(
+        self,
+        workers: int,
+        models: Optional[List[str]] = None,
+        factory: str = DEFAULT_FACTORY,
+        timeout: float = DEFAULT_TIMEOUT,
+        mp_context: str = "spawn",  # torch is not fork-safe
+        max_restarts: Optional[int] = None,
+    ):
+        self.workers = max(1, int(workers))
+        self.models = list(DEFAULT_MODELS if models is None else models)
+        self.factory = factory
+        self.timeout = timeout
+        self.max_restarts = (
+            int(os.getenv("OCR_POOL_MAX_RESTARTS") or DEFAULT_MAX_RESTARTS) if max_restarts is None else max_restarts
+        )
+        self._ctx = mp.get_context(mp_context)
+        self._queues = [self._ctx.Queue() for _ in range(self.workers)]
+        self._results = self._ctx.Queue()
+        self._procs: List[Any] = []
+        # per worker, its jobs without a result in the order it serves them
+        self._assigned: List[Dict[int, Job]] = [{} for _ in range(self.workers)]
+        self._worker_of: Dict[int, int] = {}
+        self._restarts = 0
+        self._crashes = [0] * self.workers  # consecutive deaths, for the backoff
+        self._respawn_at: Dict[int, float] = {}
+        self._start_failed: set = set()  # workers whose provider never loaded; not restarted
+        self._broken: Optional[str] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._ready = 0
+        self._failed: List[str] = []
+        self._completed = 0
+        self._errors = 0
+        self._collector: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ---- lifecycle ----
+    def _spawn(self, idx: int) -> Any:
+        p = self._ctx.Process(
+            target=_worker_main,
+            args=(idx, self.factory, self.models, self._queues[idx], self._results),
+            name=f"ocr-worker-{idx}",
+            daemon=True,
+        )
+        p.start()
+        return p
+
+    def start(self) -> "OCRWorkerPool":
+        self._procs = [self._spawn(idx) for idx in range(self.workers)]
+        self._collector = threading.Thread(target=self._collect, name="ocr-pool-results", daemon=True)
+        self._collector.start()
+        logger.info("ocr_pool started workers=%s models=%s", self.workers, self.models)
+        return self
+
+    def wait_ready(self, timeout: float = 60.0) -> bool:
+        """Block until every worker has warmed its models (or failed)."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self._ready + len(self._failed) >= self.workers:
+                    return self._ready == self.workers
+            time.sleep(0.05)
+        return False
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(None)
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._results.put((None, None, None))  # stop the collector
+        self._fail_pending(PoolUnavailable("ocr pool shut down"))
+
+    def _fail_pending(self, error: BaseException) -> None:
+        with self._lock:
+            futs = list(self._futures.values())
+            self._futures.clear()
+            self._worker_of.clear()
+            for assigned in self._assigned:
+                assigned.clear()
+        for fut in futs:
+            fut.set_exception(error)
+
+    def _dispatch(self, job: Job) -> None:
+        """Hand job to the usable worker with the fewest outstanding jobs
+        (caller holds the lock)."""
+        usable = [i for i in range(self.workers) if i not in self._start_failed]
+        idx = min(usable, key=lambda i: len(self._assigned[i]))
+        self._assigned[idx][job[0]] = job
+        self._worker_of[job[0]] = idx
+        self._queues[idx].put(job)
+
+    def _reap(self) -> None:
+        """Fail the job of every worker that exited on its own, and replace
+        the worker once its backoff has passed."""
+        for idx, p in enumerate(self._procs):
+            if p.is_alive() or self._closed or self._broken or idx in self._start_failed:
+                continue
+            if idx in self._respawn_at:
+                if time.monotonic() >= self._respawn_at[idx]:
+                    del self._respawn_at[idx]
+                    self._procs[idx] = self._spawn(idx)
+                continue
+            with self._lock:
+                self._restarts += 1
+                self._crashes[idx] += 1
+                self._ready = max(0, self._ready - 1)
+                # the worker serves its queue in order: the oldest job is the one it was on
+                assigned = self._assigned[idx]
+                job_id = next(iter(assigned), None)
+                fut = None
+                if job_id is not None:
+                    del assigned[job_id]
+                    self._worker_of.pop(job_id, None)
+                    fut = self._futures.pop(job_id, None)
+                # the dead reader may hold its queue's lock: give the replacement a fresh queue
+                stale, self._queues[idx] = self._queues[idx], self._ctx.Queue()
+                stale.cancel_join_thread()  # nobody reads it; don't block exit flushing it
+                stale.close()
+                for job in assigned.values():
+                    self._queues[idx].put(job)
+                give_up = self._restarts > self.max_restarts
+                if give_up:
+                    self._broken = f"ocr workers crashed {self._restarts} times; pool stopped restarting them"
+                else:
+                    delay = min(RESTART_BACKOFF_MAX_S, RESTART_BACKOFF_S * 2 ** (self._crashes[idx] - 1))
+                    self._respawn_at[idx] = time.monotonic() + delay
+            if fut is not None:
+                fut.set_exception(PoolUnavailable(f"ocr worker {idx} exited with code {p.exitcode}"))
+            if give_up:
+                logger.error("ocr_pool worker %s exited code=%s job=%s; %s", idx, p.exitcode, job_id, self._broken)
+                self._fail_pending(PoolUnavailable(self._broken))
+                return
+            logger.error("ocr_pool worker %s exited code=%s job=%s; restarting in %.1fs", idx, p.exitcode, job_id, delay)
+
+    def _collect(self) -> None:
+        while True:
+            try:
+                job_id, ok, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._reap()
+                continue
+            if job_id is None:
+                return
+            if job_id == _READY:
+                with self._lock:
+                    self._ready += 1
+                    self._crashes[ok] = 0
+                continue
+            if job_id == _FAILED:
+                logger.error("ocr_pool worker %s failed to start: %s", ok, payload)
+                with self._lock:
+                    self._start_failed.add(ok)
+                    self._failed.append(payload)
+                    orphans = list(self._assigned[ok].values())
+                    self._assigned[ok].clear()
+                    # its jobs go to the workers that did start, if any
+                    if len(self._failed) < self.workers:
+                        for job in orphans:
+                            self._dispatch(job)
+                        continue
+                # nobody left to serve queued jobs
+                self._fail_pending(PoolUnavailable(payload))
+                continue
+            with self._lock:
+                idx = self._worker_of.pop(job_id, None)
+                if idx is not None:
+                    self._assigned[idx].pop(job_id, None)
+                fut = self._futures.pop(job_id, None)
+                self._completed += 1
+                if not ok:
+                    self._errors += 1
+            if fut is None:
+                continue
+            if ok:
+                fut.set_result(payload)
+            else:
+                fut.set_exception(RuntimeError(payload))
+
+    # ---- jobs ----
+    def submit(self, method: str, **kwargs: Any) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            if self._broken:
+                raise PoolUnavailable(self._broken)
+            if self._closed or len(self._failed) >= self.workers:
+                raise PoolUnavailable("ocr pool is not running")
+            job_id = next(self._ids)
+            self._futures[job_id] = fut
+            self._dispatch((job_id, method, kwargs))
+        return fut
+
+    def run(
+        self,
+        *,
+        file_bytes: bytes,
+        filename: str,
+        model_override: Optional[str] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Same contract as the provider's run(); blocks for the result."""
+        fut = self.submit("run", file_bytes=file_bytes, filename=filename, model_override=model_override)
+        text, meta = fut.result(timeout=self.timeout)
+        return text, meta
+
+    def run_batch(self, items: List[Any], **kwargs: Any) -> Dict[str, Any]:
+        """Same contract as the provider's run_batch(); one job per batch."""
+        return self.submit("run_batch", items=items, **kwargs).result(timeout=self.timeout)
+
+    def queue_depth(self) -> int:
+        """Jobs submitted and not yet finished (queued + in flight)."""
+        with self._lock:
+            return len(self._futures)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "alive": sum(1 for p in self._procs if p.is_alive()),
+                "ready": self._ready,
+                "failed": list(self._failed),
+                "models": self.models,
+                "queue_depth": len(self._futures),
+                "completed": self._completed,
+                "errors": self._errors,
+                "restarts": self._restarts,
+                "broken": self._broken,
+            }
+
+
+_pool: Optional[OCRWorkerPool] = None
+_lock_fh: Any = None
+
+
+def _lock_path() -> str:
+    return os.getenv("OCR_POOL_LOCK") or os.path.join(tempfile.gettempdir(), "graderai-ocr-pool.lock")
+
+
+def _acquire_host_lock() -> bool:
+    """Hold the host-wide pool lock for the life of the process."""
+    global _lock_fh
+    if fcntl is None or _lock_fh is not None:
+        return True
+    fh = open(_lock_path(), "a+")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return False
+    _lock_fh = fh
+    return True
+
+
+def _release_host_lock() -> None:
+    global _lock_fh
+    if _lock_fh is not None:
+        fcntl.flock(_lock_fh, fcntl.LOCK_UN)
+        _lock_fh.close()
+        _lock_fh = None
+
+
+def get_pool() -> Optional[OCRWorkerPool]:
+    """The running pool, or None when disabled (callers fall back in-process)."""
+    return _pool
+
+
+def start_from_env() -> Optional[OCRWorkerPool]:
+    global _pool
+    workers = int(os.getenv("OCR_POOL_WORKERS") or 0)
+    if workers <= 0 or _pool is not None:
+        return _pool
+    if not _acquire_host_lock():
+        logger.error(
+            "ocr_pool not started: another process on this host holds %s; "
+            "run one uvicorn worker per host when OCR_POOL_WORKERS > 0", _lock_path(),
+        )
+        return None
+    models_env = os.getenv("OCR_POOL_MODELS")
+    models = [m.strip() for m in models_env.split(",") if m.strip()] if models_env else None
+    timeout = float(os.getenv("OCR_POOL_TIMEOUT") or DEFAULT_TIMEOUT)
+    _pool = OCRWorkerPool(workers, models=models, timeout=timeout).start()
+    return _pool
+
+
+def stop() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _release_host_lock()
@@ -1,4 +1,11 @@
-from typing import Protocol, Dict, Any, Tuple, Optional
+from typing import TYPE_CHECKING, Protocol, Dict, Any, Tuple, Optional, Sequence, Union
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# A batch item is either an already-decoded image / line crop, or a raw
+# (file_bytes, filename) pair as accepted by ``run``.
+BatchItem = Union["Image.Image", Tuple[bytes, str]]
 
 
 class OCRProvider(Protocol):
@@ -15,3 +22,17 @@ class OCRProvider(Protocol):
         """
         ...
 
+    def run_batch(
+        self,
+        items: Sequence[BatchItem],
+        *,
+        model_override: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Return {"results": [(text, meta), ...], "meta": {...}}.
+        'results' is in input order and each (text, meta) matches what
+        ``run`` would return for that item on its own.
+        'meta' carries batch-level stats: count, batch_size, latency_ms,
+        images_per_sec.
+        """
+        ...
@@ -1,21 +1,26 @@
 import io
 import os
 import time
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Sequence
 
 import torch
 from PIL import Image
 import fitz  # PyMuPDF
 from transformers import pipeline
 
+from .. import cache as ocr_cache
+from ..pages import iter_pages, pdf_dpi
+from ..segment import crop_lines, find_text_lines
+
 PRINTED = "microsoft/trocr-base-printed"
 HANDWRITTEN = "microsoft/trocr-base-handwritten"
+DEFAULT_BATCH_SIZE = 8
 
 
 def _first_page_to_image(pdf_bytes: bytes) -> Image.Image:
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
         page = doc.load_page(0)
-        pix = page.get_pixmap(dpi=200)
+        pix = page.get_pixmap(dpi=pdf_dpi())
         img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
         return img
 
@@ -28,6 +33,23 @@ def _bytes_to_image(file_bytes: bytes, filename: str) -> Image.Image:
     return im
 
 
+def _to_image(item: Any) -> Image.Image:
+    # Batch items are either decoded images (e.g. line crops) or (bytes, filename)
+    if isinstance(item, Image.Image):
+        return item if item.mode == "RGB" else item.convert("RGB")
+    file_bytes, filename = item
+    return _bytes_to_image(file_bytes, filename)
+
+
+def _generated_text(out: Any) -> str:
+    # pipeline yields [{"generated_text": ...}] per image
+    if isinstance(out, list) and out and isinstance(out[0], dict):
+        return out[0].get("generated_text", "") or ""
+    if isinstance(out, dict):
+        return out.get("generated_text", "") or ""
+    return ""
+
+
 def _device() -> str:
     try:
         if torch.cuda.is_available():
@@ -40,9 +62,18 @@ def _device() -> str:
 class TrOCRLocal:
     _pipelines: Dict[str, Any] = {}
 
-    def __init__(self, default_model: Optional[str] = None, mode: str = "single"):
+    def __init__(
+        self,
+        default_model: Optional[str] = None,
+        mode: str = "single",
+        batch_size: Optional[int] = None,
+        segment: str = "page",
+    ):
         self.default_model = default_model or os.getenv("OCR_MODEL", HANDWRITTEN)
         self.mode = os.getenv("OCR_MODE", mode).lower()
+        # page: whole image in one pass; lines: segment first, batch the crops
+        self.segment = os.getenv("OCR_SEGMENT", segment).lower()
+        self.batch_size = max(1, int(batch_size or os.getenv("OCR_BATCH_SIZE") or DEFAULT_BATCH_SIZE))
         self.dev = _device()
 
     def _get_pipe(self, model_id: str):
@@ -61,9 +92,7 @@ class TrOCRLocal:
         # no autocast; CPU-safe
         out = pipe(img)
         latency_ms = int((time.perf_counter() - t0) * 1000)
-        text = ""
-        if isinstance(out, list) and out and isinstance(out[0], dict):
-            text = out[0].get("generated_text", "") or ""
+        text = _generated_text(out)
         meta = {
             "latency_ms": latency_ms,
             "model": model_id,
@@ -72,6 +101,130 @@ class TrOCRLocal:
         }
         return text, meta
 
+    def _run_many(
+        self, imgs: List[Image.Image], model_id: str, batch_size: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Batched counterpart of _run_once; the pipeline pads/stacks each
+        chunk of ``batch_size`` images into one forward pass. Per-item
+        latency_ms is the batch latency amortized over the items."""
+        if not imgs:
+            return []
+        t0 = time.perf_counter()
+        pipe = self._get_pipe(model_id)
+        outs = pipe(imgs, batch_size=batch_size)
+        latency_ms = int((time.perf_counter() - t0) * 1000 / len(imgs))
+        results = []
+        for out in outs:
+            text = _generated_text(out)
+            results.append((text, {
+                "latency_ms": latency_ms,
+                "model": model_id,
+                "device": self.dev,
+                "raw_len": len(text),
+            }))
+        return results
+
+    def run_batch(
+        self,
+        items: Sequence[Any],
+        *,
+        model_override: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Run many images / line crops through the pipeline in batches.
+        Each result mirrors what ``run`` returns for that item alone,
+        including the auto-mode printed/handwritten fallback.
+        """
+        t0 = time.perf_counter()
+        imgs = [_to_image(it) for it in items]
+        bs = max(1, int(batch_size or self.batch_size))
+        results: List[Optional[Tuple[str, Dict[str, Any]]]] = [None] * len(imgs)
+
+        if model_override or self.mode != "auto":
+            mid = model_override or self.default_model
+            for i, (text, meta) in enumerate(self._run_many(imgs, mid, bs)):
+                meta["tried"] = [mid]
+                results[i] = (text, meta)
+        else:
+            ordered = (
+                [PRINTED, HANDWRITTEN]
+                if self.default_model == PRINTED
+                else [HANDWRITTEN, PRINTED]
+            )
+            tried: List[List[Dict[str, Any]]] = [[] for _ in imgs]
+            pending = list(range(len(imgs)))
+            for mid in ordered:
+                if not pending:
+                    break
+                outs = self._run_many([imgs[i] for i in pending], mid, bs)
+                still = []
+                for i, (text, meta) in zip(pending, outs):
+                    tried[i].append(
+                        {
+                            "model": mid,
+                            "text_len": len(text),
+                            "latency_ms": meta["latency_ms"],
+                        }
+                    )
+                    meta["tried"] = tried[i]
+                    results[i] = (text, meta)
+                    if len(text.strip()) < 4:
+                        still.append(i)
+                pending = still
+
+        elapsed = time.perf_counter() - t0
+        n = len(imgs)
+        return {
+            "results": results,
+            "meta": {
+                "count": n,
+                "batch_size": bs,
+                "device": self.dev,
+                "latency_ms": int(elapsed * 1000),
+                "images_per_sec": round(n / elapsed, 2) if n and elapsed > 0 else 0.0,
+            },
+        }
+
+    def _run_lines(
+        self, img: Image.Image, model_override: Optional[str] = None, page: int = 1
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Segment the page into text lines and recognize the crops as one
+        batch. meta["ocr_boxes"] holds the lines in the shape
+        regioner.infer_regions consumes."""
+        t0 = time.perf_counter()
+        boxes = find_text_lines(img)
+        seg_ms = int((time.perf_counter() - t0) * 1000)
+        batch = self.run_batch(crop_lines(img, boxes), model_override=model_override)
+
+        lines = []
+        tried: List[str] = []
+        for bbox, (text, meta) in zip(boxes, batch["results"]):
+            lines.append({"text": text.strip(), "bbox": bbox})
+            for t in meta.get("tried") or []:
+                mid = t["model"] if isinstance(t, dict) else t
+                if mid not in tried:
+                    tried.append(mid)
+        text = "\n".join(ln["text"] for ln in lines if ln["text"])
+        width, height = img.size
+        meta = {
+            "latency_ms": int((time.perf_counter() - t0) * 1000),
+            "model": model_override or (tried[0] if tried else self.default_model),
+            "device": self.dev,
+            "raw_len": len(text),
+            "tried": tried,
+            "segment": "lines",
+            "segment_ms": seg_ms,
+            "lines": len(lines),
+            "images_per_sec": batch["meta"]["images_per_sec"],
+            "ocr_boxes": {
+                "width": width,
+                "height": height,
+                "unit": "pixel",
+                "pages": [{"number": page, "width": width, "height": height, "lines": lines}],
+            },
+        }
+        return text, meta
+
     def run(
         self,
         *,
@@ -79,7 +232,36 @@ class TrOCRLocal:
         filename: str,
         model_override: Optional[str] = None,
     ) -> Tuple[str, Dict[str, Any]]:
-        img = _bytes_to_image(file_bytes, filename)
+        """Recognize every page, streaming PDFs one rasterized page at a time.
+        Single-page inputs return the page's (text, meta) unchanged; multi-page
+        inputs join page texts and add meta["pages"] with per-page stats.
+        Results are served from the content-addressed OCR cache when possible."""
+        ckey, cached = ocr_cache.lookup(
+            file_bytes,
+            "trocr_local",
+            model_override or f"{self.mode}:{self.default_model}",
+            f"segment={self.segment}:dpi{pdf_dpi()}",
+        )
+        if cached:
+            return cached["text"], cached["meta"]
+        per_page: List[Tuple[int, str, Dict[str, Any]]] = []
+        for number, img in iter_pages(file_bytes, filename):
+            text, meta = self._run_image(img, model_override, number)
+            per_page.append((number, text, meta))
+        if len(per_page) == 1:
+            text, meta = per_page[0][1], per_page[0][2]
+        else:
+            text, meta = _merge_pages(per_page)
+        if text.strip():
+            stored = ocr_cache.store(ckey, {"text": text, "meta": meta})
+            meta = stored["meta"]
+        return text, meta
+
+    def _run_image(
+        self, img: Image.Image, model_override: Optional[str] = None, page: int = 1
+    ) -> Tuple[str, Dict[str, Any]]:
+        if self.segment == "lines":
+            return self._run_lines(img, model_override, page)
         tried = []
         mode = self.mode
         if model_override:
@@ -112,3 +294,37 @@ class TrOCRLocal:
             meta["tried"] = [self.default_model]
             return text, meta
 
+
+
+def _merge_pages(per_page: List[Tuple[int, str, Dict[str, Any]]]) -> Tuple[str, Dict[str, Any]]:
+    texts = [t.strip() for (_n, t, _m) in per_page]
+    text = "\n\n".join(t for t in texts if t)
+    first = per_page[0][2]
+    tried: List[Any] = []
+    boxes_pages: List[Dict[str, Any]] = []
+    for _n, _t, m in per_page:
+        for t in m.get("tried") or []:
+            if t not in tried:
+                tried.append(t)
+        boxes_pages.extend(((m.get("ocr_boxes") or {}).get("pages")) or [])
+    meta: Dict[str, Any] = {
+        "latency_ms": sum(m.get("latency_ms") or 0 for (_n, _t, m) in per_page),
+        "model": first.get("model"),
+        "device": first.get("device"),
+        "raw_len": len(text),
+        "tried": tried,
+        "page_count": len(per_page),
+        "pages": [
+            {"number": n, "text_len": len(t.strip()), "latency_ms": m.get("latency_ms")}
+            for (n, t, m) in per_page
+        ],
+    }
+    if boxes_pages:
+        first_boxes = first.get("ocr_boxes") or {}
+        meta["ocr_boxes"] = {
+            "width": first_boxes.get("width"),
+            "height": first_boxes.get("height"),
+            "unit": first_boxes.get("unit"),
+            "pages": boxes_pages,
+        }
+    return text, meta
@@ -24,7 +24,8 @@ def get_provider(name: Optional[str] = None, model_id: Optional[str] = None, **k
 
         model = model_id or os.getenv("OCR_MODEL", "microsoft/trocr-base-handwritten")
         mode = kw.get("mode") or os.getenv("OCR_MODE", "single")
-        return "trocr_local", model, TrOCRLocal(default_model=model, mode=mode)
+        segment = kw.get("segment") or os.getenv("OCR_SEGMENT", "page")
+        return "trocr_local", model, TrOCRLocal(default_model=model, mode=mode, segment=segment)
 
     raise ValueError(f"unknown ocr provider: {provider_name}")
 
@@ -0,0 +1,99 @@
+"""
+Text-line segmentation for single-line recognizers (TrOCR).
+
+Uses a horizontal projection profile over a binarized page: rows with ink
+form runs, runs separated by small gaps are merged, and each surviving run
+becomes one line box. Everything is vectorized with NumPy so a 200-DPI page
+segments in a few milliseconds.
+"""
+from typing import List
+
+import numpy as np
+from PIL import Image
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 128
+    levels = np.arange(256, dtype=np.float64)
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m0 = np.cumsum(hist * levels)
+    mu0 = np.divide(m0, w0, out=np.zeros_like(m0), where=w0 > 0)
+    mu1 = np.divide(m0[-1] - m0, w1, out=np.zeros_like(m0), where=w1 > 0)
+    between = w0 * w1 * (mu0 - mu1) ** 2
+    return int(np.argmax(between))
+
+
+def find_text_lines(
+    img: Image.Image,
+    *,
+    min_height: int = 6,
+    max_gap: int = 3,
+    min_ink: float = 0.002,
+    pad: int = 4,
+) -> List[List[int]]:
+    """
+    Return text-line boxes as [x, y, w, h] (pixels, top-to-bottom).
+      - min_height: drop runs shorter than this (specks, rules)
+      - max_gap: merge runs separated by <= this many blank rows
+      - min_ink: fraction of the row width that must be ink to count
+      - pad: padding added around each box (clipped to the page)
+    Falls back to a single full-page box when nothing looks like text.
+    """
+    gray = np.asarray(img.convert("L"), dtype=np.uint8)
+    height, width = gray.shape
+    full = [[0, 0, int(width), int(height)]]
+    if height == 0 or width == 0:
+        return full
+
+    thr = _otsu_threshold(gray)
+    ink = gray <= thr
+    # A page that is mostly "ink" after thresholding is a blank/flat scan
+    if ink.mean() > 0.5:
+        return full
+
+    profile = ink.sum(axis=1)
+    active = profile > max(1, int(min_ink * width))
+    edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if starts.size == 0:
+        return full
+
+    # Merge runs split by small gaps (descenders, dotted i's, faint strokes)
+    split = (starts[1:] - ends[:-1]) > max_gap
+    keep_start = np.concatenate(([True], split))
+    keep_end = np.concatenate((split, [True]))
+    starts, ends = starts[keep_start], ends[keep_end]
+
+    tall = (ends - starts) >= min_height
+    starts, ends = starts[tall], ends[tall]
+    if starts.size == 0:
+        return full
+
+    # Column extents for every line at once: reduce over [start, end) only,
+    # so specks in the gaps between lines don't widen the boxes
+    bounds = np.empty(starts.size * 2, dtype=np.intp)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    padded = np.vstack((ink, np.zeros((1, width), dtype=bool)))
+    cols = np.logical_or.reduceat(padded, bounds, axis=0)[0::2]
+    has = cols.any(axis=1)
+    x0 = cols.argmax(axis=1)
+    x1 = width - cols[:, ::-1].argmax(axis=1)
+
+    y0 = np.clip(starts - pad, 0, height)
+    y1 = np.clip(ends + pad, 0, height)
+    x0 = np.clip(x0 - pad, 0, width)
+    x1 = np.clip(x1 + pad, 0, width)
+
+    boxes = np.stack((x0, y0, x1 - x0, y1 - y0), axis=1)[has]
+    return boxes.astype(int).tolist() or full
+
+
+def crop_lines(img: Image.Image, boxes: List[List[int]]) -> List[Image.Image]:
+    """Crop [x, y, w, h] boxes out of the page, preserving order."""
+    return [img.crop((x, y, x + w, y + h)) for (x, y, w, h) in boxes]
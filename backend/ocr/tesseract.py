@@ -0,0 +1,190 @@
+"""
+Tesseract page-segmentation-mode (PSM) sweep.
+
+Configs run on a shared process pool (Tesseract is a subprocess per call,
+so threads would mostly wait on it anyway) in priority order, at most
+TESSERACT_SWEEP_PARALLEL per sweep at a time; the next one is submitted
+only when a running one finishes. As soon as a config returns text whose
+mean word confidence from ``image_to_data`` clears the early-exit
+threshold, that result wins and the configs not yet submitted never run,
+so an early exit saves their CPU time (a config already running still
+finishes; its result is dropped). Otherwise the longest text wins.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+# Priority order: the modes that most often win on worksheet pages first
+CONFIGS = [
+    "--oem 1 --psm 6 -l eng",    # block
+    "--oem 1 --psm 11 -l eng",   # sparse text
+    "--oem 1 --psm 7 -l eng",    # single line
+    "--oem 1 --psm 13 -l eng",   # raw line
+]
+DEFAULT_EARLY_EXIT_CONF = 85.0
+DEFAULT_SWEEP_PARALLEL = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Executor:
+    """Process pool shared by all sweeps; size from TESSERACT_WORKERS."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.getenv("TESSERACT_WORKERS") or min(len(CONFIGS), os.cpu_count() or 1))
+            _pool = ProcessPoolExecutor(max_workers=max(1, workers))
+        return _pool
+
+
+def early_exit_conf() -> float:
+    return float(os.getenv("TESSERACT_EARLY_EXIT_CONF") or DEFAULT_EARLY_EXIT_CONF)
+
+
+def sweep_parallel() -> int:
+    return max(1, int(os.getenv("TESSERACT_SWEEP_PARALLEL") or DEFAULT_SWEEP_PARALLEL))
+
+
+def sweep_signature() -> str:
+    """Everything that changes which result a sweep returns, for cache keys."""
+    return f"{'|'.join(CONFIGS)}|conf={early_exit_conf():g}|parallel={sweep_parallel()}"
+
+
+def _lines_from_data(data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Group image_to_data words into lines with [x, y, w, h] boxes."""
+    lines: Dict[tuple, Dict[str, Any]] = {}
+    for i, word in enumerate(data.get("text") or []):
+        word = (word or "").strip()
+        if not word:
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        x, y = int(data["left"][i]), int(data["top"][i])
+        x1, y1 = x + int(data["width"][i]), y + int(data["height"][i])
+        ln = lines.get(key)
+        if ln is None:
+            lines[key] = {"words": [word], "box": [x, y, x1, y1]}
+        else:
+            ln["words"].append(word)
+            b = ln["box"]
+            b[0], b[1], b[2], b[3] = min(b[0], x), min(b[1], y), max(b[2], x1), max(b[3], y1)
+    out = []
+    for key in sorted(lines):
+        ln = lines[key]
+        x, y, x1, y1 = ln["box"]
+        out.append({"text": " ".join(ln["words"]), "bbox": [x, y, x1 - x, y1 - y]})
+    return out
+
+
+def _ocr_config(im, cfg: str, tesseract_cmd: Optional[str] = None) -> Dict[str, Any]:
+    """Pool worker: one image_to_data call. Module-level so it pickles."""
+    import pytesseract
+
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    t0 = time.perf_counter()
+    try:
+        data = pytesseract.image_to_data(im, config=cfg, output_type=pytesseract.Output.DICT)
+    except Exception as e:
+        # pytesseract's exceptions don't survive unpickling in the parent
+        # (custom __init__ signatures), which would break the whole pool
+        raise RuntimeError(str(e)) from None
+    confs = [
+        float(c)
+        for w, c in zip(data.get("text") or [], data.get("conf") or [])
+        if (w or "").strip() and float(c) >= 0
+    ]
+    lines = _lines_from_data(data)
+    return {
+        "text": "\n".join(ln["text"] for ln in lines),
+        "confidence": round(sum(confs) / len(confs), 1) if confs else 0.0,
+        "lines": lines,
+        "ms": int((time.perf_counter() - t0) * 1000),
+    }
+
+
+def sweep(
+    im,
+    *,
+    configs: Optional[List[str]] = None,
+    executor: Optional[Executor] = None,
+    min_conf: Optional[float] = None,
+    tesseract_cmd: Optional[str] = None,
+    parallel: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Return {"text", "lines", "meta"} for the winning config."""
+    configs = list(configs or CONFIGS)
+    min_conf = early_exit_conf() if min_conf is None else min_conf
+    parallel = sweep_parallel() if parallel is None else max(1, parallel)
+    ex = executor or get_pool()
+
+    t0 = time.perf_counter()
+    queued = iter(configs)
+    futs: Dict[Any, str] = {}
+    pending = set()
+
+    def submit_next() -> None:
+        cfg = next(queued, None)
+        if cfg is not None:
+            f = ex.submit(_ocr_config, im, cfg, tesseract_cmd)
+            futs[f] = cfg
+            pending.add(f)
+
+    for _ in range(parallel):
+        submit_next()
+    results: Dict[str, Dict[str, Any]] = {}
+    errors: List[str] = []
+    failed = set()
+    early: Optional[str] = None
+    while pending and early is None:
+        done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+        pending.clear()
+        pending.update(not_done)
+        for f in done:
+            cfg = futs[f]
+            try:
+                r = f.result()
+            except Exception as e:
+                errors.append(f"{cfg}: {e}")
+                failed.add(cfg)
+                continue
+            results[cfg] = r
+            if early is None and r["text"].strip() and r["confidence"] >= min_conf:
+                early = cfg
+        if early is None:
+            for _ in done:
+                submit_next()
+    for f in pending:
+        f.cancel()
+
+    if early is not None:
+        chosen = early
+    else:
+        ranked = sorted(
+            (c for c in configs if c in results and results[c]["text"].strip()),
+            key=lambda c: (len(results[c]["text"].strip()), results[c]["confidence"]),
+            reverse=True,
+        )
+        chosen = ranked[0] if ranked else None
+
+    best = results.get(chosen) if chosen else None
+    meta: Dict[str, Any] = {
+        "provider": "tesseract",
+        "tried": configs,
+        "chosen": chosen,
+        "early_exit": early is not None,
+        "timings_ms": {c: results[c]["ms"] for c in configs if c in results},
+        "confidences": {c: results[c]["confidence"] for c in configs if c in results},
+        "skipped": [c for c in configs if c not in results and c not in failed],
+        "submitted": len(futs),
+        "latency_ms": int((time.perf_counter() - t0) * 1000),
+    }
+    if errors:
+        meta["errors"] = errors
+    return {
+        "text": (best or {}).get("text", "").strip(),
+        "lines": (best or {}).get("lines") or [],
+        "meta": meta,
+    }
@@ -1,105 +1,268 @@
+"""
+Question regions from OCR line boxes.
+
+Anchors are lines that start a question with the same numbering
+``parse_questions`` understands (``1.``, ``2)``, ``Q3:``), found on every
+page with one regex pass over the joined line texts. Line boxes are held
+in NumPy arrays, so ordering, per-page content bounds and region extents
+are array operations rather than per-line Python work.
+
+A question's region runs from its anchor line down to just above the next
+anchor. When the next anchor is on a later page (or there is none), the
+region continues through the intermediate pages, one box per page.
+
+Boxes are ``(x, y, w, h, page)`` in OCR coordinates with 1-based pages; the
+first box is on the anchor's page. The legacy ``q5``/``q6a``/``q6b`` keys of
+the original two-question worksheet are still returned as
+``(x, y, w, h)`` boxes on page 1.
+"""
+import bisect
 import logging
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 
-def infer_regions(ocr_boxes: dict) -> dict:
-    """
-    Build three heuristic regions from Azure OCR boxes:
-      - Anchor on first line starting with "5"/"5." and "6"/"6." (normalized)
-      - Compute page bounds from all line rects
-      - q5 spans between 5 and 6 anchors (with small padding)
-      - q6 splits the area below 6 into left/right halves
-    Returns {"q5":[(x,y,w,h)], "q6a":[...], "q6b":[...]}
-    """
-    log = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
-    page = (ocr_boxes.get("pages") or [{}])[0]
-    lines = page.get("lines", [])
+PAD = 10.0
+# Same numbering as grader.parse_questions, one match per line start; the
+# delimiter must be followed by a space or the line end, so answers such as
+# "3.14" or "12:30" are not anchors
+_ANCHOR = re.compile(r"^[ \t]*(?:Q[ \t]*)?(\d{1,2})[\).:](?=[ \t]|$)", re.I | re.M)
 
-    def norm(t):
-        return (t or "").strip().lower()
+Box = Tuple[int, ...]
 
-    def starts5(t):
-        t0 = norm(t)
-        return t0.startswith("5.") or t0.startswith("5")
 
-    def starts6(t):
-        t0 = norm(t)
-        return t0.startswith("6.") or t0.startswith("6")
+class Lines:
+    """OCR lines of all pages as parallel arrays, in reading order."""
 
-    # Collect rects and anchors
-    rects = []
-    anchor5 = None
-    anchor6 = None
-    for ln in lines:
-        bx = ln.get("bbox") or [0, 0, 0, 0]
+    def __init__(self, ocr_boxes: Dict[str, Any]):
+        ob = ocr_boxes or {}
+        pages_in = ob.get("pages") or []
+        page_no: List[int] = []
+        rects: List[Any] = []
+        texts: List[str] = []
+        self.page_size: Dict[int, Tuple[float, float]] = {}
+        for idx, page in enumerate(pages_in):
+            page = page or {}
+            number = int(page.get("number") or idx + 1)
+            w = page.get("width") or ob.get("width")
+            h = page.get("height") or ob.get("height")
+            if w and h:
+                self.page_size[number] = (float(w), float(h))
+            for ln in page.get("lines") or []:
+                page_no.append(number)
+                rects.append((ln.get("bbox") or [0, 0, 0, 0])[:4])
+                texts.append(str(ln.get("text") or "").replace("\n", " "))
+        n = len(texts)
         try:
-            x, y, w, h = [float(v) for v in bx[:4]]
-        except Exception:
-            x, y, w, h = 0.0, 0.0, 0.0, 0.0
-        rects.append((x, y, w, h))
-        t = ln.get("text") or ""
-        if anchor5 is None and starts5(t):
-            anchor5 = (x, y, w, h)
-        if anchor6 is None and starts6(t):
-            anchor6 = (x, y, w, h)
-
-    # Page bounds from all rects (fallback to provided width/height)
-    if rects:
-        minX = min(x for (x, y, w, h) in rects)
-        minY = min(y for (x, y, w, h) in rects)
-        maxX = max(x + w for (x, y, w, h) in rects)
-        maxY = max(y + h for (x, y, w, h) in rects)
-    else:
-        w = float(ocr_boxes.get("width") or page.get("width") or 2000)
-        h = float(ocr_boxes.get("height") or page.get("height") or 2800)
-        minX, minY, maxX, maxY = 0.0, 0.0, w, h
+            xywh = np.asarray(rects, dtype=float).reshape(n, 4)
+        except (TypeError, ValueError):
+            xywh = np.array([_to_rect(r) for r in rects], dtype=float).reshape(n, 4)
+        pages = np.asarray(page_no, dtype=np.int32)
+        order = np.lexsort((xywh[:, 0], xywh[:, 1], pages)) if n else np.arange(0)
+        self.pages = pages[order]
+        self.x, self.y, self.w, self.h = (xywh[order, i] for i in range(4))
+        self.texts = [texts[i] for i in order]
+        self.page_numbers = sorted({*self.page_size, *np.unique(self.pages).tolist()}) or [1]
 
-    pad = 10.0
-    midX = (minX + maxX) / 2.0
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def bounds(self) -> Dict[int, Tuple[float, float, float, float]]:
+        """Per page (minX, minY, maxX, maxY) of its lines, else its size."""
+        out: Dict[int, Tuple[float, float, float, float]] = {}
+        if len(self):
+            starts = np.flatnonzero(np.r_[True, self.pages[1:] != self.pages[:-1]])
+            x1, y1 = self.x + self.w, self.y + self.h
+            for p, a, b, c, d in zip(
+                self.pages[starts].tolist(),
+                np.minimum.reduceat(self.x, starts).tolist(),
+                np.minimum.reduceat(self.y, starts).tolist(),
+                np.maximum.reduceat(x1, starts).tolist(),
+                np.maximum.reduceat(y1, starts).tolist(),
+            ):
+                out[p] = (a, b, c, d)
+        for p in self.page_numbers:
+            if p not in out:
+                w, h = self.page_size.get(p, (2000.0, 2800.0))
+                out[p] = (0.0, 0.0, w, h)
+        return out
+
+    def anchors(self, question_ids: Optional[Iterable[str]] = None) -> Tuple[np.ndarray, List[str]]:
+        """(line indices, question ids) of the question anchors in reading order.
+
+        Ids are taken in question order (question_ids, else numerically), each
+        at its first anchor line below the previous question's, so a numbered
+        line inside an answer does not take over a later question.
+        """
+        if not len(self):
+            return np.arange(0), []
+        joined = "\n".join(self.texts)
+        line_starts = np.cumsum([0] + [len(t) + 1 for t in self.texts[:-1]])
+        found = [(m.start(), m.group(1).lstrip("0") or "0") for m in _ANCHOR.finditer(joined)]
+        if not found:
+            return np.arange(0), []
+        idx = np.searchsorted(line_starts, np.fromiter((pos for pos, _ in found), dtype=np.int64), side="right") - 1
+        lines_of: Dict[str, List[int]] = {}
+        for i, (_pos, qid) in zip(idx.tolist(), found):
+            lines_of.setdefault(qid, []).append(i)
+        order = [str(q) for q in question_ids] if question_ids is not None else sorted(lines_of, key=int)
+        keep: List[Tuple[int, str]] = []
+        last = -1
+        for qid in dict.fromkeys(order):
+            at = lines_of.get(qid, [])
+            k = bisect.bisect_right(at, last)
+            if k < len(at):
+                last = at[k]
+                keep.append((last, qid))
+        return np.array([i for i, _ in keep], dtype=np.int64), [q for _, q in keep]
+
+
+def _to_rect(r: Any) -> List[float]:
+    try:
+        return [float(v) for v in list(r)[:4]] + [0.0] * (4 - len(list(r)[:4]))
+    except Exception:
+        return [0.0, 0.0, 0.0, 0.0]
+
+
+def _box(x0: float, y0: float, x1: float, y1: float, page: Optional[int] = None) -> Box:
+    box = (int(x0), int(y0), int(max(0.0, x1 - x0)), int(max(0.0, y1 - y0)))
+    return box if page is None else box + (int(page),)
+
+
+def question_regions(lines: Lines, question_ids: Optional[Iterable[str]] = None) -> Dict[str, List[Box]]:
+    idx, qids = lines.anchors(question_ids)
+    if not len(qids):
+        return {}
+    bounds = lines.bounds()
+    pages = lines.page_numbers
+    a_page = lines.pages[idx]
+    a_top = lines.y[idx]
+    # next anchor's page/top; the last question runs to the end of the packet
+    n_page = np.r_[a_page[1:], pages[-1] + 1]
+    n_top = np.r_[a_top[1:], np.inf]
+    left = np.array([bounds[p][0] for p in a_page.tolist()]) + PAD
+    right = np.array([bounds[p][2] for p in a_page.tolist()]) - PAD
+    page_bot = np.array([bounds[p][3] for p in a_page.tolist()])
+    same_page = n_page == a_page
+    bottom = np.where(same_page, n_top - PAD, page_bot)
+    bottom = np.maximum(bottom, a_top + lines.h[idx])
+
+    out: Dict[str, List[Box]] = {}
+    for k, qid in enumerate(qids):
+        p, np_ = int(a_page[k]), int(n_page[k])
+        boxes = [_box(left[k], a_top[k], right[k], bottom[k], p)]
+        for q in pages:
+            if p < q <= np_ and q in bounds:
+                x0, y0, x1, y1 = bounds[q]
+                end = y1 if q < np_ else min(y1, float(n_top[k]) - PAD)
+                if end > y0:
+                    boxes.append(_box(x0 + PAD, y0, x1 - PAD, end, q))
+        out[qid] = boxes
+    return out
 
-    # Compute q5 vertical bounds
-    if anchor5:
-        a5_top = anchor5[1]
-        a5_bot = anchor5[1] + anchor5[3]
+
+def _legacy_regions(lines: Lines) -> Dict[str, List[Box]]:
+    """The original page-1 worksheet layout: q5 between the "5" and "6"
+    anchors, q6 split into left/right halves below "6"."""
+    on_first = np.flatnonzero(lines.pages == lines.page_numbers[0])
+    if on_first.size:
+        texts = np.char.lower(np.char.strip(np.array([lines.texts[i] for i in on_first], dtype=str)))
+        x, y, w, h = (a[on_first] for a in (lines.x, lines.y, lines.w, lines.h))
+        minX, minY = float(x.min()), float(y.min())
+        maxX, maxY = float((x + w).max()), float((y + h).max())
+        hits5 = np.flatnonzero(np.char.startswith(texts, "5"))
+        hits6 = np.flatnonzero(np.char.startswith(texts, "6"))
     else:
-        # fallback to upper-middle start
-        a5_top = minY + 0.2 * (maxY - minY)
-        a5_bot = a5_top
+        minX, minY, maxX, maxY = lines.bounds()[lines.page_numbers[0]]
+        hits5 = hits6 = np.arange(0)
+        y = h = np.zeros(0)
 
-    if anchor6:
-        a6_top = anchor6[1]
-        a6_bot = anchor6[1] + anchor6[3]
+    midX = (minX + maxX) / 2.0
+    if hits5.size:
+        a5_bot = float(y[hits5[0]] + h[hits5[0]])
+    else:
+        a5_bot = minY + 0.2 * (maxY - minY)
+    if hits6.size:
+        a6_top, a6_bot = float(y[hits6[0]]), float(y[hits6[0]] + h[hits6[0]])
     else:
-        # fallback to later section
-        a6_top = minY + 0.6 * (maxY - minY)
-        a6_bot = a6_top
-
-    q5_top = max(minY, a5_bot + pad)
-    q5_bot = max(minY, min(maxY, a6_top - pad))
-    q5_left = minX + pad
-    q5_right = maxX - pad
-    q5_w = max(0.0, q5_right - q5_left)
-    q5_h = max(0.0, q5_bot - q5_top)
-    q5 = (int(q5_left), int(q5_top), int(q5_w), int(q5_h))
-
-    # Compute q6 area beneath anchor6 (or fallback lower-half)
-    q6_top = max(minY, a6_bot + pad)
-    q6_bot = max(minY, maxY - pad)
-    q6_left = minX + pad
-    q6_right = maxX - pad
-    # Left/right halves split at midX
-    left_w = max(0.0, midX - q6_left)
-    right_w = max(0.0, q6_right - midX)
-    height_q6 = max(0.0, q6_bot - q6_top)
-    q6a = (int(q6_left), int(q6_top), int(left_w), int(height_q6))
-    q6b = (int(midX), int(q6_top), int(right_w), int(height_q6))
+        a6_top = a6_bot = minY + 0.6 * (maxY - minY)
+
+    q5_top = max(minY, a5_bot + PAD)
+    q5_bot = max(minY, min(maxY, a6_top - PAD))
+    q5 = _box(minX + PAD, q5_top, max(minX + PAD, maxX - PAD), max(q5_top, q5_bot))
+    q6_top = max(minY, a6_bot + PAD)
+    q6_bot = max(q6_top, max(minY, maxY - PAD))
+    q6a = _box(minX + PAD, q6_top, max(minX + PAD, midX), q6_bot)
+    q6b = _box(midX, q6_top, max(midX, maxX - PAD), q6_bot)
+    return {"q5": [q5], "q6a": [q6a], "q6b": [q6b]}
+
+
+class Sections(NamedTuple):
+    text: str  # OCR lines grouped by question, "\n"-joined
+    spans: Dict[str, Tuple[int, int]]  # question id -> [start, end) of its answer in text
+
+
+def answer_sections(ocr_boxes: dict, question_ids: Optional[Iterable[str]] = None) -> Sections:
+    """
+    Each question's answer text from the OCR lines of its region.
+    A line belongs to the last anchor at or above its vertical centre
+    (a binary search over the anchors' sorted (page, top) keys); lines above
+    the first anchor (name, header) belong to none. The anchor line itself
+    usually holds the printed prompt, so it is left out when the region has
+    more lines, and only its numbering is dropped when it doesn't.
+    Without anchors, spans is empty and callers grade the whole text.
+    """
+    lines = Lines(ocr_boxes or {})
+    idx, qids = lines.anchors(question_ids)
+    if not qids:
+        return Sections("\n".join(lines.texts), {})
+
+    # (page, y) as one sortable key per line and per anchor
+    scale = float((lines.y + lines.h).max()) + 1.0
+    anchor_keys = lines.pages[idx] * scale + lines.y[idx]
+    line_keys = lines.pages * scale + lines.y + lines.h / 2.0
+    owner = np.searchsorted(anchor_keys, line_keys, side="right") - 1
+    owner[idx] = np.arange(len(idx))
+    is_anchor = np.zeros(len(lines), dtype=bool)
+    is_anchor[idx] = True
+    order = np.lexsort((lines.x, lines.y, lines.pages, ~is_anchor, owner))
+
+    parts: List[str] = []
+    spans: Dict[str, Tuple[int, int]] = {}
+    pos = 0
+    bounds = np.searchsorted(owner[order], np.arange(-1, len(qids) + 1))
+    for k in range(-1, len(qids)):
+        block = [lines.texts[i] for i in order[bounds[k + 1]:bounds[k + 2]].tolist()]
+        if not block:
+            continue
+        block_text = "\n".join(block)
+        parts.append(block_text)
+        if k >= 0:
+            if len(block) > 1:
+                start = pos + len(block[0]) + 1
+            else:
+                m = _ANCHOR.match(block[0])
+                start = pos + (m.end() if m else 0)
+            spans[qids[k]] = (start, pos + len(block_text))
+        pos += len(block_text) + 1
+    return Sections("\n".join(parts), spans)
+
 
+def infer_regions(ocr_boxes: dict, question_ids: Optional[Iterable[str]] = None) -> dict:
+    """
+    Regions for every numbered question found in the OCR lines (optionally
+    only those in question_ids), keyed by question id, plus the legacy
+    q5/q6a/q6b keys.
+    Returns {"1": [(x, y, w, h, page), ...], ..., "q5": [(x, y, w, h)], ...}
+    """
+    lines = Lines(ocr_boxes or {})
+    regions: Dict[str, List[Box]] = question_regions(lines, question_ids)
+    regions.update(_legacy_regions(lines))
     try:
-        log.info(
-            "infer_regions bounds minY=%.1f a5_bot=%.1f a6_top=%.1f a6_bot=%.1f midX=%.1f",
-            minY, a5_bot, a6_top, a6_bot, midX,
-        )
+        logger.info("infer_regions lines=%s pages=%s questions=%s", len(lines), len(lines.page_numbers), len(regions) - 3)
     except Exception:
         pass
-
-    return {"q5": [q5], "q6a": [q6a], "q6b": [q6b]}
+    return regions
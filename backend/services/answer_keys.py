@@ -0,0 +1,197 @@
+"""
+Assignment answer keys, compiled once and shared by every submission.
+
+Grading used to parse each student's own OCR text and derive a key from it,
+so every submission was graded against a slightly different key. A key is
+now compiled once from the teacher's key sheet (``PUT
+/api/assignments/{id}/answer-key``): questions are parsed, answers taken
+from the sheet (``answer: 42``, ``answer: C``) or the explicit overrides,
+and the result is stored in ``answer_keys`` together with its
+``rubric_version``.
+
+Grading looks the compiled key up in a per-process LRU by assignment id; a
+miss loads the latest stored version once. Assignments without a key are
+remembered too (for the TTL), so a class set without one doesn't query per
+student. Callers get the cached objects and must not mutate them.
+
+Config (env):
+  ANSWER_KEY_CACHE_TTL_S   seconds a key stays cached (default 300; 0 disables)
+  ANSWER_KEY_CACHE_MAX     assignments kept per process (default 256)
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from ..models.schemas import AutoKey, Question
+from .grader import RUBRIC_VERSION, generate_autokeys, parse_questions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_S = 300.0
+DEFAULT_MAX = 256
+TABLE = "answer_keys"
+
+_ANSWER = re.compile(r"\banswer\s*:\s*\(?\s*(-?\d+(?:\.\d+)?|[A-E]\b)\)?", re.I)
+
+
+class CompiledKey(NamedTuple):
+    assignment_id: str
+    rubric_version: str
+    questions: List[Question]
+    keys: List[AutoKey]
+    owner_id: Optional[str] = None
+
+
+def compile_key(
+    assignment_id: str,
+    source_text: str,
+    answers: Optional[Dict[str, str]] = None,
+    rubric_version: Optional[str] = None,
+    owner_id: Optional[str] = None,
+) -> CompiledKey:
+    """Questions and keys from a key sheet. ``answer: ...`` in a question's
+    block sets its answer; answers (question id -> answer) override both."""
+    questions = parse_questions(source_text or "")
+    keys = generate_autokeys(questions)
+    by_id = {q.id: q for q in questions}
+    for k in keys:
+        q = by_id.get(k.question_id)
+        if q is not None and q.qtype in ("numeric", "MCQ"):
+            m = _ANSWER.search(q.prompt)
+            if m:
+                k.answer = m.group(1).upper() if q.qtype == "MCQ" else m.group(1)
+        if answers and k.question_id in answers:
+            k.answer = str(answers[k.question_id]).strip()
+    return CompiledKey(str(assignment_id), rubric_version or RUBRIC_VERSION, questions, keys, owner_id)
+
+
+def to_row(key: CompiledKey, source_text: str) -> Dict[str, Any]:
+    return {
+        "assignment_id": key.assignment_id,
+        "rubric_version": key.rubric_version,
+        "owner_id": key.owner_id,
+        "source_text": source_text,
+        "questions": [q.model_dump() for q in key.questions],
+        "keys": [k.model_dump() for k in key.keys],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def from_row(row: Dict[str, Any]) -> CompiledKey:
+    return CompiledKey(
+        str(row["assignment_id"]),
+        str(row.get("rubric_version") or RUBRIC_VERSION),
+        [Question(**q) for q in row.get("questions") or []],
+        [AutoKey(**k) for k in row.get("keys") or []],
+        str(row["owner_id"]) if row.get("owner_id") else None,
+    )
+
+
+class AnswerKeyStore:
+    def __init__(
+        self,
+        client_getter: Callable[[], Any],
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self._client_getter = client_getter
+        self.ttl = float(os.getenv("ANSWER_KEY_CACHE_TTL_S") or DEFAULT_TTL_S) if ttl is None else float(ttl)
+        self.max_entries = max_entries or int(os.getenv("ANSWER_KEY_CACHE_MAX") or DEFAULT_MAX)
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, Tuple[float, Optional[CompiledKey]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.loads_failed = 0
+
+    def _cached(self, aid: str) -> Tuple[bool, Optional[CompiledKey]]:
+        with self._lock:
+            entry = self._keys.get(aid)
+            if entry is None:
+                return False, None
+            expires, key = entry
+            if expires <= time.monotonic():
+                del self._keys[aid]
+                return False, None
+            self._keys.move_to_end(aid)
+            return True, key
+
+    def _put(self, aid: str, key: Optional[CompiledKey]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._keys[aid] = (time.monotonic() + self.ttl, key)
+            self._keys.move_to_end(aid)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+
+    def _load(self, aid: str) -> Optional[CompiledKey]:
+        resp = (
+            self._client_getter()
+            .table(TABLE)
+            .select("*")
+            .eq("assignment_id", aid)
+            .order("updated_at", desc=True)
+            .limit(1)
+            .execute()
+        )
+        data = getattr(resp, "data", None)
+        row = data[0] if isinstance(data, list) and data else data
+        if not isinstance(row, dict) or "keys" not in row:
+            return None
+        return from_row(row)
+
+    def get(self, assignment_id: Optional[str]) -> Optional[CompiledKey]:
+        """The assignment's compiled key, or None when it has none (or it
+        couldn't be loaded; grading then derives keys per submission)."""
+        if not assignment_id:
+            return None
+        aid = str(assignment_id)
+        found, key = self._cached(aid)
+        if found:
+            self.hits += 1
+            return key
+        self.misses += 1
+        try:
+            key = self._load(aid)
+        except Exception as e:
+            self.loads_failed += 1
+            logger.warning("answer_keys load failed assignment=%s: %s", aid, e)
+            return None
+        self._put(aid, key)
+        return key
+
+    def save(self, assignment_id: str, source_text: str, answers: Optional[Dict[str, str]] = None,
+             rubric_version: Optional[str] = None, owner_id: Optional[str] = None) -> CompiledKey:
+        """Compile, persist (one row per assignment and rubric version) and
+        cache a key. Write errors propagate."""
+        key = compile_key(assignment_id, source_text, answers, rubric_version, owner_id)
+        self._client_getter().table(TABLE).upsert(
+            to_row(key, source_text), on_conflict="assignment_id,rubric_version"
+        ).execute()
+        self._put(key.assignment_id, key)
+        return key
+
+    def invalidate(self, assignment_id: Optional[str] = None) -> None:
+        with self._lock:
+            if assignment_id is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(str(assignment_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        with self._lock:
+            size = len(self._keys)
+        return {
+            "ttl_s": self.ttl,
+            "assignments": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads_failed": self.loads_failed,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
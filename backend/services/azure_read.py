@@ -0,0 +1,309 @@
+"""
+Azure Read operation poller.
+
+``POST .../read/analyze`` returns an operation-location that has to be
+polled until the status is ``succeeded`` or ``failed``. Instead of every
+caller sleeping in its own loop, operations register with one poller task
+per event loop, which wakes up only when the earliest operation is due and
+starts each due poll as its own task over the shared HTTP pool, so a slow
+GET never holds back the schedule of the other operations.
+
+Per operation:
+  - the first poll waits for the analyze response's Retry-After (if any),
+    otherwise AZURE_READ_POLL_INITIAL
+  - later polls honor Retry-After, otherwise back off exponentially with
+    jitter up to AZURE_READ_POLL_MAX
+  - 429/5xx and transport errors are retried on the same schedule; any
+    other error (e.g. a non-JSON body) fails that operation only
+  - the whole operation is bounded by a deadline derived from page count:
+    AZURE_READ_DEADLINE_BASE + AZURE_READ_DEADLINE_PER_PAGE * pages,
+    enforced by the poller loop even while a poll is still in flight
+
+If the poller task itself dies, every waiting operation fails at once and
+the next ``wait`` starts a new task.
+"""
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from . import http as shared_http
+
+logger = logging.getLogger(__name__)
+
+PENDING = ("notstarted", "running")
+RETRYABLE = (429, 500, 502, 503, 504)
+
+
+class ReadError(RuntimeError):
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Azure Read poll failed with HTTP {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+class ReadDeadlineExceeded(TimeoutError):
+    def __init__(self, polls: int, deadline_s: float):
+        super().__init__(f"Azure Read did not finish within {deadline_s:.0f}s ({polls} polls)")
+        self.polls = polls
+        self.deadline_s = deadline_s
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+
+def deadline_for(pages: int) -> float:
+    return _env_float("AZURE_READ_DEADLINE_BASE", 20) + _env_float("AZURE_READ_DEADLINE_PER_PAGE", 4) * max(1, pages)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class _Op:
+    __slots__ = ("url", "key", "future", "next_at", "deadline", "deadline_s", "attempt", "polls")
+
+    def __init__(self, url: str, key: str, future: "asyncio.Future", next_at: float, deadline_s: float, now: float):
+        self.url = url
+        self.key = key
+        self.future = future
+        self.next_at = next_at
+        self.deadline_s = deadline_s
+        self.deadline = now + deadline_s
+        self.attempt = 0
+        self.polls = 0
+
+
+Fetch = Callable[[str, str], Awaitable[httpx.Response]]
+
+
+async def _fetch(url: str, key: str) -> httpx.Response:
+    async with shared_http.client(timeout=30) as client:
+        return await client.get(url, headers={"Ocp-Apim-Subscription-Key": key})
+
+
+class AzureReadPoller:
+    def __init__(
+        self,
+        *,
+        initial: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        factor: float = 2.0,
+        jitter: float = 0.25,
+        fetch: Optional[Fetch] = None,
+    ):
+        self.initial = _env_float("AZURE_READ_POLL_INITIAL", 0.5) if initial is None else initial
+        self.max_delay = _env_float("AZURE_READ_POLL_MAX", 5.0) if max_delay is None else max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self._fetch = fetch or _fetch
+        self._ops: Dict[int, _Op] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Dict[int, asyncio.Task] = {}  # id(op) -> its running poll
+        self.polls = 0
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.initial * self.factor ** attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def wait(
+        self,
+        url: str,
+        key: str,
+        *,
+        pages: int = 1,
+        retry_after: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Resolve with the final Read JSON (status succeeded or failed)."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        first = parse_retry_after(retry_after)
+        op = _Op(
+            url,
+            key,
+            loop.create_future(),
+            next_at=now + (self.initial if first is None else first),
+            deadline_s=deadline_for(pages) if deadline_s is None else deadline_s,
+            now=now,
+        )
+        self._ops[id(op)] = op
+        self._ensure_task()
+        self._wake.set()
+        try:
+            return await op.future
+        finally:
+            self._ops.pop(id(op), None)
+
+    def pending(self) -> int:
+        return len(self._ops)
+
+    def _ensure_task(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="azure-read-poller")
+            self._task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: "asyncio.Task") -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("azure_read poller died: %r", task.exception())
+        self._fail_all(RuntimeError(f"azure read poller died: {task.exception()!r}"))
+
+    def _fail_all(self, error: BaseException) -> None:
+        for op in list(self._ops.values()):
+            if not op.future.done():
+                op.future.set_exception(error)
+
+    @staticmethod
+    def _expire(op: _Op) -> None:
+        if not op.future.done():
+            op.future.set_exception(ReadDeadlineExceeded(op.polls, op.deadline_s))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            live = [op for op in self._ops.values() if not op.future.done()]
+            if not live:
+                await self._wake.wait()
+                continue
+            now = loop.time()
+            for op in live:
+                if op.deadline < now:
+                    self._expire(op)
+                    task = self._inflight.pop(id(op), None)
+                    if task is not None:
+                        task.cancel()
+            live = [op for op in live if not op.future.done()]
+            if not live:
+                continue
+            idle = [op for op in live if id(op) not in self._inflight]
+            for op in idle:
+                if op.next_at <= now:
+                    self._start_poll(op, loop)
+            # next wake-up: a poll coming due, a deadline, or a finished poll
+            waits = [op.next_at for op in idle if op.next_at > now] + [op.deadline for op in live]
+            # asyncio.wait rather than wait_for: on 3.11 wait_for can swallow
+            # a stop() cancel that races with a finishing poll's wake-up
+            woken = loop.create_task(self._wake.wait())
+            try:
+                await asyncio.wait((woken,), timeout=max(0.0, min(waits) - now))
+            finally:
+                woken.cancel()
+
+    def _start_poll(self, op: _Op, loop: asyncio.AbstractEventLoop) -> None:
+        task = loop.create_task(self._poll(op, loop))
+        self._inflight[id(op)] = task
+
+        def done(t: "asyncio.Task") -> None:
+            if self._inflight.get(id(op)) is t:
+                del self._inflight[id(op)]
+            if not t.cancelled() and t.exception() is not None and not op.future.done():
+                op.future.set_exception(t.exception())
+            self._wake.set()
+
+        task.add_done_callback(done)
+
+    async def _poll(self, op: _Op, loop: asyncio.AbstractEventLoop) -> None:
+        op.polls += 1
+        self.polls += 1
+        retry_after = None
+        try:
+            # a hung request must not hold the operation past its deadline
+            r = await asyncio.wait_for(self._fetch(op.url, op.key), timeout=max(0.0, op.deadline - loop.time()) + 1.0)
+        except httpx.TransportError as e:
+            logger.warning("azure_read poll transport error: %s", e)
+        except asyncio.TimeoutError:
+            self._expire(op)
+            return
+        except Exception as e:
+            if not op.future.done():
+                op.future.set_exception(e)
+            return
+        else:
+            try:
+                if r.status_code < 400:
+                    data = r.json()
+                    if (data.get("status") or "").lower() not in PENDING:
+                        if not op.future.done():
+                            op.future.set_result(data)
+                        return
+                elif r.status_code not in RETRYABLE:
+                    if not op.future.done():
+                        op.future.set_exception(ReadError(r.status_code, r.text[:500]))
+                    return
+                retry_after = parse_retry_after(r.headers.get("retry-after"))
+            except Exception as e:
+                # unparseable or unexpected body: fail this operation only
+                if not op.future.done():
+                    op.future.set_exception(ReadError(r.status_code, f"{type(e).__name__}: {r.text[:500]}"))
+                return
+
+        now = loop.time()
+        if now >= op.deadline:
+            self._expire(op)
+            return
+        delay = self._backoff(op.attempt) if retry_after is None else retry_after
+        op.attempt += 1
+        # one last poll right at the deadline rather than overshooting it
+        op.next_at = min(now + delay, op.deadline)
+
+    async def stop(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self._fail_all(RuntimeError("azure read poller stopped"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": self.pending(), "polls": self.polls, "running": bool(self._task and not self._task.done())}
+
+
+_poller: Optional[AzureReadPoller] = None
+_poller_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_poller() -> AzureReadPoller:
+    """The poller for the running event loop (one background task per loop)."""
+    global _poller, _poller_loop
+    loop = asyncio.get_running_loop()
+    if _poller is None or _poller_loop is not loop:
+        _poller = AzureReadPoller()
+        _poller_loop = loop
+    return _poller
+
+
+async def stop() -> None:
+    global _poller, _poller_loop
+    p, loop = _poller, _poller_loop
+    _poller, _poller_loop = None, None
+    # a poller from another (finished) loop has nothing left to cancel here
+    if p is not None and loop is asyncio.get_running_loop():
+        await p.stop()
@@ -0,0 +1,205 @@
+"""
+Class-set exports for ``POST /api/assignments/{id}/graded-bundle``.
+
+Every upload of the assignment is stamped on a bounded thread pool (the
+work is mostly Storage downloads plus a few annotations per page). Each
+stamped PDF is spooled to a per-bundle temp directory as soon as it's
+ready, so memory holds at most one PDF per worker, never the class set.
+
+  - ``zip``: entries are written in class order with a streaming zip
+    writer while later uploads are still being stamped, followed by a
+    ``manifest.json`` listing anything skipped or failed
+  - ``pdf``: once every upload is stamped, the files are merged into one
+    PDF on disk (marks are kept as annotations) and streamed in chunks
+
+Config (env):
+  GRADED_BUNDLE_WORKERS   uploads stamped concurrently (default 4)
+  GRADED_BUNDLE_MAX       largest class set accepted (default 500)
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX = 500
+CHUNK = 256 * 1024
+
+
+def workers() -> int:
+    return max(1, int(os.getenv("GRADED_BUNDLE_WORKERS") or DEFAULT_WORKERS))
+
+
+def max_uploads() -> int:
+    return int(os.getenv("GRADED_BUNDLE_MAX") or DEFAULT_MAX)
+
+
+class Item(NamedTuple):
+    upload_id: str
+    name: str
+    path: Optional[str]  # stamped PDF on disk; None when skipped or failed
+    error: Optional[str]
+
+
+def entry_names(rows: List[Dict[str, Any]]) -> List[str]:
+    """Unique, filesystem-safe ``<original name>.graded.pdf`` per row."""
+    seen: Dict[str, int] = {}
+    out = []
+    for row in rows:
+        stem = os.path.splitext(str(row.get("original_name") or row.get("id")))[0]
+        stem = re.sub(r"[^\w.\- ]+", "_", stem).strip(" .") or str(row.get("id"))
+        n = seen.get(stem, 0)
+        seen[stem] = n + 1
+        out.append(f"{stem}.graded.pdf" if n == 0 else f"{stem} ({n + 1}).graded.pdf")
+    return out
+
+
+class Bundle:
+    """Stamps rows on a thread pool into files under a temp directory that
+    is removed by close()."""
+
+    def __init__(self, rows: List[Dict[str, Any]], stamp: Callable[[Dict[str, Any]], bytes],
+                 skip: Optional[Dict[str, str]] = None):
+        self.rows = rows
+        self.names = entry_names(rows)
+        self.skip = skip or {}
+        self._stamp = stamp
+        self._dir = tempfile.mkdtemp(prefix="graderai-bundle-")
+        self._pool = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="graded-bundle")
+        self._futures: List["asyncio.Future[Item]"] = []
+
+    def _run(self, idx: int) -> Item:
+        row, name = self.rows[idx], self.names[idx]
+        uid = str(row.get("id"))
+        if uid in self.skip:
+            return Item(uid, name, None, self.skip[uid])
+        try:
+            pdf = self._stamp(row)
+            path = os.path.join(self._dir, f"{idx:05d}.pdf")
+            with open(path, "wb") as fh:
+                fh.write(pdf)
+            return Item(uid, name, path, None)
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+            logger.warning("graded_bundle stamp failed upload=%s: %s", uid, detail)
+            return Item(uid, name, None, str(detail))
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._futures = [loop.run_in_executor(self._pool, self._run, i) for i in range(len(self.rows))]
+
+    async def items(self) -> AsyncIterator[Item]:
+        """Stamped items in class order, each as soon as it (and the ones
+        before it) are done."""
+        for fut in self._futures:
+            yield await fut
+
+    async def all(self) -> List[Item]:
+        return list(await asyncio.gather(*self._futures))
+
+    def close(self) -> None:
+        for fut in self._futures:
+            fut.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def merge(self, items: List[Item]) -> str:
+        """Concatenate the stamped files into one PDF on disk; returns its path."""
+        try:
+            import fitz  # PyMuPDF
+        except ModuleNotFoundError:
+            raise RuntimeError("PyMuPDF (fitz) is not installed; required for merged PDFs.")
+        out_path = os.path.join(self._dir, "bundle.pdf")
+        out = fitz.open()
+        toc = []
+        try:
+            for it in items:
+                if it.path is None:
+                    continue
+                # bookmark each student's first page
+                toc.append([1, it.name[: -len(".graded.pdf")], out.page_count + 1])
+                with fitz.open(it.path) as src:
+                    out.insert_pdf(src)
+            out.set_toc(toc)
+            out.save(out_path, garbage=1, deflate=True)
+        finally:
+            out.close()
+        return out_path
+
+
+def manifest(items: List[Item]) -> Dict[str, Any]:
+    return {
+        "included": [{"upload_id": it.upload_id, "name": it.name} for it in items if it.path],
+        "skipped": [{"upload_id": it.upload_id, "name": it.name, "error": it.error} for it in items if not it.path],
+    }
+
+
+def iter_file(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _Sink:
+    """Write-only, unseekable file object the zip writer streams into."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+async def zip_stream(bundle: Bundle) -> AsyncIterator[bytes]:
+    """Zip of per-student PDFs, produced entry by entry as stamping finishes."""
+    sink = _Sink()
+    done: List[Item] = []
+    try:
+        # PDFs are already compressed; storing them keeps this I/O bound
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            async for it in bundle.items():
+                done.append(it)
+                if it.path is None:
+                    continue
+                with zf.open(it.name, "w", force_zip64=True) as dst:
+                    for chunk in iter_file(it.path):
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                os.remove(it.path)
+                data = sink.drain()
+                if data:
+                    yield data
+            zf.writestr("manifest.json", json.dumps(manifest(done), indent=2))
+        yield sink.drain()
+    finally:
+        bundle.close()
+
+
+async def pdf_stream(bundle: Bundle, merged_path: str) -> AsyncIterator[bytes]:
+    try:
+        for chunk in iter_file(merged_path):
+            yield chunk
+    finally:
+        bundle.close()
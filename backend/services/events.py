@@ -0,0 +1,245 @@
+"""
+In-process pub/sub for upload status transitions, served as Server-Sent
+Events by ``GET /api/ocr/events``.
+
+Every write of ``ocr_status`` publishes an event. Events get a monotonically
+increasing id and are kept in a bounded ring buffer, so a reconnecting
+EventSource that sends ``Last-Event-ID`` receives what it missed; if the id
+has already fallen out of the buffer the client gets a ``reset`` event and
+should refetch statuses once.
+
+Publishing is thread-safe (status writes happen in request handlers and in
+``asyncio.to_thread`` workers); delivery to each subscriber is scheduled on
+that subscriber's event loop.
+
+The hub only reaches subscribers in its own process. Job workers
+(``python -m backend.worker``) run elsewhere, so they ``forward_to`` the job
+store, and the app's ``relay`` task republishes those events here.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+BUFFER_SIZE = 2000
+OWNERS_MAX = 10000  # upload -> owner ids remembered, least recently published dropped first
+HEARTBEAT_S = 15.0
+QUEUE_MAX = 1000
+RELAY_INTERVAL_S = 0.5
+
+logger = logging.getLogger(__name__)
+
+# ocr_status column value -> status contract of GET /api/ocr/status/{id}
+_STATUS = {"running": "processing", "queued": "pending", "error": "failed"}
+
+
+def contract_status(ocr_status: Optional[str]) -> str:
+    st = str(ocr_status or "pending").lower()
+    return _STATUS.get(st, st)
+
+
+class _Subscriber:
+    __slots__ = ("owner_id", "loop", "queue", "overflowed")
+
+    def __init__(self, owner_id: str, loop: asyncio.AbstractEventLoop):
+        self.owner_id = owner_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=QUEUE_MAX)
+        self.overflowed = False
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a stalled client; it reconnects with Last-Event-ID and catches up
+            self.overflowed = True
+
+
+class StatusHub:
+    def __init__(self, buffer_size: int = BUFFER_SIZE, owners_max: int = OWNERS_MAX):
+        self._lock = threading.Lock()
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._next_id = 1
+        self._subs: Dict[str, Set[_Subscriber]] = {}
+        self._owners: "OrderedDict[str, str]" = OrderedDict()
+        self._owners_max = owners_max
+
+    def publish(self, upload_id: str, fields: Dict[str, Any], owner_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Record a status transition for upload_id. owner_id may be omitted
+        once the upload's owner has been seen. Returns the event (or None
+        when the owner is unknown and nobody could receive it)."""
+        upload_id = str(upload_id)
+        with self._lock:
+            if owner_id:
+                self._owners[upload_id] = str(owner_id)
+            owner = self._owners.get(upload_id)
+            if not owner:
+                return None
+            self._owners.move_to_end(upload_id)
+            while len(self._owners) > self._owners_max:
+                self._owners.popitem(last=False)
+            event = {
+                "id": self._next_id,
+                "upload_id": upload_id,
+                "owner_id": owner,
+                "status": contract_status(fields.get("ocr_status")),
+                "ocr_status": fields.get("ocr_status"),
+                "error": fields.get("ocr_error"),
+                "at": time.time(),
+            }
+            text = fields.get("extracted_text")
+            if isinstance(text, str):
+                event["text_len"] = len(text.strip())
+            elif "text_len" in fields:
+                event["text_len"] = fields["text_len"]
+            self._next_id += 1
+            self._buffer.append(event)
+            subs = list(self._subs.get(owner, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:  # subscriber's loop already closed
+                self._drop(sub)
+        return event
+
+    def subscribe(self, owner_id: str, last_event_id: Optional[int] = None) -> Tuple[_Subscriber, List[Dict[str, Any]], bool]:
+        """Register a subscriber on the running loop. Returns (subscriber,
+        backlog after last_event_id, reset) where reset means events were
+        missed that are no longer buffered."""
+        sub = _Subscriber(str(owner_id), asyncio.get_running_loop())
+        with self._lock:
+            self._subs.setdefault(sub.owner_id, set()).add(sub)
+            backlog: List[Dict[str, Any]] = []
+            reset = False
+            if last_event_id is not None:
+                oldest = self._buffer[0]["id"] if self._buffer else self._next_id
+                # ids restart with the process, so an id from the future means a restart
+                reset = last_event_id + 1 < oldest or last_event_id >= self._next_id
+                backlog = [e for e in self._buffer if e["id"] > last_event_id and e["owner_id"] == sub.owner_id]
+        return sub, backlog, reset
+
+    def _drop(self, sub: _Subscriber) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.owner_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.owner_id]
+
+    unsubscribe = _drop
+
+    def last_id(self) -> int:
+        with self._lock:
+            return self._next_id - 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "last_event_id": self._next_id - 1,
+                "buffered": len(self._buffer),
+                "subscribers": sum(len(s) for s in self._subs.values()),
+                "owners": len(self._subs),
+                "known_uploads": len(self._owners),
+            }
+
+
+def format_sse(data: Dict[str, Any], *, event: str = "status", event_id: Optional[int] = None) -> str:
+    out = ""
+    if event_id is not None:
+        out += f"id: {event_id}\n"
+    out += f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+    return out
+
+
+async def stream(
+    hub: StatusHub,
+    owner_id: str,
+    last_event_id: Optional[int],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    *,
+    heartbeat: float = HEARTBEAT_S,
+) -> AsyncIterator[str]:
+    """SSE frames for one client: backlog first, then live events, with a
+    comment line every ``heartbeat`` seconds to keep proxies from idling out."""
+    sub, backlog, reset = hub.subscribe(owner_id, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        if reset:
+            yield format_sse({"reason": "buffer_exceeded"}, event="reset", event_id=hub.last_id())
+        for ev in backlog:
+            yield format_sse(ev, event_id=ev["id"])
+        while True:
+            if sub.overflowed:
+                sub.overflowed = False
+                yield format_sse({"reason": "slow_consumer"}, event="reset", event_id=hub.last_id())
+            try:
+                ev = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(ev, event_id=ev["id"])
+    finally:
+        hub.unsubscribe(sub)
+
+
+hub = StatusHub()
+_forward: Optional[Callable[[str, Dict[str, Any], Optional[str]], Any]] = None
+
+
+def forward_to(sink: Optional[Callable[[str, Dict[str, Any], Optional[str]], Any]]) -> None:
+    """Also hand every published status write to sink(upload_id, fields,
+    owner_id); the job worker passes its store's add_event."""
+    global _forward
+    _forward = sink
+
+
+def publish(upload_id: str, fields: Dict[str, Any], rows: Any = None) -> None:
+    """Publish when a write touched ocr_status. rows is the update's returned
+    representation, used to learn the upload's owner."""
+    if "ocr_status" not in (fields or {}):
+        return
+    owner = None
+    if isinstance(rows, list) and rows and isinstance(rows[0], dict):
+        owner = rows[0].get("owner_id")
+    elif isinstance(rows, dict):
+        owner = rows.get("owner_id")
+    hub.publish(upload_id, fields, owner)
+    sink = _forward
+    if sink is not None:
+        slim = {k: fields[k] for k in ("ocr_status", "ocr_error") if k in fields}
+        if isinstance(fields.get("extracted_text"), str):
+            slim["text_len"] = len(fields["extracted_text"].strip())
+        try:
+            sink(str(upload_id), slim, owner)
+        except Exception as e:
+            logger.warning("status event not forwarded upload=%s: %r", upload_id, e)
+
+
+async def relay(
+    store: Any,
+    *,
+    interval: float = RELAY_INTERVAL_S,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> None:
+    """Republish on this process's hub the events other processes recorded in
+    store (add_event/events_since/last_event_id), starting from now. on_event
+    sees each recorded row first, e.g. to drop a cached upload row."""
+    last = await asyncio.to_thread(store.last_event_id)
+    while True:
+        try:
+            rows = await asyncio.to_thread(store.events_since, last)
+        except Exception as e:
+            logger.warning("status relay read failed: %r", e)
+            rows = []
+        for row in rows:
+            last = row["id"]
+            if on_event is not None:
+                on_event(row)
+            hub.publish(row["upload_id"], row["fields"], row.get("owner_id"))
+        if not rows:
+            await asyncio.sleep(interval)
@@ -0,0 +1,37 @@
+"""
+JSON encoding for hot paths: orjson when installed, else the stdlib.
+
+``response(payload, **raw)`` sends a JSON object whose ``raw`` members are
+already-encoded JSON, so a document encoded once (e.g. ``grade_json`` for
+the DB write) goes into the HTTP body as is instead of through FastAPI's
+``jsonable_encoder``.
+"""
+import json
+from typing import Any
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response(payload: dict, status_code: int = 200, **raw: bytes) -> Response:
+    body = dumps(payload)
+    if raw:
+        members = b",".join(dumps(k) + b":" + v for k, v in raw.items())
+        body = body[:-1] + (b"," if payload else b"") + members + b"}"
+    return Response(content=body, status_code=status_code, media_type="application/json")
@@ -0,0 +1,299 @@
+"""
+Graded-PDF downloads: local disk cache, ETag and HTTP Range.
+
+``GET /api/uploads/{id}/graded.pdf`` used to mean a signed URL or a full
+in-memory download. Here the PDF is spooled once from Storage in chunks
+(signed URL over the shared HTTP pool, falling back to the Storage client)
+into a size-bounded disk cache while its SHA-256 is computed; every
+download, repeat or partial, is then served from that file in chunks.
+
+Cache entries are keyed on the storage path plus the row fields that change
+whenever the PDF is regenerated, so a re-graded packet is fetched again
+while old entries age out by LRU.
+
+Config (env):
+  GRADED_PDF_CACHE_DIR     on-disk store (default <tmp>/graderai-graded-pdf)
+  GRADED_PDF_CACHE_MAX_MB  size bound, LRU eviction (default 1024)
+  GRADED_PDF_CHUNK_KB      read/stream chunk size (default 256)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+import httpx
+from starlette.responses import Response, StreamingResponse
+
+from . import http as shared_http
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MB = 1024
+DEFAULT_CHUNK_KB = 256
+SIGNED_URL_TTL_S = 60
+
+_RANGE_RE = re.compile(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", re.I)
+
+
+class Entry(NamedTuple):
+    path: str
+    size: int
+    etag: str
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def chunk_size() -> int:
+    return int(float(os.getenv("GRADED_PDF_CHUNK_KB") or DEFAULT_CHUNK_KB) * 1024)
+
+
+def version_key(storage_path: str, *version: Any) -> str:
+    parts = [str(storage_path or "")] + ["" if v is None else str(v) for v in version]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single ``bytes=`` range, or None to send
+    the whole file (no header, multiple ranges or another unit). Raises
+    RangeNotSatisfiable when the range lies outside the file."""
+    if not header:
+        return None
+    m = _RANGE_RE.match(header)
+    if not m:
+        return None
+    first, last = m.group(1), m.group(2)
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        n = int(last)
+        if n == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def _etag_listed(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class PDFCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def get(self, key: str) -> Optional[Entry]:
+        path = self._path(key)
+        try:
+            with open(f"{path}.sha256", "r", encoding="ascii") as fh:
+                digest = fh.read().strip()
+            size = os.path.getsize(path)
+            os.utime(path)  # bump recency for LRU eviction
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return Entry(path, size, f'"{digest}"')
+
+    def writer(self, key: str) -> "_Writer":
+        return _Writer(self, key)
+
+    def _evict(self) -> None:
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for fn in files:
+                if not fn.endswith(".pdf"):
+                    continue
+                p = os.path.join(root, fn)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _m, size, _p in entries)
+        for _mtime, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for victim in (f"{p}.sha256", p):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "directory": self.directory}
+
+
+class _Writer:
+    """Spools chunks to a temp file, hashing as it goes; commit() publishes
+    the file and its digest atomically under the cache key."""
+
+    def __init__(self, cache: PDFCache, key: str):
+        self.cache = cache
+        self.path = cache._path(key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.{id(self)}.tmp"
+        self._fh = open(self._tmp, "wb")
+        self._sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        self._fh.write(chunk)
+        self._sha.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Entry:
+        self._fh.close()
+        digest = self._sha.hexdigest()
+        os.replace(self._tmp, self.path)
+        with open(f"{self.path}.sha256.tmp{id(self)}", "w", encoding="ascii") as fh:
+            fh.write(digest)
+        os.replace(f"{self.path}.sha256.tmp{id(self)}", f"{self.path}.sha256")
+        self.cache._evict()
+        return Entry(self.path, self.size, f'"{digest}"')
+
+    def abort(self) -> None:
+        self._fh.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+_cache: Optional[PDFCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> PDFCache:
+    global _cache
+    directory = os.getenv("GRADED_PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "graderai-graded-pdf")
+    with _cache_lock:
+        if _cache is None or _cache.directory != directory:
+            _cache = PDFCache(
+                directory,
+                max_bytes=int(float(os.getenv("GRADED_PDF_CACHE_MAX_MB") or DEFAULT_MAX_MB) * 1024 * 1024),
+            )
+        return _cache
+
+
+def _signed_url(bucket: Any, path: str) -> Optional[str]:
+    signed = bucket.create_signed_url(path, SIGNED_URL_TTL_S)
+    if isinstance(signed, dict):
+        return signed.get("signedURL") or signed.get("signedUrl")
+    return None
+
+
+async def _spool_signed(bucket: Any, path: str, writer: _Writer) -> bool:
+    try:
+        url = await asyncio.to_thread(_signed_url, bucket, path)
+    except Exception as e:
+        logger.info("graded_pdf sign failed path=%s: %s", path, e)
+        return False
+    if not url:
+        return False
+    try:
+        async with shared_http.client(timeout=60) as client:
+            async with client.stream("GET", url) as r:
+                if r.status_code != 200:
+                    logger.warning("graded_pdf signed GET %s path=%s", r.status_code, path)
+                    return False
+                async for chunk in r.aiter_bytes(chunk_size()):
+                    await asyncio.to_thread(writer.write, chunk)
+    except httpx.HTTPError as e:
+        logger.warning("graded_pdf signed GET failed path=%s: %s", path, e)
+        return False
+    return True
+
+
+async def fetch(storage: Any, bucket_name: str, path: str, key: str) -> Entry:
+    """The cached entry for key, spooling it from Storage on a miss."""
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+    bucket = storage.from_(bucket_name)
+    writer = cache.writer(key)
+    try:
+        if not await _spool_signed(bucket, path, writer):
+            # Storage client fallback: one buffered download
+            writer.abort()
+            writer = cache.writer(key)
+            blob = await asyncio.to_thread(bucket.download, path)
+            writer.write(bytes(blob or b""))
+        return await asyncio.to_thread(writer.commit)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def _iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    step = chunk_size()
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(step, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def respond(entry: Entry, headers: Mapping[str, str], filename: str) -> Response:
+    """304, 416, 206 or 200 for a cached PDF given the request headers."""
+    base: Dict[str, str] = {
+        "ETag": entry.etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if _etag_listed(headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=base)
+
+    rng = headers.get("range")
+    if_range = headers.get("if-range")
+    if rng and if_range and if_range.strip() != entry.etag:
+        rng = None  # representation changed: send it whole
+    try:
+        span = parse_range(rng, entry.size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**base, "Content-Range": f"bytes */{entry.size}"})
+
+    base["Content-Disposition"] = f'inline; filename="{filename}"'
+    if span is None:
+        start, end, status = 0, entry.size - 1, 200
+    else:
+        (start, end), status = span, 206
+        base["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+    base["Content-Length"] = str(max(0, end - start + 1))
+    return StreamingResponse(
+        _iter_file(entry.path, start, end),
+        status_code=status,
+        media_type="application/pdf",
+        headers=base,
+    )
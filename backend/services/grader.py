@@ -1,22 +1,27 @@
 from __future__ import annotations
 
 import re
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 # Try to import the real PDF overlay builder; if unavailable (e.g., no reportlab), fall back to a mock.
 try:
-    from .report import build_overlay_basic  # real implementation (uses reportlab)
+    from .report import build_overlay_basic  # real implementation (reportlab loads on first PDF)
     _HAS_REPORT = True
 except Exception:
     _HAS_REPORT = False
     build_overlay_basic = None  # type: ignore
 
+from .text_index import NUMBER, Span, TextIndex, terms
+
+# (text, {question id: (start, end)}), as from regioner.answer_sections
+Sections = Tuple[str, Dict[str, Tuple[int, int]]]
 from ..models.schemas import (
     Question,
     AutoKey,
-    QuestionGrade,
-    CriterionScore,
-    GradeResult,
     Overlay,
 )
 
@@ -24,58 +29,60 @@ RUBRIC_VERSION = "0.1"
 PROMPT_VERSION = "0.1"
 
 
-def parse_questions(extracted_text: str) -> List[Question]:
-    """
-    Extremely simple heuristic parser:
-    - Lines like "1) ..." or "Q1: ..." become questions
-    - Detect MCQ if options like (A) (B) (C) (D) appear near the block
-    - Detect numeric if the prompt contains patterns like "= ?" or "answer:" and numbers
-    - Otherwise classify as short_answer
-    """
-    lines = [ln.strip() for ln in (extracted_text or "").splitlines()]
+QUESTION_START = re.compile(r"^(?:Q\s*)?(\d{1,2})[\).:]\s*(.*)$", re.I)
+OPTION = re.compile(r"\(([A-E])\)\s*([^\(\)]{1,80})")
+NUMERIC_HINT = re.compile(r"=\s*\?|answer\s*:|solve|\bnumerical\b", re.I)
+
+_Parsed = Tuple[Tuple[str, str, str, Optional[Tuple[str, ...]]], ...]
+
+
+def _options(text: str) -> List[str]:
+    """First option text per letter A..E, from one scan of the block."""
+    found = {}
+    for m in OPTION.finditer(text):
+        found.setdefault(m.group(1), m.group(2).strip())
+    return [found[ch] for ch in "ABCDE" if ch in found]
+
+
+@lru_cache(maxsize=256)
+def _parse(extracted_text: str) -> _Parsed:
     blocks: List[Tuple[str, List[str]]] = []  # (qid, block_lines)
-    current_id = None
-    current_block: List[str] = []
-
-    def flush():
-        nonlocal current_id, current_block
-        if current_id is not None:
-            blocks.append((current_id, current_block))
-        current_id = None
-        current_block = []
-
-    qstart = re.compile(r"^(?:Q\s*)?(\d{1,2})[\).:]\s*(.*)$", re.I)
-    for ln in lines:
-        m = qstart.match(ln)
+    for ln in extracted_text.splitlines():
+        ln = ln.strip()
+        m = QUESTION_START.match(ln)
         if m:
-            flush()
-            current_id = m.group(1)
             rest = m.group(2).strip()
-            current_block = [rest] if rest else []
-        else:
-            if current_id is None:
-                continue
-            current_block.append(ln)
-    flush()
+            blocks.append((m.group(1), [rest] if rest else []))
+        elif blocks:
+            blocks[-1][1].append(ln)
 
-    questions: List[Question] = []
+    parsed = []
     for qid, blines in blocks:
         text = " ".join([ln for ln in blines if ln])
-        # detect options
-        options = []
-        for ch in ["A", "B", "C", "D", "E"]:
-            pat = re.compile(rf"\({ch}\)\s*([^\(\)]{{1,80}})")
-            m = pat.search(text)
-            if m:
-                options.append(m.group(1).strip())
+        options = _options(text)
         if len(options) >= 2:
             qtype = "MCQ"
-        elif re.search(r"=\s*\?|answer\s*:|solve|\bnumerical\b", text, re.I):
+        elif NUMERIC_HINT.search(text):
             qtype = "numeric"
         else:
             qtype = "short_answer"
+        parsed.append((str(qid), text or f"Q{qid}", qtype, tuple(options) or None))
+    return tuple(parsed)
 
-        questions.append(Question(id=str(qid), prompt=text or f"Q{qid}", qtype=qtype, options=options or None))
+
+def parse_questions(extracted_text: str) -> List[Question]:
+    """
+    Extremely simple heuristic parser:
+    - Lines like "1) ..." or "Q1: ..." become questions
+    - Detect MCQ if options like (A) (B) (C) (D) appear near the block
+    - Detect numeric if the prompt contains patterns like "= ?" or "answer:" and numbers
+    - Otherwise classify as short_answer
+    Parses are cached per text (a submission is parsed again on re-grade).
+    """
+    questions = [
+        Question(id=qid, prompt=prompt, qtype=qtype, options=list(options) if options else None)
+        for qid, prompt, qtype, options in _parse(extracted_text or "")
+    ]
 
     # Fallback to a single short_answer if nothing detected
     if not questions and extracted_text.strip():
@@ -89,7 +96,7 @@ def generate_autokeys(questions: List[Question]) -> List[AutoKey]:
     for q in questions:
         if q.qtype == "numeric":
             # simple heuristic: first number in prompt is the key; else 0
-            m = re.search(r"-?\d+(?:\.\d+)?", q.prompt)
+            m = NUMBER.search(q.prompt)
             ans = m.group(0) if m else "0"
             keys.append(AutoKey(question_id=q.id, answer=ans))
         elif q.qtype == "MCQ":
@@ -104,79 +111,239 @@ def generate_autokeys(questions: List[Question]) -> List[AutoKey]:
     return keys
 
 
-def grade(questions: List[Question], keys: List[AutoKey], student_text: str) -> GradeResult:
-    key_map = {k.question_id: k for k in keys}
-    items: List[QuestionGrade] = []
-    needs_review = False
+@dataclass(slots=True)
+class ItemGrade:
+    """One question's grade; QuestionGrade (with its single "auto"
+    criterion) only at the API boundary."""
+    question_id: str
+    qtype: str
+    score: float
+    max_score: float
+    rationale: str
+    low_confidence: bool
+    evidence: List[Span] = field(default_factory=list)  # spans in the student text
 
-    for q in questions:
-        k = key_map.get(q.id)
-        max_score = 1.0
-        score = 0.0
-        rationale = ""
-        low_conf = False
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "question_id": self.question_id,
+            "qtype": self.qtype,
+            "score": self.score,
+            "max_score": self.max_score,
+            "criteria": [{"name": "auto", "score": self.score, "max_score": self.max_score, "rationale": self.rationale}],
+            "rationale": self.rationale,
+            "low_confidence": self.low_confidence,
+            "evidence": [list(span) for span in self.evidence],
+        }
 
-        if q.qtype == "numeric":
-            # match first numeric extracted
-            sm = re.search(r"-?\d+(?:\.\d+)?", student_text)
-            student = sm.group(0) if sm else None
-            if student is None:
-                rationale = "No numeric answer detected."
-                low_conf = True
-            else:
-                score = 1.0 if student == (k.answer if k else None) else 0.0
-                rationale = f"Expected {k.answer if k else '?'}; got {student}."
-        elif q.qtype == "MCQ":
-            # detect chosen option like "(C)" in the text
-            sm = re.search(r"\(([A-E])\)", student_text)
-            student = sm.group(1) if sm else None
+
+@dataclass(slots=True)
+class Graded:
+    """A submission's grade; to_dict() is GradeResult.model_dump() without
+    building the models."""
+    submission_id: str
+    total_score: float
+    total_max: float
+    items: List[ItemGrade]
+    rubric_version: str = RUBRIC_VERSION
+    prompt_version: str = PROMPT_VERSION
+    needs_review: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "submission_id": self.submission_id,
+            "total_score": self.total_score,
+            "total_max": self.total_max,
+            "items": [item.to_dict() for item in self.items],
+            "rubric_version": self.rubric_version,
+            "prompt_version": self.prompt_version,
+            "needs_review": self.needs_review,
+        }
+
+
+class _Plan:
+    """Per-question columns of one question/key set, shared by every
+    submission graded against it."""
+
+    def __init__(self, questions: List[Question], keys: List[AutoKey]):
+        key_map = {k.question_id: k for k in keys}
+        self.questions = questions
+        self.keys = [key_map.get(q.id) for q in questions]
+        qtypes = [q.qtype for q in questions]
+        self.numeric = np.array([t == "numeric" for t in qtypes], dtype=bool)
+        self.mcq = np.array([t == "MCQ" for t in qtypes], dtype=bool)
+        self.answers = np.array([k.answer if k else None for k in self.keys], dtype=object)
+
+        # short_answer/show_work: key terms (word stems, numbers); every
+        # must_include entry needs all of its terms
+        self.short = np.flatnonzero(~(self.numeric | self.mcq))
+        self.required: List[List[List[str]]] = []
+        self.ref_terms: List[List[str]] = []
+        for j in self.short:
+            k = self.keys[j]
+            required = [t for t in (terms(r) for r in (k.must_include or [])) if t] if k else []
+            ref = terms(k.answer) if k else []
+            self.required.append(required)
+            self.ref_terms.append(list(dict.fromkeys(ref + [t for req in required for t in req])))
+        self.no_ref = np.array([not ts for ts in self.ref_terms], dtype=bool)
+        n_short = len(self.short)
+        self.threshold = np.array([max(1, len(ts) // 4) for ts in self.ref_terms], dtype=np.int32)
+        # (question, term) pairs: each question looks its terms up in its own
+        # answer region, so hits are per pair rather than per vocabulary word
+        self.pairs = [(int(self.short[col]), t) for col, ts in enumerate(self.ref_terms) for t in ts]
+        pair_of = {(col, t): p for p, (col, t) in enumerate((c, t) for c, ts in enumerate(self.ref_terms) for t in ts)}
+        self.incidence = np.zeros((len(self.pairs), n_short), dtype=np.int32)
+        for (col, t), p in pair_of.items():
+            self.incidence[p, col] = 1
+        # one column per must_include entry, mapped back to its question
+        req_cols = [(col, req) for col, required in enumerate(self.required) for req in required]
+        self.req_incidence = np.zeros((len(self.pairs), len(req_cols)), dtype=np.int32)
+        for r, (col, req) in enumerate(req_cols):
+            self.req_incidence[[pair_of[(col, t)] for t in req], r] = 1
+        self.req_size = np.array([len(req) for _col, req in req_cols], dtype=np.int32)
+        self.req_owner = np.zeros((len(req_cols), n_short), dtype=np.int32)
+        for r, (col, _req) in enumerate(req_cols):
+            self.req_owner[r, col] = 1
+
+
+class Grades:
+    """Scores of many submissions against one question/key set, as
+    (submissions x questions) arrays. Per-submission results are only built
+    by result(i)."""
+
+    def __init__(self, plan: _Plan, views: List[List[TextIndex]]):
+        n, m = len(views), len(plan.questions)
+        self.plan = plan
+        self.numbers = np.empty((n, m), dtype=object)
+        self.options = np.empty((n, m), dtype=object)
+        for i, row in enumerate(views):
+            self.numbers[i] = [ix.first_number for ix in row]
+            self.options[i] = [ix.first_option for ix in row]
+        self.scores = np.zeros((n, m), dtype=float)
+        self.low_confidence = np.zeros((n, m), dtype=bool)
+        self.overlap = np.zeros((n, len(plan.short)), dtype=np.int32)
+        self.missing = np.zeros((n, len(plan.short)), dtype=np.int32)  # unmet must_include entries
+        self._views = views
+
+        for mask, student in ((plan.numeric, self.numbers), (plan.mcq, self.options)):
+            if not mask.any() or not n:
+                continue
+            got = student[:, mask]
+            has = np.not_equal(got, None).astype(bool)
+            self.scores[:, mask] = (got == plan.answers[None, mask]) & has
+            self.low_confidence[:, mask] = ~has
+
+        if len(plan.short) and n:
+            if plan.pairs:
+                found = np.array([[row[j].has(t) for j, t in plan.pairs] for row in views], dtype=np.int32)
+                self.overlap = found @ plan.incidence
+                unmet = (found @ plan.req_incidence) < plan.req_size
+                self.missing = unmet.astype(np.int32) @ plan.req_owner
+            scored = np.where((self.overlap >= plan.threshold) & (self.missing == 0), 1.0, 0.0)
+            self.scores[:, plan.short] = np.where(plan.no_ref, 0.5, scored)
+            self.low_confidence[:, plan.short] = plan.no_ref
+
+    def __len__(self) -> int:
+        return self.scores.shape[0]
+
+    @property
+    def totals(self) -> np.ndarray:
+        return self.scores.sum(axis=1)
+
+    @property
+    def needs_review(self) -> np.ndarray:
+        return self.low_confidence.any(axis=1)
+
+    def _rationale(self, i: int, j: int, short_col: Dict[int, int]) -> str:
+        plan = self.plan
+        k = plan.keys[j]
+        if plan.numeric[j] or plan.mcq[j]:
+            student = self.numbers[i, j] if plan.numeric[j] else self.options[i, j]
             if student is None:
-                rationale = "No choice detected."
-                low_conf = True
-            else:
-                score = 1.0 if student == (k.answer if k else None) else 0.0
-                rationale = f"Expected {k.answer if k else '?'}; got {student}."
-        else:
-            # short_answer/show_work: keyword overlap
-            ref = (k.answer if k else "").lower()
-            got = student_text.lower()
-            if not ref:
-                score = 0.5
-                low_conf = True
-                rationale = "No reference answer; partial credit."
-            else:
-                overlap = sum(1 for w in set(ref.split()) if w and w in got)
-                score = 1.0 if overlap >= max(1, len(set(ref.split())) // 4) else 0.0
-                rationale = f"Keyword overlap={overlap}."
-
-        items.append(
-            QuestionGrade(
-                question_id=q.id,
-                qtype=q.qtype,
-                score=score,
-                max_score=max_score,
-                criteria=[CriterionScore(name="auto", score=score, max_score=max_score, rationale=rationale)],
-                rationale=rationale,
-                low_confidence=low_conf,
-            )
+                return "No numeric answer detected." if plan.numeric[j] else "No choice detected."
+            return f"Expected {k.answer if k else '?'}; got {student}."
+        col = short_col[j]
+        if plan.no_ref[col]:
+            return "No reference answer; partial credit."
+        rationale = f"Keyword overlap={int(self.overlap[i, col])}."
+        if self.missing[i, col]:
+            ix = self._views[i][j]
+            missing = [" ".join(req) for req in plan.required[col] if not all(ix.has(t) for t in req)]
+            rationale += f" Missing required: {', '.join(missing)}."
+        return rationale
+
+    def _evidence(self, i: int, j: int, short_col: Dict[int, int]) -> List[Span]:
+        """Where the answer was found: the number or option graded, or each
+        matched key term (first occurrence)."""
+        plan, ix = self.plan, self._views[i][j]
+        if plan.numeric[j]:
+            return ix.number_spans[:1]
+        if plan.mcq[j]:
+            return ix.option_spans[:1]
+        spans = (ix.span(t) for t in plan.ref_terms[short_col[j]])
+        return sorted(sp for sp in spans if sp is not None)
+
+    def result(self, i: int) -> Graded:
+        plan = self.plan
+        short_col = {int(j): c for c, j in enumerate(plan.short)}
+        scores = self.scores[i].tolist()
+        low = self.low_confidence[i].tolist()
+        items = [
+            ItemGrade(q.id, q.qtype, scores[j], 1.0, self._rationale(i, j, short_col), low[j],
+                      self._evidence(i, j, short_col))
+            for j, q in enumerate(plan.questions)
+        ]
+        return Graded(
+            submission_id="",
+            total_score=sum(scores),
+            total_max=float(len(items)),
+            items=items,
+            needs_review=any(low),
         )
-        if low_conf:
-            needs_review = True
-
-    total = sum(i.score for i in items)
-    result = GradeResult(
-        submission_id="",
-        total_score=total,
-        total_max=float(len(items)),
-        items=items,
-        rubric_version=RUBRIC_VERSION,
-        prompt_version=PROMPT_VERSION,
-        needs_review=needs_review,
-    )
-    return result
-
-
-def build_overlay_for_result(result: GradeResult) -> Overlay:
+
+    def results(self) -> Iterator[Graded]:
+        for i in range(len(self)):
+            yield self.result(i)
+
+
+def _views(questions: List[Question], text: str, sections: Optional[Sections]) -> List[TextIndex]:
+    """One index per question: over its own answer region when the OCR
+    lines were split per question, else all share the whole text."""
+    if sections is None or not sections[1]:
+        return [TextIndex(text)] * len(questions)
+    full, spans = sections
+    empty = TextIndex("")
+    return [TextIndex(full, *spans[q.id]) if q.id in spans else empty for q in questions]
+
+
+def grade_many(
+    questions: List[Question],
+    keys: List[AutoKey],
+    texts: Sequence[str],
+    sections: Optional[Sequence[Optional[Sections]]] = None,
+) -> Grades:
+    """Grade many submissions against one question/key set: one tokenizer
+    pass per text (or per answer region), then every question is scored for
+    all texts at once.
+
+    sections[i], when given, is (text, {question id: (start, end)}) from
+    regioner.answer_sections; each question then only sees its own region
+    (questions without one see nothing), and evidence spans index that text.
+    """
+    plan = _Plan(questions, keys)
+    sections = sections or [None] * len(texts)
+    return Grades(plan, [_views(questions, t, sec) for t, sec in zip(texts, sections)])
+
+
+def grade(
+    questions: List[Question],
+    keys: List[AutoKey],
+    student_text: str,
+    sections: Optional[Sections] = None,
+) -> Graded:
+    return grade_many(questions, keys, [student_text], [sections]).result(0)
+
+
+def build_overlay_for_result(result: Graded) -> Overlay:
     """
     Returns an Overlay; if the real report builder isn't available (e.g., reportlab not installed),
     returns a minimal mock PDF overlay so tests can proceed.
@@ -0,0 +1,246 @@
+"""
+Shared outbound HTTP client.
+
+Every provider call (HF inference, Azure Read, HandwritingOCR, signed-URL
+downloads) goes through one pooled ``httpx.AsyncClient`` so TCP/TLS
+handshakes are paid once per host and connections are kept alive between
+OCR jobs. HTTP/2 is used when the ``h2`` package is installed. A client is
+created on first use in each event loop and closed by the app lifespan, or
+when that loop shuts down (a TestClient or ``asyncio.run`` each get their own).
+
+Config (env):
+  HTTP_HTTP2              0 disables HTTP/2 (default 1; needs h2)
+  HTTP_MAX_CONNECTIONS    connections across all hosts (default 100)
+  HTTP_MAX_KEEPALIVE      idle keep-alive connections kept (default 20)
+  HTTP_KEEPALIVE_EXPIRY   seconds an idle connection is kept (default 30)
+  HTTP_CONNECT_TIMEOUT    connect timeout in seconds (default 10)
+  HTTP_TIMEOUT            default read/write/pool timeout in seconds (default 60)
+  HTTP_HOST_LIMITS        per-host connection caps, e.g.
+                          "api-inference.huggingface.co=8,*.cognitiveservices.azure.com=4"
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx only needs it importable)
+    _HAS_H2 = True
+except ModuleNotFoundError:
+    _HAS_H2 = False
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+
+def _host_limits() -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in (os.getenv("HTTP_HOST_LIMITS") or "").split(","):
+        host, _, n = part.strip().partition("=")
+        if host and n.strip().isdigit():
+            out[host.strip()] = int(n)
+    return out
+
+
+class _Stats:
+    """Request counters fed by client event hooks and the scoped wrapper."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.transport_errors = 0
+        self.by_host: Dict[str, Dict[str, int]] = {}
+        self.http_versions: Dict[str, int] = {}
+
+    async def on_request(self, request: httpx.Request) -> None:
+        request.extensions["graderai_t0"] = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            h = self.by_host.setdefault(request.url.host, {"requests": 0, "errors": 0, "total_ms": 0})
+            h["requests"] += 1
+
+    async def on_response(self, response: httpx.Response) -> None:
+        t0 = response.request.extensions.get("graderai_t0")
+        ms = int((time.perf_counter() - t0) * 1000) if t0 else 0
+        with self._lock:
+            h = self.by_host.setdefault(response.request.url.host, {"requests": 0, "errors": 0, "total_ms": 0})
+            h["total_ms"] += ms
+            if response.status_code >= 500:
+                h["errors"] += 1
+                self.errors += 1
+            self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+
+    def track(self, delta: int, failed: bool = False) -> None:
+        with self._lock:
+            self.in_flight += delta
+            if failed:
+                self.transport_errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "errors_5xx": self.errors,
+                "transport_errors": self.transport_errors,
+                "http_versions": dict(self.http_versions),
+                "by_host": {k: dict(v) for k, v in self.by_host.items()},
+            }
+
+
+def _limits(max_connections: Optional[int] = None) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections or int(_env_float("HTTP_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(_env_float("HTTP_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def build_client(stats: Optional[_Stats] = None) -> httpx.AsyncClient:
+    """New pooled client from env config; per-host caps become mounted transports."""
+    http2 = _HAS_H2 and os.getenv("HTTP_HTTP2", "1") != "0"
+    timeout = httpx.Timeout(_env_float("HTTP_TIMEOUT", 60), connect=_env_float("HTTP_CONNECT_TIMEOUT", 10))
+    mounts = {
+        f"all://{host}": httpx.AsyncHTTPTransport(http2=http2, limits=_limits(n))
+        for host, n in _host_limits().items()
+    }
+    hooks = {"request": [stats.on_request], "response": [stats.on_response]} if stats else None
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=_limits(),
+        timeout=timeout,
+        mounts=mounts or None,
+        event_hooks=hooks,
+    )
+
+
+_client: Optional[httpx.AsyncClient] = None  # the most recently used one, for stats()
+_per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, AsyncIterator[None]]]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+_stats = _Stats()
+
+
+async def _close_at_shutdown(c: httpx.AsyncClient) -> AsyncIterator[None]:
+    # parked at the yield; loop.shutdown_asyncgens() (asyncio.run, uvicorn)
+    # resumes it into the finally while the loop can still close the sockets
+    try:
+        yield
+    finally:
+        await c.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """The client of the running event loop. Pooled connections belong to
+    the loop they were opened on, so each loop gets its own client, closed
+    with its pool when that loop shuts down."""
+    global _client
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _per_loop.get(loop)
+        if entry is None or entry[0].is_closed:
+            c = build_client(_stats)
+            closer = _close_at_shutdown(c)
+            _per_loop[loop] = entry = (c, closer)
+            asyncio.ensure_future(closer.__anext__())
+        _client = entry[0]
+    return entry[0]
+
+
+class _Scoped:
+    """Shared client with a per-call default timeout."""
+
+    def __init__(self, client: httpx.AsyncClient, timeout: Any):
+        self._client = client
+        self._timeout = timeout
+
+    async def request(self, method: str, url: Any, **kwargs: Any) -> httpx.Response:
+        if self._timeout is not None:
+            kwargs.setdefault("timeout", self._timeout)
+        _stats.track(1)
+        failed = False
+        try:
+            return await self._client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            _stats.track(-1, failed)
+
+    async def get(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: Any, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: Any, **kwargs: Any) -> AsyncIterator[httpx.Response]:
+        """``client.stream`` with the same timeout default and accounting."""
+        if self._timeout is not None:
+            kwargs.setdefault("timeout", self._timeout)
+        _stats.track(1)
+        failed = False
+        try:
+            async with self._client.stream(method, url, **kwargs) as response:
+                yield response
+        except httpx.TransportError:
+            failed = True
+            raise
+        finally:
+            _stats.track(-1, failed)
+
+
+@asynccontextmanager
+async def client(timeout: Any = None) -> AsyncIterator[_Scoped]:
+    """Drop-in for ``async with httpx.AsyncClient(timeout=...) as client``
+    that borrows the shared pool instead of opening (and closing) a new one."""
+    yield _Scoped(get_client(), timeout)
+
+
+def _pool_info(transport: Any) -> Dict[str, Any]:
+    pool = getattr(transport, "_pool", None)
+    conns = list(getattr(pool, "connections", []) or [])
+    return {
+        "connections": len(conns),
+        "idle": sum(1 for c in conns if c.is_idle()),
+        "max_connections": getattr(pool, "_max_connections", None),
+    }
+
+
+def stats() -> Dict[str, Any]:
+    c = _client
+    out: Dict[str, Any] = {
+        "open": c is not None and not c.is_closed,
+        "http2_available": _HAS_H2,
+        "host_limits": _host_limits(),
+        **_stats.snapshot(),
+    }
+    if c is not None and not c.is_closed:
+        out["pools"] = {"default": _pool_info(getattr(c, "_transport", None))}
+        for pattern, transport in (getattr(c, "_mounts", None) or {}).items():
+            if transport is not None:
+                out["pools"][str(pattern.pattern)] = _pool_info(transport)
+    return out
+
+
+async def aclose() -> None:
+    """Close the running loop's client (the app lifespan calls this)."""
+    global _client
+    with _lock:
+        entry = _per_loop.pop(asyncio.get_running_loop(), None)
+        if entry is not None and entry[0] is _client:
+            _client = None
+    if entry is not None:
+        await entry[0].aclose()
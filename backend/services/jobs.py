@@ -0,0 +1,317 @@
+"""
+Durable background job queue for OCR and grading.
+
+Request handlers enqueue a row and return; ``python -m backend.worker``
+processes claim jobs under a time-limited lease, heartbeat while working,
+and either complete them or release them for a retry with backoff. A job
+whose worker dies is picked up again once its lease expires.
+
+``JobStore`` is the interface the worker and the app use; SQLite
+(``SQLiteJobStore``) is the only implementation, so every worker has to
+share the JOBS_DB file, i.e. run on the same host as the app.
+
+The store also carries upload status events across processes: a worker
+appends its ``ocr_status`` writes with ``add_event`` and the app tails them
+with ``events_since`` (see ``events.relay``). Only the newest EVENTS_KEEP
+are kept.
+
+Config (env):
+  JOBS_MODE          inline (default) runs work in the request; queue enqueues
+  JOBS_DB            SQLite file (default backend/.jobs.sqlite3)
+  JOBS_LEASE_S       lease length in seconds (default 120)
+  JOBS_MAX_ATTEMPTS  attempts before a job is marked failed (default 3)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Sequence
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+DEFAULT_LEASE_S = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_S = 5.0
+RETRY_MAX_S = 300.0
+EVENTS_KEEP = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    upload_id     TEXT,
+    owner_id      TEXT,
+    payload       TEXT NOT NULL DEFAULT '{}',
+    status        TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    max_attempts  INTEGER NOT NULL,
+    run_after     REAL NOT NULL,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    result        TEXT,
+    error         TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS jobs_upload_idx ON jobs (kind, upload_id, status);
+CREATE TABLE IF NOT EXISTS job_events (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    upload_id   TEXT NOT NULL,
+    owner_id    TEXT,
+    fields      TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+"""
+
+
+def jobs_mode() -> str:
+    return (os.getenv("JOBS_MODE") or "inline").strip().lower()
+
+
+def queue_enabled() -> bool:
+    return jobs_mode() == "queue"
+
+
+def lease_seconds() -> float:
+    return float(os.getenv("JOBS_LEASE_S") or DEFAULT_LEASE_S)
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_S, RETRY_BASE_S * 2 ** max(0, attempts - 1))
+
+
+class JobStore(Protocol):
+    """Queue operations every backend implements."""
+
+    def enqueue(self, kind: str, *, upload_id: Optional[str] = None, owner_id: Optional[str] = None,
+                payload: Optional[Dict[str, Any]] = None, max_attempts: Optional[int] = None) -> Dict[str, Any]:
+        """Add a queued job and return it."""
+        ...
+
+    def claim(self, worker_id: str, kinds: Optional[Sequence[str]] = None,
+              lease_s: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Lease the next runnable job (queued and due, or running with an
+        expired lease) to worker_id; None when there is none."""
+        ...
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_s: Optional[float] = None) -> bool:
+        """Extend the lease; False once worker_id no longer holds it."""
+        ...
+
+    def complete(self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None) -> bool:
+        """Mark the job done; False once worker_id no longer holds it."""
+        ...
+
+    def fail(self, job_id: str, worker_id: str, error: str, *, retry: bool = True) -> Optional[Dict[str, Any]]:
+        """Release the job for a retry with backoff, or mark it failed when
+        retry is False or its attempts are used up; returns the job."""
+        ...
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def add_event(self, upload_id: str, fields: Dict[str, Any], owner_id: Optional[str] = None) -> int:
+        """Record an upload status write made in this process; returns its id."""
+        ...
+
+    def events_since(self, after_id: int, limit: int = 500) -> List[Dict[str, Any]]:
+        """Recorded events with id > after_id, oldest first."""
+        ...
+
+    def last_event_id(self) -> int:
+        """Id of the newest recorded event (0 when there is none)."""
+        ...
+
+
+def _row(r: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+    if r is None:
+        return None
+    d = dict(r)
+    for k in ("payload", "result"):
+        if d.get(k):
+            d[k] = json.loads(d[k])
+    return d
+
+
+class SQLiteJobStore:
+    def __init__(self, path: str, max_attempts: Optional[int] = None):
+        self.path = path
+        self.max_attempts = max_attempts or int(os.getenv("JOBS_MAX_ATTEMPTS") or DEFAULT_MAX_ATTEMPTS)
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.executescript(_SCHEMA)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # autocommit mode; writers take the lock explicitly with BEGIN IMMEDIATE
+        c = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        c.row_factory = sqlite3.Row
+        try:
+            yield c
+        finally:
+            c.close()
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                yield c
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            c.execute("COMMIT")
+
+    def enqueue(self, kind, *, upload_id=None, owner_id=None, payload=None, max_attempts=None):
+        """Insert a queued job. An upload with the same kind already queued or
+        running is returned instead of being enqueued twice."""
+        now = time.time()
+        with self._tx() as c:
+            if upload_id:
+                existing = c.execute(
+                    "SELECT * FROM jobs WHERE kind=? AND upload_id=? AND status IN (?, ?) LIMIT 1",
+                    (kind, upload_id, QUEUED, RUNNING),
+                ).fetchone()
+                if existing is not None:
+                    return _row(existing)
+            job_id = uuid.uuid4().hex
+            c.execute(
+                "INSERT INTO jobs (id, kind, upload_id, owner_id, payload, status, attempts, max_attempts,"
+                " run_after, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?)",
+                (job_id, kind, upload_id, owner_id, json.dumps(payload or {}), QUEUED,
+                 max_attempts or self.max_attempts, now, now, now),
+            )
+            return _row(c.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def claim(self, worker_id, kinds=None, lease_s=None):
+        """Lease the oldest runnable job: queued and due, or running with an
+        expired lease (its worker died). Returns None when there is none."""
+        now = time.time()
+        lease_s = lease_seconds() if lease_s is None else lease_s
+        kind_sql, kind_args = "", []
+        if kinds:
+            kind_sql = f" AND kind IN ({','.join('?' * len(kinds))})"
+            kind_args = list(kinds)
+        with self._tx() as c:
+            # Expired leases that already used their last attempt are dead
+            c.execute(
+                "UPDATE jobs SET status=?, error=COALESCE(error, 'lease_expired'), lease_owner=NULL,"
+                " updated_at=? WHERE status=? AND lease_expires<? AND attempts>=max_attempts",
+                (FAILED, now, RUNNING, now),
+            )
+            r = c.execute(
+                "SELECT id FROM jobs WHERE ((status=? AND run_after<=?) OR (status=? AND lease_expires<?))"
+                + kind_sql + " ORDER BY run_after, created_at LIMIT 1",
+                [QUEUED, now, RUNNING, now, *kind_args],
+            ).fetchone()
+            if r is None:
+                return None
+            c.execute(
+                "UPDATE jobs SET status=?, attempts=attempts+1, lease_owner=?, lease_expires=?, updated_at=?"
+                " WHERE id=?",
+                (RUNNING, worker_id, now + lease_s, now, r["id"]),
+            )
+            return _row(c.execute("SELECT * FROM jobs WHERE id=?", (r["id"],)).fetchone())
+
+    def heartbeat(self, job_id, worker_id, lease_s=None):
+        lease_s = lease_seconds() if lease_s is None else lease_s
+        now = time.time()
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE jobs SET lease_expires=?, updated_at=? WHERE id=? AND lease_owner=? AND status=?",
+                (now + lease_s, now, job_id, worker_id, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id, worker_id, result=None):
+        now = time.time()
+        with self._tx() as c:
+            cur = c.execute(
+                "UPDATE jobs SET status=?, result=?, error=NULL, lease_owner=NULL, lease_expires=NULL,"
+                " updated_at=? WHERE id=? AND lease_owner=? AND status=?",
+                (DONE, json.dumps(result or {}, default=str), now, job_id, worker_id, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def fail(self, job_id, worker_id, error, *, retry=True):
+        """Release a job after an error: back to queued with backoff while
+        attempts remain (and retry=True), otherwise failed. Returns the job."""
+        now = time.time()
+        with self._tx() as c:
+            r = c.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id=? AND lease_owner=? AND status=?",
+                (job_id, worker_id, RUNNING),
+            ).fetchone()
+            if r is None:
+                return None
+            if retry and r["attempts"] < r["max_attempts"]:
+                c.execute(
+                    "UPDATE jobs SET status=?, run_after=?, error=?, lease_owner=NULL, lease_expires=NULL,"
+                    " updated_at=? WHERE id=?",
+                    (QUEUED, now + retry_delay(r["attempts"]), error, now, job_id),
+                )
+            else:
+                c.execute(
+                    "UPDATE jobs SET status=?, error=?, lease_owner=NULL, lease_expires=NULL, updated_at=?"
+                    " WHERE id=?",
+                    (FAILED, error, now, job_id),
+                )
+            return _row(c.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def get(self, job_id):
+        with self._conn() as c:
+            return _row(c.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def add_event(self, upload_id, fields, owner_id=None):
+        with self._tx() as c:
+            cur = c.execute(
+                "INSERT INTO job_events (upload_id, owner_id, fields, created_at) VALUES (?, ?, ?, ?)",
+                (str(upload_id), owner_id, json.dumps(fields, default=str), time.time()),
+            )
+            c.execute("DELETE FROM job_events WHERE id<=?", (cur.lastrowid - EVENTS_KEEP,))
+            return cur.lastrowid
+
+    def events_since(self, after_id, limit=500):
+        with self._conn() as c:
+            rows = c.execute("SELECT * FROM job_events WHERE id>? ORDER BY id LIMIT ?", (after_id, limit)).fetchall()
+        return [{**dict(r), "fields": json.loads(r["fields"])} for r in rows]
+
+    def last_event_id(self):
+        with self._conn() as c:
+            return c.execute("SELECT COALESCE(MAX(id), 0) FROM job_events").fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self._conn() as c:
+            return {r["status"]: r["n"] for r in c.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def default_db_path() -> str:
+    return os.getenv("JOBS_DB") or os.path.join(os.path.dirname(os.path.dirname(__file__)), ".jobs.sqlite3")
+
+
+def get_store() -> JobStore:
+    global _store
+    path = default_db_path()
+    with _store_lock:
+        if _store is None or getattr(_store, "path", None) != path:
+            _store = SQLiteJobStore(path)
+        return _store
+
+
+def public(job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Job fields safe to return to API callers."""
+    if job is None:
+        return None
+    keys: List[str] = ["id", "kind", "upload_id", "status", "attempts", "max_attempts", "error", "result",
+                       "created_at", "updated_at"]
+    return {k: job.get(k) for k in keys}
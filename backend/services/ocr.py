@@ -4,6 +4,8 @@ from typing import Any, Optional
 
 import httpx
 
+from . import http as shared_http
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,7 +35,7 @@ class HFInferenceOCRProvider(BaseOCRProvider):
             raise ValueError("Either image_bytes or image_url must be provided")
 
         headers = {"Authorization": f"Bearer {self.token}"}
-        async with httpx.AsyncClient(timeout=60) as client:
+        async with shared_http.client(timeout=60) as client:
             if image_url:
                 resp = await client.post(self.api_url, headers=headers, json={"inputs": image_url})
             else:
@@ -0,0 +1,240 @@
+"""
+In-process scheduler for bulk (class-set) OCR.
+
+``submit`` records a batch and enqueues one job per upload, returning
+immediately. Jobs are grouped into one lane per OCR provider; each lane
+runs a fixed number of worker tasks (its concurrency limit), and workers
+take jobs round-robin across owners so one teacher's 150-page packet
+doesn't starve everybody else queued behind it.
+
+Config (env):
+  OCR_BATCH_LIMITS         per-provider concurrency, e.g. "azure_vision=8,tesseract=2"
+  OCR_BATCH_DEFAULT_LIMIT  concurrency for providers not listed (default 2)
+  OCR_BATCH_MAX_ITEMS      largest accepted batch (default 500)
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 2
+DEFAULT_MAX_ITEMS = 500
+KEEP_BATCHES = 200
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# runner(upload_id, batch) -> {"status": "done"|..., "error": ...}
+Runner = Callable[[str, "Batch"], Awaitable[Dict[str, Any]]]
+
+
+def parse_limits(raw: Optional[str]) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    for part in (raw or "").split(","):
+        name, _, n = part.strip().partition("=")
+        if name and n.strip().isdigit() and int(n) > 0:
+            out[name.strip().lower()] = int(n)
+    return out
+
+
+def max_items() -> int:
+    return int(os.getenv("OCR_BATCH_MAX_ITEMS") or DEFAULT_MAX_ITEMS)
+
+
+class Batch:
+    def __init__(self, owner_id: Optional[str], provider: str, upload_ids: List[str], model: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.owner_id = owner_id
+        self.provider = provider
+        self.model = model
+        self.items: Dict[str, str] = {uid: QUEUED for uid in upload_ids}
+        self.errors: Dict[str, str] = {}
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def _mark(self, upload_id: str, state: str, error: Optional[str] = None) -> None:
+        self.items[upload_id] = state
+        if error:
+            self.errors[upload_id] = error
+        if state in (DONE, FAILED) and all(s in (DONE, FAILED) for s in self.items.values()):
+            self.finished_at = time.time()
+
+    def progress(self) -> Dict[str, Any]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for s in self.items.values():
+            counts[s] += 1
+        total = len(self.items)
+        finished = counts[DONE] + counts[FAILED]
+        if finished == total:
+            state = DONE
+        elif counts[RUNNING] or finished:
+            state = RUNNING
+        else:
+            state = QUEUED
+        return {
+            "batch_id": self.id,
+            "provider": self.provider,
+            "status": state,
+            "total": total,
+            **counts,
+            "percent": round(100.0 * finished / total, 1) if total else 100.0,
+            "elapsed_ms": int(((self.finished_at or time.time()) - self.created_at) * 1000),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = self.progress()
+        out["items"] = [
+            {"upload_id": uid, "status": st, **({"error": self.errors[uid]} if uid in self.errors else {})}
+            for uid, st in self.items.items()
+        ]
+        return out
+
+
+class _Lane:
+    """One provider's queue: per-owner FIFOs served round-robin."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.owners: "OrderedDict[Optional[str], Deque[Tuple[Batch, str]]]" = OrderedDict()
+        self.wake = asyncio.Event()
+        self.workers: List[asyncio.Task] = []
+        self.running = 0
+
+    def put(self, owner: Optional[str], jobs: Iterable[Tuple[Batch, str]]) -> None:
+        self.owners.setdefault(owner, deque()).extend(jobs)
+        self.wake.set()
+
+    def take(self) -> Optional[Tuple[Batch, str]]:
+        while self.owners:
+            owner, q = next(iter(self.owners.items()))
+            if not q:
+                del self.owners[owner]
+                continue
+            job = q.popleft()
+            # next job comes from the next owner in line
+            if q:
+                self.owners.move_to_end(owner)
+            else:
+                del self.owners[owner]
+            return job
+        return None
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self.owners.values())
+
+
+class OCRScheduler:
+    def __init__(
+        self,
+        runner: Runner,
+        limits: Optional[Dict[str, int]] = None,
+        default_limit: Optional[int] = None,
+    ):
+        self.runner = runner
+        self.limits = parse_limits(os.getenv("OCR_BATCH_LIMITS")) if limits is None else dict(limits)
+        self.default_limit = default_limit or int(os.getenv("OCR_BATCH_DEFAULT_LIMIT") or DEFAULT_LIMIT)
+        self._lanes: Dict[str, _Lane] = {}
+        self._batches: "OrderedDict[str, Batch]" = OrderedDict()
+
+    def _lane(self, provider: str) -> _Lane:
+        lane = self._lanes.get(provider)
+        if lane is None:
+            lane = self._lanes[provider] = _Lane(provider, self.limits.get(provider, self.default_limit))
+            loop = asyncio.get_running_loop()
+            lane.workers = [
+                loop.create_task(self._worker(lane), name=f"ocr-batch-{provider}-{i}")
+                for i in range(lane.limit)
+            ]
+        return lane
+
+    def submit(
+        self,
+        owner_id: Optional[str],
+        upload_ids: List[str],
+        provider: str,
+        model: Optional[str] = None,
+    ) -> Batch:
+        """Record a batch and enqueue its uploads; must run on the event loop."""
+        ids = list(dict.fromkeys(str(u) for u in upload_ids if u))
+        batch = Batch(owner_id, provider, ids, model)
+        self._batches[batch.id] = batch
+        while len(self._batches) > KEEP_BATCHES:
+            self._batches.popitem(last=False)
+        self._lane(provider).put(owner_id, ((batch, uid) for uid in ids))
+        logger.info("ocr_batch submitted id=%s owner=%s provider=%s items=%s", batch.id, owner_id, provider, len(ids))
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        return self._batches.get(batch_id)
+
+    async def _worker(self, lane: _Lane) -> None:
+        while True:
+            job = lane.take()
+            if job is None:
+                lane.wake.clear()
+                await lane.wake.wait()
+                continue
+            batch, upload_id = job
+            batch._mark(upload_id, RUNNING)
+            lane.running += 1
+            try:
+                result = await self.runner(upload_id, batch)
+                err = (result or {}).get("error")
+                ok = (result or {}).get("status") == DONE
+                batch._mark(upload_id, DONE if ok else FAILED, None if ok else str(err or "ocr_failed"))
+            except asyncio.CancelledError:
+                batch._mark(upload_id, FAILED, "cancelled")
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+                logger.warning("ocr_batch item failed batch=%s upload=%s: %s", batch.id, upload_id, detail)
+                batch._mark(upload_id, FAILED, str(detail))
+            finally:
+                lane.running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lanes": {
+                name: {"limit": lane.limit, "running": lane.running, "queued": lane.depth(), "owners": len(lane.owners)}
+                for name, lane in self._lanes.items()
+            },
+            "batches": len(self._batches),
+        }
+
+    async def stop(self) -> None:
+        tasks = [t for lane in self._lanes.values() for t in lane.workers]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._lanes.clear()
+
+
+_scheduler: Optional[OCRScheduler] = None
+_scheduler_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_scheduler(runner: Runner) -> OCRScheduler:
+    """The scheduler for the running event loop (workers are tasks on it)."""
+    global _scheduler, _scheduler_loop
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler_loop is not loop:
+        _scheduler = OCRScheduler(runner)
+        _scheduler_loop = loop
+    return _scheduler
+
+
+def current() -> Optional[OCRScheduler]:
+    return _scheduler
+
+
+async def stop() -> None:
+    global _scheduler, _scheduler_loop
+    s, loop = _scheduler, _scheduler_loop
+    _scheduler, _scheduler_loop = None, None
+    if s is not None and loop is asyncio.get_running_loop():
+        await s.stop()
@@ -0,0 +1,233 @@
+"""
+Incremental graded-PDF regeneration for ``POST /api/uploads/{id}/pdf``.
+
+A teacher overriding one verdict used to trigger a full rebuild: download
+the original, infer regions, stamp every page, upload. Here the last
+stamped PDF of each upload is kept on local disk together with the
+verdicts and regions it was stamped with. A regeneration then:
+
+  - returns ``unchanged`` (no stamping; the caller skips the upload) when
+    the verdicts match
+  - swaps only the marks of the questions whose verdict changed
+    (``incremental``), as an incremental PDF update on the cached file
+  - rebuilds from the original (``full``) when nothing usable is cached, or
+    the submission or its OCR boxes changed since
+
+Each call reports its stage timings; totals per mode are kept for
+``/api/debug/pdf_regen``.
+
+Config (env):
+  PDF_REGEN_CACHE_DIR     on-disk store (default <tmp>/graderai-stamped)
+  PDF_REGEN_CACHE_MAX_MB  size bound, LRU eviction (default 512)
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .. import stamper
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_MB = 512
+FULL, INCREMENTAL, UNCHANGED = "full", "incremental", "unchanged"
+
+
+class Result(NamedTuple):
+    pdf_bytes: bytes
+    mode: str
+    changed: List[str]
+    timings_ms: Dict[str, int]
+
+
+def ocr_signature(storage_path: str, ocr_boxes: Any) -> str:
+    blob = json.dumps(ocr_boxes, sort_keys=True, default=str)
+    return hashlib.sha256(f"{storage_path}\0{blob}".encode("utf-8")).hexdigest()
+
+
+def diff_verdicts(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """question id -> new verdict for every question that changed (None when
+    the verdict was removed)."""
+    old, new = old or {}, new or {}
+    out: Dict[str, Optional[str]] = {}
+    for q in set(old) | set(new):
+        if old.get(q) != new.get(q):
+            out[str(q)] = new.get(q)
+    return out
+
+
+def _ms(t0: float) -> int:
+    return int((time.perf_counter() - t0) * 1000)
+
+
+class StampCache:
+    """Last stamped PDF per upload: <id>.pdf plus <id>.json metadata."""
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        name = hashlib.sha256(str(upload_id).encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name[:2], name)
+        return f"{base}.pdf", f"{base}.json"
+
+    def get(self, upload_id: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        pdf_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+            with open(pdf_path, "rb") as fh:
+                pdf = fh.read()
+            os.utime(pdf_path)  # bump recency for LRU eviction
+        except (OSError, ValueError):
+            return None
+        if hashlib.sha256(pdf).hexdigest() != meta.get("sha256"):
+            return None  # torn write between the two files
+        return pdf, meta
+
+    def put(self, upload_id: str, pdf: bytes, meta: Dict[str, Any]) -> None:
+        pdf_path, meta_path = self._paths(upload_id)
+        meta = {**meta, "sha256": hashlib.sha256(pdf).hexdigest()}
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+            with open(pdf_path + suffix, "wb") as fh:
+                fh.write(pdf)
+            with open(meta_path + suffix, "w", encoding="utf-8") as fh:
+                json.dump(meta, fh)
+            os.replace(pdf_path + suffix, pdf_path)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            logger.warning("pdf_regen cache write failed: %s", e)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for fn in files:
+                if fn.endswith(".pdf"):
+                    p = os.path.join(root, fn)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _m, size, _p in entries)
+        for _mtime, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for victim in (p, p[:-4] + ".json"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.by_mode: Dict[str, Dict[str, int]] = {}
+
+    def record(self, mode: str, total_ms: int) -> None:
+        with self._lock:
+            m = self.by_mode.setdefault(mode, {"count": 0, "total_ms": 0, "max_ms": 0, "last_ms": 0})
+            m["count"] += 1
+            m["total_ms"] += total_ms
+            m["max_ms"] = max(m["max_ms"], total_ms)
+            m["last_ms"] = total_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                mode: {**m, "avg_ms": int(m["total_ms"] / m["count"]) if m["count"] else 0}
+                for mode, m in self.by_mode.items()
+            }
+
+
+_stats = _Stats()
+_cache: Optional[StampCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> StampCache:
+    global _cache
+    directory = os.getenv("PDF_REGEN_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "graderai-stamped")
+    with _cache_lock:
+        if _cache is None or _cache.directory != directory:
+            _cache = StampCache(
+                directory,
+                max_bytes=int(float(os.getenv("PDF_REGEN_CACHE_MAX_MB") or DEFAULT_MAX_MB) * 1024 * 1024),
+            )
+        return _cache
+
+
+def regenerate(
+    upload_id: str,
+    *,
+    storage_path: str,
+    ocr_boxes: Any,
+    verdicts: Any,
+    load_original: Callable[[], bytes],
+    infer_regions: Callable[[Any], dict],
+) -> Result:
+    """Stamped PDF for the upload's current verdicts, reusing the cached
+    stamp when the submission and OCR boxes are the same."""
+    t0 = time.perf_counter()
+    timings: Dict[str, int] = {}
+    cache = get_cache()
+    sig = ocr_signature(storage_path, ocr_boxes)
+    verdicts = stamper.verdict_map(verdicts)
+
+    cached = cache.get(upload_id)
+    if cached is not None and cached[1].get("ocr_sig") == sig:
+        prev_pdf, meta = cached
+        changes = diff_verdicts(meta.get("verdicts") or {}, verdicts)
+        if not changes:
+            mode, pdf, changed = UNCHANGED, prev_pdf, []
+        else:
+            t = time.perf_counter()
+            source_px = tuple(meta["source_px"]) if meta.get("source_px") else None
+            pdf = stamper.restamp_pdf(prev_pdf, meta.get("regions") or {}, changes, ocr_boxes, source_px)
+            timings["stamp_ms"] = _ms(t)
+            mode, changed = INCREMENTAL, sorted(changes)
+            cache.put(upload_id, pdf, {**meta, "verdicts": verdicts})
+    else:
+        t = time.perf_counter()
+        original = load_original()
+        timings["download_ms"] = _ms(t)
+        t = time.perf_counter()
+        regions = infer_regions(ocr_boxes)
+        timings["regions_ms"] = _ms(t)
+        t = time.perf_counter()
+        pdf = stamper.stamp_pdf(original, regions, verdicts, ocr_boxes)
+        timings["stamp_ms"] = _ms(t)
+        mode, changed = FULL, sorted(verdicts)
+        if stamper.pymupdf() is not None:  # raster output can't be restamped
+            source_px = stamper.source_size(original)
+            cache.put(upload_id, pdf, {
+                "ocr_sig": sig,
+                "verdicts": verdicts,
+                "regions": regions,
+                "source_px": list(source_px) if source_px else None,
+            })
+
+    timings["total_ms"] = _ms(t0)
+    logger.info("pdf_regen upload=%s mode=%s changed=%s ms=%s", upload_id, mode, changed, timings["total_ms"])
+    return Result(pdf, mode, changed, timings)
+
+
+def record(mode: str, total_ms: int) -> None:
+    """Count a finished regeneration (including the caller's upload time)."""
+    _stats.record(mode, total_ms)
+
+
+def stats() -> Dict[str, Any]:
+    return {"modes": _stats.snapshot(), "cache_dir": get_cache().directory}
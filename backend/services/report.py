@@ -1,15 +1,15 @@
 from __future__ import annotations
 
 from io import BytesIO
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from ..models.schemas import Overlay, OverlayMark
 
-from ..models.schemas import Overlay, OverlayMark, GradeResult
+if TYPE_CHECKING:
+    from .grader import Graded
 
 
-def build_overlay_basic(result: GradeResult) -> Overlay:
+def build_overlay_basic(result: Graded) -> Overlay:
     marks: List[OverlayMark] = []
     y = 720.0
     for idx, item in enumerate(result.items, start=1):
@@ -27,6 +27,9 @@ def flatten_to_pdf(summary_text: str, overlay: Overlay) -> bytes:
     Minimal placeholder PDF summarizing grades and overlay notes.
     This does NOT draw over the original submission; it produces a summary page.
     """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
     buf = BytesIO()
     c = canvas.Canvas(buf, pagesize=letter)
     width, height = letter
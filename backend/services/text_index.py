@@ -0,0 +1,116 @@
+"""
+Token index over OCR text, built once per submission and queried per question.
+
+A single tokenizer pass over the text records, in order, every option marker
+(``(A)`` .. ``(E)``) and numeric token (``-3``, ``4.5``), and indexes every
+word by its stem (with the span of its first occurrence). Grading a
+50-question exam is then one scan of the text plus dictionary lookups,
+instead of one regex search of the whole text per question.
+
+Short answers match whole words: ``light`` matches ``lights`` but not
+``sunlight``. Reference answers go through the same tokenizer (``terms``),
+minus a few stopwords, so a question costs one lookup per key term.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+# options first, so "(C)" is never split; words are letters only, so digits
+# glued to letters ("x2") still tokenize as numbers
+_TOKEN = re.compile(r"\(([A-E])\)|(-?\d+(?:\.\d+)?)|[^\W\d_]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how in is it its of on or that the "
+    "this to was what when where which who why with".split()
+)
+_SUFFIXES = (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("ly", ""), ("es", ""), ("s", ""))
+
+Span = Tuple[int, int]
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light suffix stripping, enough to match plurals and verb forms."""
+    w = word.lower()
+    if len(w) <= 3 or not w.isalpha():
+        return w
+    for suffix, repl in _SUFFIXES:
+        if not w.endswith(suffix) or len(w) - len(suffix) < 3:
+            continue
+        if suffix == "s" and w.endswith(("ss", "us", "is")):
+            break
+        if suffix == "es" and not w.endswith(("ches", "shes", "xes", "zes", "oes")):
+            continue  # "makes" -> "make" via the plain "s" rule
+        w = w[: -len(suffix)] + repl
+        if suffix in ("ing", "ed") and len(w) > 3 and w[-1] == w[-2] and w[-1] not in "lsz":
+            w = w[:-1]  # running -> run
+        break
+    if len(w) > 3 and w.endswith("e"):
+        w = w[:-1]  # make/making/makes agree
+    return w
+
+
+def terms(text: str) -> List[str]:
+    """Distinct key terms of a reference text, in order: word stems (minus
+    stopwords) and numbers."""
+    out: Dict[str, None] = {}
+    for m in _TOKEN.finditer(text or ""):
+        if m.group(1):
+            continue
+        if m.group(2):
+            out.setdefault(m.group(2), None)
+        elif m.group(0).lower() not in STOPWORDS:
+            out.setdefault(stem(m.group(0)), None)
+    return list(out)
+
+
+class TextIndex:
+    """Index of text[start:end]; spans are offsets into the whole text."""
+
+    def __init__(self, text: str, start: int = 0, end: Optional[int] = None):
+        self.text = text or ""
+        self.start = start
+        self.end = len(self.text) if end is None else end
+        numbers: List[str] = []
+        options: List[str] = []
+        self.number_spans: List[Span] = []
+        self.option_spans: List[Span] = []
+        self.terms: Dict[str, Span] = {}  # stem or number -> first occurrence
+        for m in _TOKEN.finditer(self.text, self.start, self.end):
+            opt, num = m.group(1), m.group(2)
+            if opt:
+                options.append(opt)
+                self.option_spans.append(m.span())
+            elif num:
+                numbers.append(num)
+                self.number_spans.append(m.span())
+                self.terms.setdefault(num, m.span())
+            else:
+                self.terms.setdefault(stem(m.group(0)), m.span())
+        self.numbers = numbers
+        self.options = options
+
+    @property
+    def first_number(self) -> Optional[str]:
+        return self.numbers[0] if self.numbers else None
+
+    @property
+    def first_option(self) -> Optional[str]:
+        return self.options[0] if self.options else None
+
+    def has(self, term: str) -> bool:
+        return term in self.terms
+
+    def span(self, term: str) -> Optional[Span]:
+        return self.terms.get(term)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chars": self.end - self.start,
+            "numbers": len(self.numbers),
+            "options": len(self.options),
+            "terms": len(self.terms),
+        }
@@ -0,0 +1,125 @@
+"""
+Read-through cache for ``uploads`` rows.
+
+Endpoints used to select the same row again and again with slightly
+different column lists (OCR start, grade, verdicts, PDF build, ...). The
+repository fetches the whole row (``select("*")``) once and serves it from
+a per-process cache for a few seconds. Writes made through the app's
+update helpers are written through to the cached row; other writes and
+deletes invalidate it, so within one process a read after a write is never
+stale. Status writes of job workers drop the row when the app relays
+their events (``events.relay``); other writes from other processes become
+visible once the TTL expires.
+
+Callers get a copy of the row and may mutate it freely.
+
+Config (env):
+  UPLOAD_CACHE_TTL_S    seconds a row stays cached (default 5; 0 disables)
+  UPLOAD_CACHE_MAX      rows kept per process (default 2048)
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_TTL_S = 5.0
+DEFAULT_MAX_ROWS = 2048
+
+
+def _rows_data(resp: Any) -> Optional[Dict[str, Any]]:
+    data = getattr(resp, "data", None)
+    if isinstance(data, list):
+        data = data[0] if data else None
+    return data if isinstance(data, dict) and data else None
+
+
+class UploadRepository:
+    def __init__(
+        self,
+        client_getter: Callable[[], Any],
+        ttl: Optional[float] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self._client_getter = client_getter
+        self.ttl = float(os.getenv("UPLOAD_CACHE_TTL_S") or DEFAULT_TTL_S) if ttl is None else float(ttl)
+        self.max_rows = max_rows or int(os.getenv("UPLOAD_CACHE_MAX") or DEFAULT_MAX_ROWS)
+        self._lock = threading.Lock()
+        self._rows: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _cached(self, uid: str) -> Optional[Dict[str, Any]]:
+        """The cached row, counting the lookup as a hit or miss."""
+        with self._lock:
+            entry = self._rows.get(uid)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._rows[uid]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._rows.move_to_end(uid)
+            return entry[1]
+
+    def _put(self, uid: str, row: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._rows[uid] = (time.monotonic() + self.ttl, row)
+            self._rows.move_to_end(uid)
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+
+    def get(self, upload_id: str, client: Any = None) -> Optional[Dict[str, Any]]:
+        """The full row for upload_id, or None when it doesn't exist.
+        client defaults to the getter's; query errors propagate."""
+        uid = str(upload_id)
+        row = self._cached(uid)
+        if row is not None:
+            return copy.deepcopy(row)
+        client = client if client is not None else self._client_getter()
+        resp = client.table("uploads").select("*").eq("id", uid).maybe_single().execute()
+        row = _rows_data(resp)
+        if row is None:
+            return None
+        self._put(uid, copy.deepcopy(row))
+        return row
+
+    def write_through(self, upload_id: str, fields: Dict[str, Any], rows: Any = None) -> None:
+        """Apply an update to the cached row. rows is the update's returned
+        representation; when it holds the full row it replaces the entry."""
+        uid = str(upload_id)
+        returned = rows[0] if isinstance(rows, list) and rows and isinstance(rows[0], dict) else None
+        with self._lock:
+            entry = self._rows.get(uid)
+        if entry is not None:
+            row = dict(entry[1])
+            row.update(copy.deepcopy(returned or {}))
+            row.update(copy.deepcopy(fields or {}))
+            self._put(uid, row)
+
+    def invalidate(self, upload_id: Optional[str] = None) -> None:
+        """Drop one row (or everything when upload_id is None)."""
+        with self._lock:
+            if upload_id is None:
+                self._rows.clear()
+            else:
+                self._rows.pop(str(upload_id), None)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size, hits, misses, invalidations = len(self._rows), self.hits, self.misses, self.invalidations
+        total = hits + misses
+        return {
+            "ttl_s": self.ttl,
+            "rows": size,
+            "hits": hits,
+            "misses": misses,
+            "invalidations": invalidations,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
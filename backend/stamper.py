@@ -1,26 +1,250 @@
+"""
+Graded-PDF stamping.
+
+PDF submissions keep their original pages: each verdict becomes a vector
+ink annotation (a check or a cross) on the page its region lives on, and
+the result is written as an incremental update, so the output is the
+original file plus a few KB per mark. Image submissions are wrapped into a
+PDF once (the image stream is embedded as is) and then stamped the same way.
+
+Region boxes come from the OCR coordinate space: ``(x, y, w, h)`` on page 1
+or ``(x, y, w, h, page)`` with a 1-based page number. They are mapped to PDF
+points with the page sizes recorded in ``ocr_boxes`` when given.
+
+Every mark carries ``subject = "graderai:<question id>"``; ``restamp_pdf``
+uses that to swap just the marks whose verdict changed, again as an
+incremental update on the previously stamped file.
+
+Without PyMuPDF the page is rasterized and drawn on with PIL as before
+(PIL is imported only then, or to size an image submission).
+"""
+import io
 import logging
+import os
+import tempfile
 from io import BytesIO
-from PIL import Image, ImageDraw
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
+logger = logging.getLogger(__name__)
 
-def stamp_pdf(image_bytes: bytes, regions: dict, verdicts: dict) -> bytes:
-    import io
+MARK_PREFIX = "graderai:"
+MARK_AUTHOR = "GraderAI"
+GREEN = (0.0, 0.5, 0.0)
+RED = (0.8, 0.0, 0.0)
+POINTS_PER_INCH = 72.0
 
-    # Open source and ensure RGB; always save a page even if no marks
-    im = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    draw = ImageDraw.Draw(im)
 
-    # Draw simple marks at centers of first rect for q5/q6a/q6b (if present)
-    for q in ("q5", "q6a", "q6b"):
-        boxes = (regions or {}).get(q) or []
+def _boxes(regions: dict) -> Iterable[Tuple[str, int, Tuple[float, float, float, float]]]:
+    """(question_id, page_number, (x, y, w, h)) for the first box of each region."""
+    for q, boxes in (regions or {}).items():
         if not boxes:
             continue
+        box = boxes[0]
         try:
-            x, y, w, h = boxes[0]
-            cx, cy = int(x + w / 2), int(y + h / 2)
+            x, y, w, h = (float(v) for v in box[:4])
+            page = int(box[4]) if len(box) > 4 else 1
         except Exception:
             continue
-        verdict = ((verdicts or {}).get(q) or "").strip().lower()
+        yield str(q), max(1, page), (x, y, w, h)
+
+
+def verdict_map(verdicts: Any) -> Dict[str, str]:
+    """question id -> verdict from either stored shape: the teacher's
+    {"q5": "correct"} map or the grader's list of
+    {"question_id", "correct", "score", "max_score"} items."""
+    if isinstance(verdicts, dict):
+        return {str(k): v for k, v in verdicts.items()}
+    out: Dict[str, str] = {}
+    for item in verdicts or []:
+        if not isinstance(item, dict) or item.get("question_id") is None:
+            continue
+        score, max_score = item.get("score"), item.get("max_score")
+        if item.get("correct"):
+            v = "correct"
+        elif score and max_score and 0 < float(score) < float(max_score):
+            v = "partial"
+        else:
+            v = "incorrect"
+        out[str(item["question_id"])] = v
+    return out
+
+
+def _verdict(verdicts: dict, q: str) -> Optional[str]:
+    v = verdict_map(verdicts).get(q)
+    return str(v).strip().lower() if v else None
+
+
+def _scale(page_rect: Any, ocr_boxes: Optional[dict], number: int, source_px: Optional[Tuple[int, int]]) -> float:
+    """PDF points per OCR coordinate unit on the given page."""
+    ob = ocr_boxes or {}
+    pages = ob.get("pages") or []
+    meta = next((p for p in pages if (p or {}).get("number") == number), None)
+    if meta is None and 0 < number <= len(pages):
+        meta = pages[number - 1]
+    meta = meta or {}
+    if str(meta.get("unit") or ob.get("unit") or "").lower() == "inch":
+        return POINTS_PER_INCH
+    width = meta.get("width") or ob.get("width")
+    if width:
+        return page_rect.width / float(width)
+    if source_px:
+        return page_rect.width / float(source_px[0])
+    # PDFs OCR'd without recorded sizes were rasterized at OCR_PDF_DPI
+    from .ocr.pages import pdf_dpi
+    return POINTS_PER_INCH / pdf_dpi()
+
+
+def _mark_strokes(cx: float, cy: float, size: float, correct: bool) -> List[List[Tuple[float, float]]]:
+    s = size / 2.0
+    if correct:
+        return [[(cx - s, cy), (cx - s / 3, cy + s * 0.8), (cx + s, cy - s * 0.8)]]
+    return [[(cx - s, cy - s), (cx + s, cy + s)], [(cx - s, cy + s), (cx + s, cy - s)]]
+
+
+@lru_cache(maxsize=None)
+def pymupdf() -> Any:
+    """PyMuPDF, imported on first use; None when it isn't installed."""
+    try:
+        import fitz  # PyMuPDF
+    except ModuleNotFoundError:
+        return None
+    return fitz
+
+
+def add_mark(page: Any, q: str, rect: Any, verdict: str) -> Any:
+    """Insert one check/cross ink annotation centred in rect, given in
+    points of the page as displayed (i.e. after /Rotate)."""
+    fitz = pymupdf()
+    correct = verdict == "correct"
+    size = max(12.0, min(36.0, min(rect.width, rect.height) * 0.5 or 18.0))
+    strokes = _mark_strokes((rect.x0 + rect.x1) / 2, (rect.y0 + rect.y1) / 2, size, correct)
+    m = page.derotation_matrix
+    strokes = [[tuple(fitz.Point(pt) * m) for pt in stroke] for stroke in strokes]
+    annot = page.add_ink_annot(strokes)
+    annot.set_colors(stroke=GREEN if correct else RED)
+    annot.set_border(width=max(1.5, size / 10))
+    annot.set_info(title=MARK_AUTHOR, subject=f"{MARK_PREFIX}{q}", content=verdict)
+    annot.update()
+    return annot
+
+
+def source_size(file_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """Pixel size of an image submission; None for PDFs."""
+    if file_bytes[:5] == b"%PDF-":
+        return None
+    from PIL import Image
+
+    with Image.open(io.BytesIO(file_bytes)) as im:
+        return im.size
+
+
+def _source_pdf(file_bytes: bytes) -> bytes:
+    """The PDF as is, or an image wrapped into a one-page-per-frame PDF."""
+    if file_bytes[:5] == b"%PDF-":
+        return file_bytes
+    img_doc = pymupdf().open(stream=file_bytes)
+    try:
+        return img_doc.convert_to_pdf()
+    finally:
+        img_doc.close()
+
+
+def _incremental(base: bytes, edit: Callable[[Any], int]) -> bytes:
+    """Run edit(doc) on base and append its changes as an incremental update.
+    edit returns how many changes it made; with none, base comes back as is."""
+    # Incremental updates have to be written back onto a file
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(base)
+        doc = pymupdf().open(path)
+        try:
+            if not edit(doc):
+                return base
+            doc.saveIncr()
+        finally:
+            doc.close()
+        with open(path, "rb") as fh:
+            return fh.read()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _mark_regions(doc: Any, regions: dict, verdicts: dict, ocr_boxes: Optional[dict],
+                  source_px: Optional[Tuple[int, int]], only: Optional[Iterable[str]] = None) -> int:
+    wanted = None if only is None else set(only)
+    marks = 0
+    for q, number, (x, y, w, h) in _boxes(regions):
+        if wanted is not None and q not in wanted:
+            continue
+        verdict = _verdict(verdicts, q)
+        if not verdict or number > doc.page_count:
+            continue
+        page = doc[number - 1]
+        k = _scale(page.rect, ocr_boxes, number, source_px)
+        # OCR ran on the page as rendered, so boxes are in displayed coordinates
+        rect = pymupdf().Rect(x * k, y * k, (x + w) * k, (y + h) * k)
+        add_mark(page, q, rect, verdict)
+        marks += 1
+    return marks
+
+
+def _remove_marks(doc: Any, questions: Iterable[str]) -> int:
+    subjects = {f"{MARK_PREFIX}{q}" for q in questions}
+    removed = 0
+    for page in doc:
+        for annot in list(page.annots() or []):
+            if annot.info.get("subject") in subjects:
+                page.delete_annot(annot)
+                removed += 1
+    return removed
+
+
+def _stamp_vector(file_bytes: bytes, regions: dict, verdicts: dict, ocr_boxes: Optional[dict]) -> bytes:
+    base = _source_pdf(file_bytes)
+    source_px = source_size(file_bytes)
+    out = _incremental(base, lambda doc: _mark_regions(doc, regions, verdicts, ocr_boxes, source_px))
+    logger.info("stamper vector pdf_bytes=%s base=%s", len(out), len(base))
+    return out
+
+
+def restamp_pdf(
+    stamped: bytes,
+    regions: dict,
+    changes: Dict[str, Optional[str]],
+    ocr_boxes: Optional[Dict[str, Any]] = None,
+    source_px: Optional[Tuple[int, int]] = None,
+) -> bytes:
+    """Replace the marks of the changed questions on an already stamped PDF.
+    changes maps question id -> new verdict (None removes the mark)."""
+    if not changes:
+        return stamped
+
+    def edit(doc: Any) -> int:
+        removed = _remove_marks(doc, changes)
+        return removed + _mark_regions(doc, regions, changes, ocr_boxes, source_px, only=changes)
+
+    out = _incremental(stamped, edit)
+    logger.info("stamper restamp pdf_bytes=%s base=%s changed=%s", len(out), len(stamped), sorted(changes))
+    return out
+
+
+def _stamp_raster(image_bytes: bytes, regions: dict, verdicts: dict) -> bytes:
+    from PIL import Image, ImageDraw
+
+    # Open source and ensure RGB; always save a page even if no marks
+    im = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    draw = ImageDraw.Draw(im)
+
+    for q, _page, (x, y, w, h) in _boxes(regions):
+        verdict = _verdict(verdicts, q)
+        if not verdict:
+            continue
+        cx, cy = int(x + w / 2), int(y + h / 2)
         mark = "✓" if verdict == "correct" else "✗"
         color = (0, 128, 0) if verdict == "correct" else (200, 0, 0)
         try:
@@ -32,10 +256,14 @@ def stamp_pdf(image_bytes: bytes, regions: dict, verdicts: dict) -> bytes:
     buf = BytesIO()
     im.save(buf, format="PDF", resolution=150)
     pdf_bytes = buf.getvalue()
-    try:
-        logging.getLogger(__name__).info("stamper pdf_bytes=%s", len(pdf_bytes))
-    except Exception:
-        pass
+    logger.info("stamper raster pdf_bytes=%s", len(pdf_bytes))
     if len(pdf_bytes) < 1000:
         raise ValueError("empty_pdf_bytes")
     return pdf_bytes
+
+
+def stamp_pdf(image_bytes: bytes, regions: dict, verdicts: dict, ocr_boxes: Optional[Dict[str, Any]] = None) -> bytes:
+    """Graded PDF for a submission (PDF or image) with one mark per verdict."""
+    if pymupdf() is None:
+        return _stamp_raster(image_bytes, regions, verdicts)
+    return _stamp_vector(image_bytes, regions, verdicts, ocr_boxes)
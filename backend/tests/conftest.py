@@ -19,3 +19,5 @@ def test_env(monkeypatch):
     monkeypatch.setenv("OCR_MOCK", "1")
     monkeypatch.setenv("OCR_PROVIDER", "mock")
     monkeypatch.delenv("HF_TOKEN", raising=False)
+    # OCR results must not leak between tests through the on-disk cache
+    monkeypatch.setenv("OCR_CACHE", "0")
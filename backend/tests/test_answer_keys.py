@@ -0,0 +1,164 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services.answer_keys import AnswerKeyStore, compile_key
+
+SHEET = "\n".join([
+    "1) Solve 12 + 30 = ?",
+    "answer: 42",
+    "2) Pick the prime (A) 4 (B) 6 (C) 7",
+    "answer: (c)",
+    "3) Why do leaves look green",
+    "chlorophyll reflects green light",
+])
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, sb, name):
+        self.sb, self.name = sb, name
+        self._where = {}
+        self._upsert = None
+        self._update = None
+
+    def select(self, _cols):
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def in_(self, col, vals):
+        self._where[col] = set(map(str, vals))
+        return self
+
+    def order(self, *_a, **_k):
+        return self
+
+    def limit(self, _n):
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def update(self, payload):
+        self._update = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None):
+        self._upsert = payload
+        return self
+
+    def execute(self):
+        rows = self.sb.db.setdefault(self.name, [])
+        if self._update is not None:
+            self.sb.updates.append((self.name, self._where.get("id"), self._update))
+            return _Resp([])
+        if self._upsert is not None:
+            rows[:] = [r for r in rows if (r["assignment_id"], r["rubric_version"]) != (
+                self._upsert["assignment_id"], self._upsert["rubric_version"])]
+            rows.append(dict(self._upsert))
+            return _Resp([dict(self._upsert)])
+        self.sb.selects.append(self.name)
+        hits = [dict(r) for r in rows if all(
+            str(r.get(k)) in v if isinstance(v, set) else str(r.get(k)) == str(v) for k, v in self._where.items())]
+        if any(isinstance(v, set) for v in self._where.values()):
+            return _Resp(hits)
+        if self.name == "uploads":
+            return _Resp(hits[0] if hits else None)
+        return _Resp(sorted(hits, key=lambda r: r["updated_at"], reverse=True)[:1])
+
+
+class FakeBucket:
+    def upload(self, key, data, *a, **k):
+        return {"Key": key}
+
+
+class FakeStorage:
+    def from_(self, _bucket):
+        return FakeBucket()
+
+
+class FakeSupabase:
+    def __init__(self, db=None):
+        self.db = db or {}
+        self.selects = []
+        self.updates = []
+        self.storage = FakeStorage()
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_compile_key_reads_answers_from_the_sheet():
+    key = compile_key("a1", SHEET, answers={"3": "chlorophyll green"}, rubric_version="2")
+    assert key.rubric_version == "2"
+    assert [(q.id, q.qtype) for q in key.questions] == [("1", "numeric"), ("2", "MCQ"), ("3", "short_answer")]
+    assert [k.answer for k in key.keys] == ["42", "C", "chlorophyll green"]
+
+
+def test_store_caches_keys_and_misses():
+    fake = FakeSupabase()
+    store = AnswerKeyStore(lambda: fake, ttl=60)
+    assert store.get("a1") is None
+    assert store.get("a1") is None
+    assert fake.selects == ["answer_keys"]
+
+    saved = store.save("a1", SHEET, owner_id="t1")
+    assert store.get("a1") is saved
+    # another process loads the persisted row
+    other = AnswerKeyStore(lambda: fake, ttl=60)
+    loaded = other.get("a1")
+    assert loaded.keys == saved.keys and loaded.owner_id == "t1"
+    assert other.stats()["misses"] == 1
+
+
+def test_store_load_errors_fall_back():
+    class Broken:
+        def table(self, name):
+            raise RuntimeError("relation answer_keys does not exist")
+
+    store = AnswerKeyStore(lambda: Broken(), ttl=60)
+    assert store.get("a1") is None
+    assert store.stats()["loads_failed"] == 1
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("DEV_MODE", "0")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    fake = FakeSupabase({"uploads": [
+        {"id": "u1", "owner_id": "t1", "assignment_id": "a1", "extracted_text": "42 (C) chlorophyll reflects green"},
+        {"id": "u2", "owner_id": "t1", "assignment_id": "a1", "extracted_text": "40 (A) sunlight"},
+    ]})
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    return TestClient(app_mod.app), fake
+
+
+def test_class_set_is_graded_against_one_compiled_key(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+    r = c.put("/api/assignments/a1/answer-key", json={"text": SHEET, "rubric_version": "3"}, headers=h)
+    assert r.status_code == 200, r.text
+    assert [k["answer"] for k in r.json()["keys"]][:2] == ["42", "C"]
+
+    scores = {}
+    for uid in ("u1", "u2"):
+        r = c.post("/api/grade/start", json={"upload_id": uid}, headers=h)
+        assert r.status_code == 200, r.text
+        scores[uid] = [i["score"] for i in r.json()["items"]]
+    assert scores == {"u1": [1.0, 1.0, 1.0], "u2": [0.0, 0.0, 0.0]}
+    # only the PUT's ownership check read the table; grading never did
+    assert fake.selects.count("answer_keys") == 1
+
+    assert c.get("/api/assignments/a1/answer-key", headers=h).json()["rubric_version"] == "3"
+    assert c.get("/api/assignments/a1/answer-key", headers={"X-Owner-Id": "other"}).status_code == 403
+    assert c.get("/api/assignments/none/answer-key", headers=h).status_code == 404
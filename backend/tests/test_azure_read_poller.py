@@ -0,0 +1,204 @@
+import asyncio
+
+import httpx
+import pytest
+
+from backend.services.azure_read import (
+    AzureReadPoller,
+    ReadDeadlineExceeded,
+    ReadError,
+    deadline_for,
+    parse_retry_after,
+)
+
+
+def _resp(status_code=200, status=None, headers=None):
+    body = {"status": status} if status else {}
+    return httpx.Response(status_code, json=body, headers=headers or {})
+
+
+class ScriptedFetch:
+    """Per-URL queue of responses; records (url, loop time) for every poll."""
+
+    def __init__(self, scripts):
+        self.scripts = {url: list(seq) for url, seq in scripts.items()}
+        self.calls = []
+
+    async def __call__(self, url, key):
+        self.calls.append((url, asyncio.get_running_loop().time()))
+        item = self.scripts[url].pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("0.5") == 0.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_deadline_scales_with_pages(monkeypatch):
+    monkeypatch.setenv("AZURE_READ_DEADLINE_BASE", "10")
+    monkeypatch.setenv("AZURE_READ_DEADLINE_PER_PAGE", "2")
+    assert deadline_for(1) == 12
+    assert deadline_for(30) == 70
+
+
+def test_backoff_grows_and_is_capped():
+    p = AzureReadPoller(initial=0.5, max_delay=4, jitter=0)
+    assert [p._backoff(i) for i in range(5)] == [0.5, 1.0, 2.0, 4, 4]
+
+
+def test_retries_transient_errors_and_honors_retry_after():
+    fetch = ScriptedFetch({
+        "op": [
+            _resp(429, headers={"Retry-After": "0.2"}),
+            httpx.ConnectError("reset"),
+            _resp(status="running"),
+            _resp(status="succeeded"),
+        ]
+    })
+
+    async def main():
+        p = AzureReadPoller(initial=0.01, max_delay=0.02, fetch=fetch)
+        data = await p.wait("op", "k", deadline_s=5)
+        await p.stop()
+        return data
+
+    assert asyncio.run(main())["status"] == "succeeded"
+    times = [t for _u, t in fetch.calls]
+    assert len(times) == 4
+    assert times[1] - times[0] >= 0.19  # waited for Retry-After, not the 10ms backoff
+
+
+def test_non_retryable_http_error_raises():
+    fetch = ScriptedFetch({"op": [_resp(401)]})
+
+    async def main():
+        p = AzureReadPoller(initial=0.0, fetch=fetch)
+        try:
+            await p.wait("op", "k", deadline_s=5)
+        finally:
+            await p.stop()
+
+    with pytest.raises(ReadError) as ei:
+        asyncio.run(main())
+    assert ei.value.status_code == 401
+
+
+def test_deadline_exceeded():
+    fetch = ScriptedFetch({"op": [_resp(status="running")] * 50})
+
+    async def main():
+        p = AzureReadPoller(initial=0.01, max_delay=0.05, fetch=fetch)
+        try:
+            await p.wait("op", "k", deadline_s=0.1)
+        finally:
+            await p.stop()
+
+    with pytest.raises(ReadDeadlineExceeded) as ei:
+        asyncio.run(main())
+    assert ei.value.polls >= 2
+
+
+def test_many_operations_share_one_task():
+    n = 50
+    fetch = ScriptedFetch({f"op{i}": [_resp(status="running"), _resp(status="succeeded")] for i in range(n)})
+
+    async def main():
+        p = AzureReadPoller(initial=0.01, max_delay=0.01, jitter=0, fetch=fetch)
+        before = len(asyncio.all_tasks())
+        waits = [asyncio.create_task(p.wait(f"op{i}", "k", deadline_s=5)) for i in range(n)]
+        await asyncio.sleep(0)
+        # n waiters + exactly one poller task
+        assert len(asyncio.all_tasks()) - before == n + 1
+        out = await asyncio.gather(*waits)
+        assert p.pending() == 0
+        await p.stop()
+        return out
+
+    out = asyncio.run(main())
+    assert all(d["status"] == "succeeded" for d in out)
+    assert len(fetch.calls) == 2 * n
+
+
+def test_bad_body_fails_only_that_operation():
+    fetch = ScriptedFetch({
+        "bad": [httpx.Response(200, content=b"<html>gateway</html>")],
+        "odd": [RuntimeError("boom")],
+        "ok": [_resp(status="running"), _resp(status="succeeded")],
+    })
+
+    async def main():
+        p = AzureReadPoller(initial=0.01, max_delay=0.01, jitter=0, fetch=fetch)
+        out = await asyncio.gather(*(p.wait(u, "k", deadline_s=5) for u in ("bad", "odd", "ok")),
+                                   return_exceptions=True)
+        running = p.stats()["running"]
+        await p.stop()
+        return out, running
+
+    (bad, odd, ok), running = asyncio.run(main())
+    assert isinstance(bad, ReadError) and "gateway" in bad.body
+    assert isinstance(odd, RuntimeError) and str(odd) == "boom"
+    assert ok["status"] == "succeeded"
+    assert running  # the shared poller survived both
+
+
+def test_deadline_enforced_while_a_poll_hangs():
+    async def hang(url, key):
+        await asyncio.sleep(60)
+
+    async def main():
+        p = AzureReadPoller(initial=0.0, fetch=hang)
+        try:
+            await asyncio.wait_for(p.wait("op", "k", deadline_s=0.05), timeout=5)
+        finally:
+            await p.stop()
+
+    with pytest.raises(ReadDeadlineExceeded):
+        asyncio.run(main())
+
+
+def test_dead_poller_fails_waiters():
+    async def main():
+        p = AzureReadPoller(initial=0.01, fetch=ScriptedFetch({"op": [_resp(status="running")] * 5}))
+
+        async def broken():
+            raise RuntimeError("loop bug")
+
+        p._run = broken
+        try:
+            await asyncio.wait_for(p.wait("op", "k", deadline_s=5), timeout=5)
+        finally:
+            await p.stop()
+
+    with pytest.raises(RuntimeError, match="poller died"):
+        asyncio.run(main())
+
+
+def test_slow_poll_does_not_hold_back_other_operations():
+    fast = ScriptedFetch({"fast": [_resp(status="running"), _resp(status="running"), _resp(status="succeeded")]})
+
+    async def fetch(url, key):
+        if url == "slow":
+            await asyncio.sleep(1.0)
+            return _resp(status="succeeded")
+        return await fast(url, key)
+
+    async def main():
+        p = AzureReadPoller(initial=0.01, max_delay=0.01, jitter=0, fetch=fetch)
+        slow = asyncio.create_task(p.wait("slow", "k", deadline_s=5))
+        await asyncio.sleep(0.05)  # the slow GET is in flight
+        t0 = asyncio.get_running_loop().time()
+        done = await p.wait("fast", "k", deadline_s=5)
+        elapsed = asyncio.get_running_loop().time() - t0
+        await slow
+        await p.stop()
+        return done, elapsed
+
+    done, elapsed = asyncio.run(main())
+    assert done["status"] == "succeeded"
+    assert elapsed < 0.5 and len(fast.calls) == 3
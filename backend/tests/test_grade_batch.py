@@ -0,0 +1,84 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.tests.test_answer_keys import SHEET, FakeSupabase
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("GRADE_BATCH_MAX", "4")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    fake = FakeSupabase({"uploads": [
+        {"id": "u1", "owner_id": "t1", "assignment_id": "a1", "extracted_text": "42 (C) chlorophyll reflects green"},
+        {"id": "u2", "owner_id": "t1", "assignment_id": "a1", "extracted_text": "40 (A) sunlight"},
+        {"id": "u3", "owner_id": "t1", "assignment_id": "a2", "extracted_text": "1) Solve 2 + 2 = ?\n2"},
+        {"id": "u4", "owner_id": "t1", "assignment_id": "a1", "extracted_text": ""},
+    ]})
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    return TestClient(app_mod.app), app_mod
+
+
+def test_batch_grades_a_class_set(client):
+    c, app_mod = client
+    h = {"X-Owner-Id": "t1"}
+    assert c.put("/api/assignments/a1/answer-key", json={"text": SHEET}, headers=h).status_code == 200
+
+    r = c.post("/api/grade/batch", json={"upload_ids": ["u2", "u1", "u3", "u4"]}, headers=h)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert [(x["upload_id"], x["total_score"], x["total_max"]) for x in body["results"]] == [
+        ("u2", 0.0, 3.0), ("u1", 3.0, 3.0), ("u3", 0.0, 1.0)]
+    assert "items" not in body["results"][0]
+    assert body["skipped"] == [{"upload_id": "u4", "error": "OCR text missing — run OCR"}]
+
+    r = c.post("/api/grade/batch", json={"upload_ids": ["u1", "nope"], "include_items": True}, headers=h)
+    body = r.json()
+    assert [i["score"] for i in body["results"][0]["items"]] == [1.0, 1.0, 1.0]
+    assert body["skipped"] == [{"upload_id": "nope", "error": "Upload not found"}]
+
+
+def test_batch_limits(client):
+    c, _ = client
+    assert c.post("/api/grade/batch", json={"upload_ids": []}).status_code == 400
+    assert c.post("/api/grade/batch", json={"upload_ids": list("abcde")}).status_code == 413
+
+
+def test_grade_stores_and_returns_the_same_encoding(client):
+    c, app_mod = client
+    h = {"X-Owner-Id": "t1"}
+    c.put("/api/assignments/a1/answer-key", json={"text": SHEET, "rubric_version": "3"}, headers=h)
+    r = c.post("/api/grade", json={"upload_id": "u1"}, headers=h)
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["rubric_version"] == "3" and body["grade"]["total_score"] == 3.0
+    assert body["grade"]["items"][0]["criteria"][0]["name"] == "auto"
+
+    (_table, uid, fields), = [u for u in app_mod.supabase.updates if "grade_json" in u[2]]
+    assert uid == "u1"
+    assert fields["grade_json"].encode() in r.content
+    assert app_mod.fastjson.loads(fields["grade_json"]) == body["grade"]
+    assert fields["verdicts"][0] == {"question_id": "1", "correct": True, "score": 1.0, "max_score": 1.0}
+
+
+def test_batch_grades_each_question_in_its_region(client):
+    c, app_mod = client
+    h = {"X-Owner-Id": "t1"}
+    c.put("/api/assignments/a1/answer-key", json={"text": SHEET}, headers=h)
+    lines = ["1) Solve", "42", "2) Pick", "(C)", "3) Why", "chlorophyll reflects green"]
+    boxes = {"pages": [{"number": 1, "lines": [
+        {"text": t, "bbox": [100, 100 + 60 * k, 600, 40]} for k, t in enumerate(lines)]}]}
+    app_mod.supabase.db["uploads"].append(
+        {"id": "u5", "owner_id": "t1", "assignment_id": "a1", "extracted_text": " ".join(lines), "ocr_boxes": boxes})
+
+    r = c.post("/api/grade/batch", json={"upload_ids": ["u5"], "include_items": True}, headers=h)
+    # the whole text's first number is the "1" of "1) Solve"; question 1's
+    # own region holds just its answer
+    assert [i["score"] for i in r.json()["results"][0]["items"]] == [1.0, 1.0, 1.0]
+    del app_mod.supabase.db["uploads"][-1]["ocr_boxes"]
+    r = c.post("/api/grade/batch", json={"upload_ids": ["u5"], "include_items": True}, headers=h)
+    assert [i["score"] for i in r.json()["results"][0]["items"]] == [0.0, 1.0, 1.0]
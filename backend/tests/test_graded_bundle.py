@@ -0,0 +1,138 @@
+import importlib
+import io
+import json
+import zipfile
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services import bundle
+
+
+def _pdf(label, pages=1):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page(width=300, height=400).insert_text((20, 40), f"{label} p{i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+BOXES = {"pages": [{"number": 1, "width": 300, "lines": []}]}
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, sb):
+        self.sb = sb
+        self._where = {}
+
+    def select(self, sel):
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def execute(self):
+        rows = [dict(r) for r in self.sb.rows if all(str(r.get(k)) == str(v) for k, v in self._where.items())]
+        return _Resp(rows)
+
+
+class FakeBucket:
+    def __init__(self, sb):
+        self.sb = sb
+
+    def list(self, d):
+        return []
+
+    def download(self, path):
+        self.sb.downloads.append(path)
+        return self.sb.objects[path]
+
+
+class FakeStorage:
+    def __init__(self, sb):
+        self.sb = sb
+
+    def from_(self, name):
+        return FakeBucket(self.sb)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rows, self.objects, self.downloads = [], {}, []
+        for i, name in enumerate(["bob.pdf", "alice.pdf", "carol.pdf"]):
+            path = f"t1/{i}.pdf"
+            self.objects[path] = _pdf(name, pages=i + 1)
+            self.rows.append({"id": f"u{i}", "owner_id": "t1", "assignment_id": "a1", "storage_path": path,
+                              "original_name": name, "ocr_boxes": BOXES, "verdicts": {"q1": "correct"}})
+        self.rows.append({"id": "u9", "owner_id": "t1", "assignment_id": "a1", "storage_path": "t1/9.pdf",
+                          "original_name": "dave.pdf", "ocr_boxes": None, "verdicts": None})
+        self.rows.append({"id": "x", "owner_id": "other", "assignment_id": "a1", "storage_path": "o/x.pdf",
+                          "original_name": "aaron.pdf", "ocr_boxes": BOXES, "verdicts": {"q1": "correct"}})
+        self.storage = FakeStorage(self)
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+@pytest.fixture()
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("PDF_REGEN_CACHE_DIR", str(tmp_path / "stamped"))
+    monkeypatch.setenv("GRADED_BUNDLE_WORKERS", "2")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    monkeypatch.setattr(app_mod, "infer_regions", lambda boxes: {"q1": [(10, 10, 100, 100)]})
+    fake = FakeSupabase()
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    return TestClient(app_mod.app), fake
+
+
+def test_entry_names_are_unique_and_safe():
+    rows = [{"id": "1", "original_name": "a/b.png"}, {"id": "2", "original_name": "a_b.jpg"}, {"id": "3"}]
+    assert bundle.entry_names(rows) == ["a_b.graded.pdf", "a_b (2).graded.pdf", "3.graded.pdf"]
+
+
+def test_merged_pdf_in_class_order_with_bookmarks(client):
+    c, fake = client
+    r = c.post("/api/assignments/a1/graded-bundle", json={"format": "pdf"}, headers={"X-Owner-Id": "t1"})
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/pdf"
+    assert r.headers["x-bundle-count"] == "3"
+    assert r.headers["x-bundle-skipped"] == "u9"
+    with fitz.open(stream=r.content, filetype="pdf") as doc:
+        assert doc.page_count == 1 + 2 + 3
+        assert [t[1:] for t in doc.get_toc()] == [["alice", 1], ["bob", 3], ["carol", 4]]
+        assert "alice.pdf p1" in doc[0].get_text()
+        assert sum(1 for p in doc for _ in p.annots()) == 3
+    assert "o/x.pdf" not in fake.downloads
+
+
+def test_zip_of_per_student_pdfs_with_manifest(client):
+    c, _ = client
+    r = c.post("/api/assignments/a1/graded-bundle", json={"format": "zip", "upload_ids": ["u2", "u0", "u9"]},
+               headers={"X-Owner-Id": "t1"})
+    assert r.status_code == 200
+    zf = zipfile.ZipFile(io.BytesIO(r.content))
+    assert zf.namelist() == ["carol.graded.pdf", "bob.graded.pdf", "manifest.json"]
+    with fitz.open(stream=zf.read("carol.graded.pdf"), filetype="pdf") as doc:
+        assert doc.page_count == 3
+    man = json.loads(zf.read("manifest.json"))
+    assert man["skipped"] == [{"upload_id": "u9", "name": "dave.graded.pdf", "error": "OCR boxes missing — run OCR"}]
+
+
+def test_errors(client):
+    c, _ = client
+    h = {"X-Owner-Id": "t1"}
+    assert c.post("/api/assignments/nope/graded-bundle", headers=h).status_code == 404
+    assert c.post("/api/assignments/a1/graded-bundle", json={"format": "tar"}, headers=h).status_code == 400
+    r = c.post("/api/assignments/a1/graded-bundle", json={"upload_ids": ["u9"]}, headers=h)
+    assert r.status_code == 409
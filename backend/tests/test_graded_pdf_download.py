@@ -0,0 +1,162 @@
+import importlib
+
+import httpx
+import pytest
+import respx
+from fastapi.testclient import TestClient
+
+from backend.services import graded_pdf
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 40 + b"\n%%EOF\n"
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self._id = None
+
+    def select(self, sel):
+        return self
+
+    def eq(self, col, val):
+        self._id = val
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def execute(self):
+        return _Resp(self.rows.get(self._id))
+
+
+class FakeBucket:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def download(self, path):
+        self.storage.downloads.append(path)
+        return self.storage.objects[path]
+
+
+class FakeStorage:
+    def __init__(self, objects):
+        self.objects = objects
+        self.downloads = []
+
+    def from_(self, name):
+        assert name == "graded-pdfs"
+        return FakeBucket(self)
+
+
+class FakeSupabase:
+    def __init__(self, rows, objects):
+        self.rows = rows
+        self.storage = FakeStorage(objects)
+
+    def table(self, name):
+        return FakeTable(self.rows)
+
+
+def test_parse_range():
+    assert graded_pdf.parse_range(None, 100) is None
+    assert graded_pdf.parse_range("bytes=0-9", 100) == (0, 9)
+    assert graded_pdf.parse_range("bytes=90-", 100) == (90, 99)
+    assert graded_pdf.parse_range("bytes=-10", 100) == (90, 99)
+    assert graded_pdf.parse_range("bytes=50-500", 100) == (50, 99)
+    assert graded_pdf.parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(graded_pdf.RangeNotSatisfiable):
+        graded_pdf.parse_range("bytes=100-", 100)
+
+
+@pytest.fixture()
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("GRADED_PDF_CACHE_DIR", str(tmp_path / "pdfcache"))
+    monkeypatch.setenv("GRADED_PDF_CHUNK_KB", "1")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    fake = FakeSupabase(
+        {
+            "u1": {"id": "u1", "owner_id": "t1", "graded_pdf_path": "t1/u1.pdf", "ocr_updated_at": "v1"},
+            "u2": {"id": "u2", "owner_id": "t1"},
+        },
+        {"t1/u1.pdf": PDF},
+    )
+    app_mod.supabase = fake
+    return TestClient(app_mod.app), fake
+
+
+def test_full_download_then_cached_conditional_and_ranges(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+    r = c.get("/api/uploads/u1/graded.pdf", headers=h)
+    assert r.status_code == 200
+    assert r.content == PDF
+    assert r.headers["content-type"] == "application/pdf"
+    assert r.headers["accept-ranges"] == "bytes"
+    etag = r.headers["etag"]
+    assert etag.strip('"') == __import__("hashlib").sha256(PDF).hexdigest()
+
+    r = c.get("/api/uploads/u1/graded.pdf", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 304 and r.content == b""
+
+    r = c.get("/api/uploads/u1/graded.pdf", headers={**h, "Range": "bytes=100-2099"})
+    assert r.status_code == 206
+    assert r.content == PDF[100:2100]
+    assert r.headers["content-range"] == f"bytes 100-2099/{len(PDF)}"
+
+    # stale If-Range: whole file
+    r = c.get("/api/uploads/u1/graded.pdf", headers={**h, "Range": "bytes=0-9", "If-Range": '"old"'})
+    assert r.status_code == 200 and r.content == PDF
+
+    r = c.get("/api/uploads/u1/graded.pdf", headers={**h, "Range": f"bytes={len(PDF)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(PDF)}"
+
+    # storage was hit once; everything else came from the disk cache
+    assert fake.storage.downloads == ["t1/u1.pdf"]
+
+
+def test_regenerated_pdf_is_refetched(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+    first = c.get("/api/uploads/u1/graded.pdf", headers=h).headers["etag"]
+    fake.storage.objects["t1/u1.pdf"] = PDF + b"%new"
+    fake.rows["u1"] = {**fake.rows["u1"], "ocr_updated_at": "v2"}
+    import backend.app as app_mod
+    app_mod.uploads_repo.invalidate("u1")
+    r = c.get("/api/uploads/u1/graded.pdf", headers=h)
+    assert r.content.endswith(b"%new")
+    assert r.headers["etag"] != first
+    assert len(fake.storage.downloads) == 2
+
+
+def test_errors(client):
+    c, _ = client
+    assert c.get("/api/uploads/nope/graded.pdf").status_code == 404
+    assert c.get("/api/uploads/u2/graded.pdf", headers={"X-Owner-Id": "t1"}).status_code == 404
+
+
+def test_spools_from_signed_url_in_chunks(client):
+    c, fake = client
+
+    def sign(path, expires):
+        return {"signedURL": f"https://storage.example/graded-pdfs/{path}?token=t"}
+
+    FakeBucket.create_signed_url = staticmethod(sign)
+    try:
+        with respx.mock:
+            route = respx.get(url__startswith="https://storage.example/graded-pdfs/t1/u1.pdf").mock(
+                return_value=httpx.Response(200, content=PDF)
+            )
+            r = c.get("/api/uploads/u1/graded.pdf", headers={"Range": "bytes=-7"})
+            assert route.call_count == 1
+    finally:
+        del FakeBucket.create_signed_url
+    assert r.status_code == 206 and r.content == PDF[-7:]
+    assert fake.storage.downloads == []
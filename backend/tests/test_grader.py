@@ -0,0 +1,134 @@
+import random
+import re
+
+from backend.models.schemas import AutoKey, GradeResult, Question
+from backend.services.grader import generate_autokeys, grade, grade_many, parse_questions
+from backend.services.text_index import NUMBER, TextIndex, stem, terms
+
+
+def _exam(n, seed=0):
+    rnd = random.Random(seed)
+    out = ["Name: Ada", "Class 7B"]
+    for i in range(1, n + 1):
+        kind = i % 3
+        if kind == 0:
+            out += [f"{i}) Pick one", f"(A) {rnd.randint(1, 9)} (B) x{rnd.randint(1, 9)} (C) none", f"({rnd.choice('ABCD')})"]
+        elif kind == 1:
+            out += [f"Q{i}: Solve {rnd.randint(2, 99)} + {rnd.randint(2, 99)} = ?", f"answer: {rnd.randint(-50, 200)}"]
+        else:
+            out += [f"{i}. Explain why plants need light", "photosynthesis makes sugar from light"]
+    return "\n".join(out)
+
+
+def test_parse_questions_types_and_options():
+    qs = parse_questions("intro\n1) Pick (A) red (B) blue (A) again\n2. Solve 3 + 4 = ?\nQ3: Why?\nbecause")
+    assert [(q.id, q.qtype) for q in qs] == [("1", "MCQ"), ("2", "numeric"), ("3", "short_answer")]
+    assert qs[0].options == ["red", "blue"]
+    assert qs[2].prompt == "Why? because"
+    assert parse_questions("just text")[0].prompt == "just text"
+    # cached parses hand out fresh models
+    qs[0].options.append("x")
+    assert parse_questions("intro\n1) Pick (A) red (B) blue (A) again\n2. Solve 3 + 4 = ?\nQ3: Why?\nbecause")[0].options == ["red", "blue"]
+
+
+def test_index_answers_like_a_full_text_search():
+    rnd = random.Random(7)
+    alphabet = "ab(ABCEx)-.1209 _\nΣς"
+    for _ in range(2000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 30)))
+        idx = TextIndex(text)
+        m = re.search(r"-?\d+(?:\.\d+)?", text)
+        assert idx.first_number == (m.group(0) if m else None), text
+        m = re.search(r"\(([A-E])\)", text)
+        assert idx.first_option == (m.group(1) if m else None), text
+        for start, end in idx.number_spans:
+            assert NUMBER.fullmatch(text[start:end])
+
+
+def test_grade_large_exam():
+    text = _exam(60)
+    qs = parse_questions(text)
+    assert len(qs) == 60
+    result = grade(qs, generate_autokeys(qs), text)
+    assert len(result.items) == 60
+    assert result.total_max == 60.0
+    by_type = {i.qtype for i in result.items}
+    assert by_type == {"MCQ", "numeric", "short_answer"}
+
+
+def test_grade_many_matches_per_submission_grading():
+    sheet = _exam(30, seed=1)
+    qs = parse_questions(sheet)
+    keys = generate_autokeys(qs)[::2]  # some questions without a key
+    texts = [_exam(30, seed=s) for s in range(8)] + ["", "(B) 7 plants"]
+    grades = grade_many(qs, keys, texts)
+    assert grades.scores.shape == (10, 30)
+    for i, text in enumerate(texts):
+        one = grade(qs, keys, text)
+        assert grades.result(i) == one
+        assert grades.totals[i] == one.total_score
+        assert grades.needs_review[i] == one.needs_review
+    assert len(grade_many(qs, keys, [])) == 0
+
+
+def test_compact_results_serialize_once(monkeypatch):
+    import json
+
+    from backend.services import fastjson
+
+    qs = parse_questions(_exam(6))
+    result = grade(qs, generate_autokeys(qs), _exam(6, seed=3))
+    assert GradeResult.model_validate(result.to_dict()).model_dump() == result.to_dict()
+    raw = fastjson.dumps(result.to_dict())
+    for lib in (fastjson.orjson, None):
+        monkeypatch.setattr(fastjson, "orjson", lib)
+        resp = fastjson.response({"ok": True}, grade=raw)
+        assert json.loads(resp.body) == {"ok": True, "grade": result.to_dict()}
+    assert json.loads(fastjson.response({}, grade=b"1").body) == {"grade": 1}
+
+
+def test_terms_are_whole_word_stems():
+    assert [stem(w) for w in ("lights", "making", "makes", "running", "boxes", "class", "leaves")] == [
+        "light", "mak", "mak", "run", "box", "class", "leav"]
+    assert terms("Why do the leaves look green? 2 lights") == ["leav", "look", "green", "2", "light"]
+    idx = TextIndex("Sunlight makes leaves green")
+    assert not idx.has("light") and idx.has("mak") and idx.span("leav") == (15, 21)
+
+
+def test_short_answer_must_include_and_evidence():
+    qs = [Question(id="1", prompt="Why are leaves green", qtype="short_answer")]
+    keys = [AutoKey(question_id="1", answer="chlorophyll reflects green light", must_include=["chlorophyll"])]
+    texts = [
+        "Leaves have chlorophyll which reflected green lights.",
+        "They reflect green light.",
+        "sunlight",
+    ]
+    grades = grade_many(qs, keys, texts)
+    assert grades.scores[:, 0].tolist() == [1.0, 0.0, 0.0]
+
+    first = grades.result(0).items[0]
+    assert [texts[0][a:b] for a, b in first.evidence] == ["chlorophyll", "reflected", "green", "lights"]
+    assert first.rationale == "Keyword overlap=4."
+    second = grades.result(1).items[0]
+    assert second.rationale == "Keyword overlap=3. Missing required: chlorophyll."
+    assert grades.result(2).items[0].evidence == []
+    assert grades.result(0).to_dict()["items"][0]["evidence"] == [[12, 23], [30, 39], [40, 45], [46, 52]]
+
+
+def test_sections_grade_each_question_on_its_own_answer():
+    qs = [Question(id="1", qtype="numeric", prompt="1) 2 + 2"), Question(id="2", qtype="numeric", prompt="2) 3 + 4"),
+          Question(id="3", qtype="short_answer", prompt="3) Why")]
+    keys = [AutoKey(question_id="1", answer="4"), AutoKey(question_id="2", answer="7"),
+            AutoKey(question_id="3", answer="chlorophyll")]
+    text = "4\n7\nchlorophyll"
+    # whole text: every numeric question sees the first number
+    assert [i.score for i in grade(qs, keys, text).items] == [1.0, 0.0, 1.0]
+
+    sections = (text, {"1": (0, 1), "2": (2, 3)})
+    graded = grade_many(qs, keys, [text, text, text], [sections, None, (text, {"3": (4, 15)})])
+    assert [i.score for i in graded.result(0).items] == [1.0, 1.0, 0.0]
+    assert [text[a:b] for a, b in graded.result(0).items[1].evidence] == ["7"]
+    assert [i.score for i in graded.result(1).items] == [1.0, 0.0, 1.0]
+    # no region for the numeric questions: nothing to grade, flagged for review
+    assert [i.score for i in graded.result(2).items] == [0.0, 0.0, 1.0]
+    assert graded.result(2).items[0].low_confidence and graded.needs_review[2]
@@ -0,0 +1,47 @@
+"""Per-submission grading time on large synthetic exams.
+
+    pytest backend/tests/test_grader_bench.py --benchmark-only
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from backend.services import grader  # noqa: E402
+from backend.tests.test_grader import _exam  # noqa: E402
+
+
+@pytest.mark.parametrize("n", [50, 99])
+def test_bench_grade_submission(benchmark, n):
+    text = _exam(n, seed=n)
+
+    def run():
+        grader._parse.cache_clear()
+        qs = grader.parse_questions(text)
+        return grader.grade(qs, grader.generate_autokeys(qs), text)
+
+    result = benchmark(run)
+    assert len(result.items) == n
+
+
+def test_bench_parse_cached(benchmark):
+    text = _exam(99)
+    grader.parse_questions(text)
+    assert len(benchmark(grader.parse_questions, text)) == 99
+
+
+def _class_set(n_students=200, n_questions=30):
+    sheet = _exam(n_questions, seed=0)
+    qs = grader.parse_questions(sheet)
+    return qs, grader.generate_autokeys(qs), [_exam(n_questions, seed=s) for s in range(n_students)]
+
+
+def test_bench_class_set_per_submission(benchmark):
+    qs, keys, texts = _class_set()
+    totals = benchmark(lambda: [grader.grade(qs, keys, t).total_score for t in texts])
+    assert len(totals) == 200
+
+
+def test_bench_class_set_grade_many(benchmark):
+    qs, keys, texts = _class_set()
+    totals = benchmark(lambda: grader.grade_many(qs, keys, texts).totals)
+    assert totals.shape == (200,)
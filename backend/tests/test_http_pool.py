@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+import respx
+
+from backend.services import http as shared_http
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    asyncio.run(shared_http.aclose())
+    shared_http._stats = shared_http._Stats()
+    yield
+    asyncio.run(shared_http.aclose())
+
+
+def test_scoped_clients_share_one_pool_and_count_requests():
+    async def main():
+        with respx.mock:
+            respx.post("https://hf.example/models/x").mock(return_value=httpx.Response(200, json=[{"generated_text": "hi"}]))
+            respx.get("https://storage.example/a.png").mock(return_value=httpx.Response(503))
+            async with shared_http.client(timeout=45) as a:
+                r1 = await a.post("https://hf.example/models/x", content=b"img")
+            async with shared_http.client(timeout=60) as b:
+                r2 = await b.get("https://storage.example/a.png")
+            assert a._client is b._client
+            return r1.status_code, r2.status_code
+
+    assert asyncio.run(main()) == (200, 503)
+    st = shared_http.stats()
+    assert st["requests"] == 2
+    assert st["in_flight"] == 0
+    assert st["errors_5xx"] == 1
+    assert st["by_host"]["hf.example"]["requests"] == 1
+
+
+def test_scoped_timeout_is_a_per_request_default():
+    seen = {}
+
+    def handler(request):
+        seen["timeout"] = request.extensions["timeout"]
+        return httpx.Response(200)
+
+    async def main():
+        with respx.mock:
+            respx.get("https://x.example/").mock(side_effect=handler)
+            async with shared_http.client(timeout=7) as c:
+                await c.get("https://x.example/")
+
+    asyncio.run(main())
+    assert seen["timeout"]["read"] == 7
+
+
+def test_transport_errors_are_counted_and_release_in_flight():
+    async def main():
+        with respx.mock:
+            respx.get("https://down.example/").mock(side_effect=httpx.ConnectError("boom"))
+            async with shared_http.client() as c:
+                with pytest.raises(httpx.ConnectError):
+                    await c.get("https://down.example/")
+
+    asyncio.run(main())
+    st = shared_http.stats()
+    assert st["transport_errors"] == 1
+    assert st["in_flight"] == 0
+
+
+def test_host_limits_mount_dedicated_pools(monkeypatch):
+    monkeypatch.setenv("HTTP_HOST_LIMITS", "api-inference.huggingface.co=8, bad, *.azure.com=4")
+    assert shared_http._host_limits() == {"api-inference.huggingface.co": 8, "*.azure.com": 4}
+
+    async def main():
+        shared_http.get_client()
+        return shared_http.stats()
+
+    st = asyncio.run(main())
+    assert st["open"] is True
+    assert set(st["pools"]) == {"default", "all://api-inference.huggingface.co", "all://*.azure.com"}
+    assert st["pools"]["all://api-inference.huggingface.co"]["max_connections"] == 8
+
+
+def test_each_loop_gets_its_own_client_closed_at_loop_shutdown():
+    async def main():
+        return shared_http.get_client()
+
+    first = asyncio.run(main())
+    assert first.is_closed  # its pool went with the loop instead of leaking
+    second = asyncio.run(main())
+    assert second is not first and second.is_closed
+
+    async def lifespan():
+        c = shared_http.get_client()
+        await shared_http.aclose()
+        return c, shared_http.get_client()
+
+    closed, fresh = asyncio.run(lifespan())
+    assert closed.is_closed and fresh is not closed
@@ -1,3 +1,58 @@
+import importlib
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[2]
+# loaded on first use, never by importing the app
+LAZY = ("pytesseract", "PIL", "supabase", "reportlab", "fitz", "pymupdf", "torch")
+
+
 def test_import_backend_app():
     from backend.app import app  # noqa: F401
 
+
+def _import_app():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.app"],
+        cwd=ROOT, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules, total_us = set(), None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        if name.strip() == "backend.app":
+            total_us = int(cumulative)
+    return proc.stdout, modules, total_us
+
+
+def test_import_has_no_side_effects():
+    stdout, modules, _ = _import_app()
+    assert stdout == ""  # no boot prints
+    assert not {m.split(".")[0] for m in modules} & set(LAZY)
+
+
+def test_import_stays_within_budget():
+    # generous for loaded CI machines; APP_IMPORT_BUDGET_MS tightens or relaxes it
+    budget_ms = float(os.getenv("APP_IMPORT_BUDGET_MS") or 1500)
+    best_ms = min(_import_app()[2] for _ in range(3)) / 1000
+    assert best_ms < budget_ms, f"import backend.app took {best_ms:.0f} ms (budget {budget_ms:.0f})"
+
+
+def test_lifespan_keeps_assigned_clients(monkeypatch):
+    monkeypatch.delenv("SUPABASE_URL", raising=False)
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    assert app_mod.supabase is None and app_mod.supabase_sr is None
+
+    fake = object()
+    app_mod.supabase = fake
+    with TestClient(app_mod.create_app()) as c:
+        assert c.get("/api/debug/config").json()["supabase_ready"] is True
+    assert app_mod.supabase is fake and app_mod.supabase_sr is None
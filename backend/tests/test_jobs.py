@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+import time
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend import worker
+from backend.services import jobs
+from backend.services.jobs import SQLiteJobStore
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+
+
+def test_enqueue_dedupes_active_jobs_per_upload(store):
+    a = store.enqueue("ocr", upload_id="u1", owner_id="t1", payload={"model": None})
+    b = store.enqueue("ocr", upload_id="u1", owner_id="t1")
+    c = store.enqueue("grade", upload_id="u1", owner_id="t1")
+    assert a["id"] == b["id"] != c["id"]
+    assert a["status"] == jobs.QUEUED and a["payload"] == {"model": None}
+
+
+def test_claim_leases_oldest_job_once(store):
+    first = store.enqueue("ocr", upload_id="u1")
+    store.enqueue("ocr", upload_id="u2")
+    job = store.claim("w1", ["ocr"], lease_s=60)
+    assert job["id"] == first["id"]
+    assert (job["status"], job["attempts"], job["lease_owner"]) == (jobs.RUNNING, 1, "w1")
+    assert store.claim("w2", ["ocr"])["upload_id"] == "u2"
+    assert store.claim("w3", ["ocr"]) is None
+    assert store.claim("w3", ["grade"]) is None
+
+
+def test_expired_lease_is_reclaimed_then_fails_when_out_of_attempts(store):
+    store.enqueue("ocr", upload_id="u1")
+    j1 = store.claim("dead-worker", lease_s=0)
+    time.sleep(0.01)
+    j2 = store.claim("w2", lease_s=0)
+    assert j2["id"] == j1["id"] and j2["attempts"] == 2 and j2["lease_owner"] == "w2"
+    # the first worker lost its lease and can't complete the job anymore
+    assert store.complete(j1["id"], "dead-worker") is False
+    time.sleep(0.01)
+    assert store.claim("w3") is None
+    assert store.get(j1["id"])["status"] == jobs.FAILED
+
+
+def test_fail_retries_with_backoff_then_gives_up(store):
+    store.enqueue("ocr", upload_id="u1")
+    job = store.claim("w1")
+    released = store.fail(job["id"], "w1", "provider 503")
+    assert released["status"] == jobs.QUEUED
+    assert released["run_after"] >= time.time() + jobs.RETRY_BASE_S - 1
+    assert store.claim("w1") is None  # not due yet
+
+    store.enqueue("ocr", upload_id="u2")
+    job = store.claim("w1")
+    assert store.fail(job["id"], "w1", "bad input", retry=False)["status"] == jobs.FAILED
+
+
+def test_worker_process_one_completes_and_reports_failures(store):
+    calls = []
+
+    async def ok(job):
+        return {"chars": 12}
+
+    async def boom(job):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    def on_failure(job, err, final):
+        calls.append((job["upload_id"], err, final))
+
+    async def main():
+        store.enqueue("ocr", upload_id="u1")
+        store.enqueue("grade", upload_id="u2")
+        done = await worker.process_one(store, {"ocr": ok, "grade": boom}, "w1", on_failure=on_failure)
+        failed = await worker.process_one(store, {"ocr": ok, "grade": boom}, "w1", on_failure=on_failure)
+        idle = await worker.process_one(store, {"ocr": ok, "grade": boom}, "w1")
+        return done, failed, idle
+
+    done, failed, idle = asyncio.run(main())
+    assert (done["status"], done["result"]) == (jobs.DONE, {"chars": 12})
+    # 404 is not retryable: straight to failed
+    assert failed["status"] == jobs.FAILED and failed["error"] == "Upload not found"
+    assert calls == [("u2", "Upload not found", True)]
+    assert idle is None
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self._where, self._payload, self._limit = {}, None, False
+
+    def select(self, sel):
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def limit(self, n):
+        self._limit = True
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        row = self.db.get(self._where.get("id"))
+        if row is not None and self._payload is not None:
+            row.update(self._payload)
+            return _Resp([row])
+        if self._limit:
+            return _Resp([row] if row else [])
+        return _Resp(row)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeTable(self.rows, name)
+
+
+def test_queue_mode_ocr_start_enqueues_and_worker_writes_status(tmp_path, monkeypatch):
+    monkeypatch.setenv("JOBS_MODE", "queue")
+    monkeypatch.setenv("JOBS_DB", str(tmp_path / "q.sqlite3"))
+    monkeypatch.setenv("OCR_PROVIDER", "tesseract")
+    monkeypatch.setenv("OCR_MOCK", "0")
+    monkeypatch.setenv("DEV_MODE", "0")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    rows = {"u1": {"id": "u1", "owner_id": "t1", "storage_path": "t1/a.png"}}
+    fake = FakeSupabase(rows)
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    ran = []
+    monkeypatch.setattr(app_mod, "run_ocr_tesseract", lambda p: ran.append(p) or {"text": "hello", "meta": {}, "boxes": {}})
+
+    client = TestClient(app_mod.app)
+    r = client.post("/api/ocr/start", json={"upload_id": "u1"}, headers={"X-Owner-Id": "t1"})
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["status"] == "queued" and ran == []
+    assert rows["u1"]["ocr_status"] == "queued"
+
+    job = asyncio.run(worker.process_one(jobs.get_store(), app_mod.JOB_HANDLERS, "w1", on_failure=app_mod._job_failed))
+    assert job["status"] == jobs.DONE
+    assert ran == ["t1/a.png"]
+    assert rows["u1"]["extracted_text"] == "hello"
+    assert rows["u1"]["ocr_started_at"] and rows["u1"]["ocr_completed_at"]
+
+    st = client.get(f"/api/jobs/{body['job_id']}", headers={"X-Owner-Id": "t1"}).json()
+    assert st["status"] == "done"
+    assert client.get(f"/api/jobs/{body['job_id']}", headers={"X-Owner-Id": "other"}).status_code == 404
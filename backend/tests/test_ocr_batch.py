@@ -0,0 +1,212 @@
+import asyncio
+import importlib
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services.ocr_batch import OCRScheduler, parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits("azure_vision=8, Tesseract=2,bad,zero=0") == {"azure_vision": 8, "tesseract": 2}
+
+
+def test_round_robin_across_owners_and_concurrency_limit():
+    order = []
+    active = {"now": 0, "peak": 0}
+
+    async def runner(upload_id, batch):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        order.append(upload_id)
+        await asyncio.sleep(0.005)
+        active["now"] -= 1
+        return {"status": "done"}
+
+    async def main():
+        s = OCRScheduler(runner, limits={"tesseract": 1})
+        big = s.submit("teacher-a", [f"a{i}" for i in range(6)], "tesseract")
+        small = s.submit("teacher-b", ["b0", "b1"], "tesseract")
+        while big.progress()["status"] != "done" or small.progress()["status"] != "done":
+            await asyncio.sleep(0.005)
+        await s.stop()
+        return big, small
+
+    big, small = asyncio.run(main())
+    # teacher-b is interleaved instead of waiting behind all of teacher-a
+    assert order[:4] == ["a0", "b0", "a1", "b1"]
+    assert active["peak"] == 1
+    assert big.progress()["done"] == 6 and small.progress()["percent"] == 100.0
+
+
+def test_lanes_are_per_provider_and_failures_are_recorded():
+    async def runner(upload_id, batch):
+        if upload_id == "bad":
+            raise RuntimeError("boom")
+        if upload_id == "empty":
+            return {"status": "error", "error": "no_text"}
+        await asyncio.sleep(0.01)
+        return {"status": "done"}
+
+    async def main():
+        s = OCRScheduler(runner, limits={"azure_vision": 3}, default_limit=1)
+        b = s.submit("o", ["u1", "u2", "u3", "bad", "empty", "u1"], "azure_vision")
+        assert b.progress()["total"] == 5  # de-duplicated
+        await asyncio.sleep(0)
+        assert s.stats()["lanes"]["azure_vision"]["limit"] == 3
+        while b.progress()["status"] != "done":
+            await asyncio.sleep(0.005)
+        await s.stop()
+        return b
+
+    b = asyncio.run(main())
+    out = b.to_dict()
+    assert (out["done"], out["failed"]) == (3, 2)
+    errors = {i["upload_id"]: i.get("error") for i in out["items"]}
+    assert errors["bad"] == "boom" and errors["empty"] == "no_text"
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self._where, self._payload = {}, None
+
+    def select(self, sel):
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        row = self.db.get(self._where.get("id"))
+        if row is not None and self._payload is not None:
+            row.update(self._payload)
+            return _Resp([row])
+        return _Resp(row)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeTable(self.rows, name)
+
+
+@pytest.fixture()
+def app_env(monkeypatch):
+    monkeypatch.setenv("OCR_PROVIDER", "tesseract")
+    monkeypatch.setenv("OCR_MOCK", "0")
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("OCR_BATCH_LIMITS", "tesseract=2")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    rows = {
+        "u1": {"id": "u1", "owner_id": "t1", "storage_path": "t1/a.png"},
+        "u2": {"id": "u2", "owner_id": "t1", "storage_path": "t1/b.png"},
+        "u3": {"id": "u3", "owner_id": "someone-else", "storage_path": "x/c.png"},
+    }
+    fake = FakeSupabase(rows)
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    monkeypatch.setattr(app_mod, "run_ocr_tesseract", lambda path: {"text": f"text of {path}", "meta": {}, "boxes": {}})
+    return app_mod, rows
+
+
+def test_batch_endpoint_queues_and_reports_progress(app_env):
+    app_mod, rows = app_env
+    headers = {"X-Owner-Id": "t1"}
+    with TestClient(app_mod.app) as client:
+        r = client.post("/api/ocr/batch", json={"upload_ids": ["u1", "u2", "u3", "missing"]}, headers=headers)
+        assert r.status_code == 202, r.text
+        batch_id = r.json()["batch_id"]
+        assert r.json()["total"] == 4
+
+        deadline = time.time() + 5
+        while True:
+            st = client.get(f"/api/ocr/batch/{batch_id}", headers=headers).json()
+            if st["status"] == "done" or time.time() > deadline:
+                break
+            time.sleep(0.02)
+        assert (st["done"], st["failed"], st["percent"]) == (2, 2, 100.0)
+
+        full = client.get(f"/api/ocr/batch/{batch_id}?items=1", headers=headers).json()
+        assert {i["upload_id"]: i["status"] for i in full["items"]} == {
+            "u1": "done", "u2": "done", "u3": "failed", "missing": "failed",
+        }
+        # other owners can't see the batch
+        assert client.get(f"/api/ocr/batch/{batch_id}", headers={"X-Owner-Id": "t2"}).status_code == 404
+
+    assert rows["u1"]["extracted_text"] == "text of t1/a.png"
+    assert "extracted_text" not in rows["u3"]
+
+
+def test_batch_endpoint_validates_input(app_env, monkeypatch):
+    app_mod, _ = app_env
+    monkeypatch.setenv("OCR_BATCH_MAX_ITEMS", "2")
+    with TestClient(app_mod.app) as client:
+        assert client.post("/api/ocr/batch", json={"upload_ids": []}, headers={"X-Owner-Id": "t1"}).status_code == 400
+        assert client.post("/api/ocr/batch", json={"upload_ids": ["a", "b", "c"]}, headers={"X-Owner-Id": "t1"}).status_code == 413
+        assert client.post("/api/ocr/batch", json={"upload_ids": ["a"]}).status_code == 401
+
+
+def test_azure_download_does_not_block_the_loop(monkeypatch):
+    import backend.app as app_mod
+
+    monkeypatch.setenv("AZURE_ENDPOINT", "https://example.cognitiveservices.azure.com")
+    monkeypatch.setenv("AZURE_KEY", "k")
+
+    def slow_download(path):
+        time.sleep(0.3)
+        return b""
+
+    monkeypatch.setattr(app_mod, "_download_bytes_from_storage", slow_download)
+
+    async def main():
+        t0 = time.monotonic()
+        out = await asyncio.gather(*(app_mod.run_ocr_azure_vision(f"p{i}") for i in range(4)))
+        return out, time.monotonic() - t0
+
+    out, elapsed = asyncio.run(main())
+    assert all(r["meta"]["error"] == "empty_image_bytes" for r in out)
+    assert elapsed < 1.0  # four 0.3 s downloads overlapped instead of running back to back
+
+
+def test_batch_items_keep_supabase_calls_off_the_loop(app_env):
+    from types import SimpleNamespace
+
+    app_mod, rows = app_env
+    rows.update({f"s{i}": {"id": f"s{i}", "owner_id": "t1", "storage_path": f"t1/s{i}.png"} for i in range(4)})
+
+    class SlowTable(FakeTable):
+        def execute(self):
+            time.sleep(0.1)
+            return super().execute()
+
+    slow = SimpleNamespace(table=lambda name: SlowTable(rows, name))
+    app_mod.supabase = app_mod.supabase_sr = slow
+    batch = SimpleNamespace(owner_id="t1", model=None)
+
+    async def main():
+        t0 = time.monotonic()
+        out = await asyncio.gather(*(app_mod._ocr_batch_item(f"s{i}", batch) for i in range(4)))
+        return out, time.monotonic() - t0
+
+    out, elapsed = asyncio.run(main())
+    assert [r["status"] for r in out] == ["done"] * 4
+    assert rows["s3"]["ocr_status"] == "done"
+    assert elapsed < 0.9  # 3 x 0.1 s calls per item overlapped across items, not 1.2 s back to back
@@ -0,0 +1,86 @@
+import os
+
+from backend.ocr import cache as ocr_cache
+from backend.ocr.cache import OCRCache, cache_key
+
+
+def test_cache_key_covers_content_provider_model_and_preproc():
+    base = cache_key(b"abc", "tesseract", "m", "p1")
+    assert base == cache_key(b"abc", "tesseract", "m", "p1")
+    assert base != cache_key(b"abd", "tesseract", "m", "p1")
+    assert base != cache_key(b"abc", "azure_vision", "m", "p1")
+    assert base != cache_key(b"abc", "tesseract", "m2", "p1")
+    assert base != cache_key(b"abc", "tesseract", "m", "p2")
+
+
+def test_memory_then_disk_tiers(tmp_path):
+    c = OCRCache(str(tmp_path), mem_items=1)
+    c.put("a" * 64, {"text": "one", "meta": {}})
+    c.put("b" * 64, {"text": "two", "meta": {}})  # pushes "a" out of memory
+
+    value, tier = c.get("b" * 64)
+    assert (value["text"], tier) == ("two", "memory")
+    value, tier = c.get("a" * 64)
+    assert (value["text"], tier) == ("one", "disk")
+    assert c.get("c" * 64) == (None, None)
+    assert c.stats() == {"lookups": 3, "hits": 2, "memory_hits": 1, "disk_hits": 1, "misses": 1}
+
+
+def test_disk_eviction_drops_least_recently_used(tmp_path):
+    payload = {"text": "x" * 200, "meta": {}}
+    c = OCRCache(str(tmp_path), max_bytes=500, mem_items=0)
+    keys = [ch * 64 for ch in "abc"]
+    for i, k in enumerate(keys):
+        c.put(k, payload)
+        os.utime(c._path(k), (1000 + i, 1000 + i))
+    assert not os.path.exists(c._path(keys[0]))
+    assert os.path.exists(c._path(keys[1])) and os.path.exists(c._path(keys[2]))
+
+
+def test_lookup_and_store_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE", "1")
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path))
+
+    key, hit = ocr_cache.lookup(b"page", "tesseract", "psm", "v1")
+    assert hit is None
+    out = ocr_cache.store(key, {"text": "hello", "meta": {"provider": "tesseract"}})
+    assert out["meta"]["cache"]["hit"] is False
+
+    _, hit = ocr_cache.lookup(b"page", "tesseract", "psm", "v1")
+    assert hit["text"] == "hello"
+    assert hit["meta"]["provider"] == "tesseract"
+    assert hit["meta"]["cache"]["hit"] is True
+    assert hit["meta"]["cache"]["tier"] == "memory"
+
+    # mutating a served hit doesn't corrupt the cached entry
+    hit["meta"]["provider"] = "changed"
+    _, again = ocr_cache.lookup(b"page", "tesseract", "psm", "v1")
+    assert again["meta"]["provider"] == "tesseract"
+
+
+def test_every_lookup_is_counted(tmp_path, monkeypatch):
+    monkeypatch.setenv("OCR_CACHE", "1")
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path))
+    for _ in range(3):  # misses whose OCR then failed: nothing stored
+        assert ocr_cache.lookup(b"bad", "tesseract")[1] is None
+    stats = ocr_cache.get_cache().stats()
+    assert (stats["lookups"], stats["misses"], stats["hits"]) == (3, 3, 0)
+
+
+def test_sweep_settings_change_the_tesseract_key(monkeypatch):
+    from backend.ocr import tesseract as tess
+
+    monkeypatch.setenv("TESSERACT_EARLY_EXIT_CONF", "85")
+    before = tess.sweep_signature()
+    monkeypatch.setenv("TESSERACT_EARLY_EXIT_CONF", "70")
+    assert tess.sweep_signature() != before
+    monkeypatch.setenv("TESSERACT_SWEEP_PARALLEL", "4")
+    assert cache_key(b"p", "tesseract", tess.sweep_signature()) != cache_key(b"p", "tesseract", before)
+
+
+def test_disabled_cache_is_passthrough():
+    # conftest sets OCR_CACHE=0
+    assert ocr_cache.get_cache() is None
+    assert ocr_cache.lookup(b"x", "tesseract") == (None, None)
+    result = {"text": "t", "meta": {}}
+    assert ocr_cache.store(None, result) is result
@@ -0,0 +1,137 @@
+import time
+
+import pytest
+
+from backend.ocr.pool import OCRWorkerPool, PoolUnavailable
+
+
+class EchoProvider:
+    """Stands in for TrOCRLocal inside the spawned workers."""
+
+    loaded = []
+
+    def _get_pipe(self, model_id):
+        self.loaded.append(model_id)
+
+    def run(self, *, file_bytes, filename, model_override=None):
+        if filename == "boom.png":
+            raise ValueError("bad image")
+        if filename == "slow.png":
+            time.sleep(0.5)
+        return file_bytes.decode(), {"model": model_override, "preloaded": list(self.loaded)}
+
+
+class BrokenProvider:
+    def __init__(self):
+        raise ImportError("torch missing")
+
+
+@pytest.fixture()
+def pool():
+    p = OCRWorkerPool(2, models=["m-printed", "m-hand"], factory="test_ocr_pool:EchoProvider", timeout=30).start()
+    yield p
+    p.shutdown()
+
+
+def test_pool_runs_jobs_on_preloaded_workers(pool):
+    assert pool.wait_ready(30)
+    futs = [pool.submit("run", file_bytes=f"t{i}".encode(), filename="a.png") for i in range(4)]
+    out = [f.result(timeout=30) for f in futs]
+    assert [t for t, _ in out] == ["t0", "t1", "t2", "t3"]
+    assert all(m["preloaded"] == ["m-printed", "m-hand"] for _, m in out)
+
+    text, meta = pool.run(file_bytes=b"x", filename="a.png", model_override="m-hand")
+    assert (text, meta["model"]) == ("x", "m-hand")
+    stats = pool.stats()
+    assert stats["ready"] == 2 and stats["completed"] == 5 and stats["queue_depth"] == 0
+
+
+def test_pool_reports_queue_depth_and_errors(pool):
+    slow = [pool.submit("run", file_bytes=b"s", filename="slow.png") for _ in range(3)]
+    assert pool.queue_depth() == 3
+    with pytest.raises(RuntimeError, match="bad image"):
+        pool.run(file_bytes=b"x", filename="boom.png")
+    [f.result(timeout=30) for f in slow]
+    assert pool.queue_depth() == 0
+    assert pool.stats()["errors"] == 1
+
+
+def test_pool_unavailable_when_workers_fail_to_start():
+    p = OCRWorkerPool(1, models=[], factory="test_ocr_pool:BrokenProvider", timeout=30).start()
+    try:
+        fut = p.submit("run", file_bytes=b"x", filename="a.png")
+        with pytest.raises(PoolUnavailable, match="torch missing"):
+            fut.result(timeout=30)
+        with pytest.raises(PoolUnavailable):
+            p.submit("run", file_bytes=b"x", filename="a.png")
+    finally:
+        p.shutdown()
+
+
+class DyingProvider(EchoProvider):
+    def run(self, *, file_bytes, filename, model_override=None):
+        if filename == "crash.png":
+            import os
+            os._exit(3)  # killed mid-job (OOM, native crash)
+        return super().run(file_bytes=file_bytes, filename=filename, model_override=model_override)
+
+
+def test_dead_worker_fails_its_job_at_once_and_is_replaced():
+    p = OCRWorkerPool(1, models=[], factory="test_ocr_pool:DyingProvider", timeout=60).start()
+    try:
+        assert p.wait_ready(30)
+        t0 = time.monotonic()
+        with pytest.raises(PoolUnavailable, match="exited with code 3"):
+            p.submit("run", file_bytes=b"x", filename="crash.png").result(timeout=30)
+        assert time.monotonic() - t0 < 10
+        assert p.run(file_bytes=b"again", filename="a.png")[0] == "again"
+        assert p.stats()["restarts"] == 1
+    finally:
+        p.shutdown()
+
+
+
+def test_jobs_queued_behind_a_crash_go_to_the_replacement():
+    p = OCRWorkerPool(1, models=[], factory="test_ocr_pool:DyingProvider", timeout=60).start()
+    try:
+        crash = p.submit("run", file_bytes=b"x", filename="crash.png")
+        after = [p.submit("run", file_bytes=f"t{i}".encode(), filename="a.png") for i in range(2)]
+        with pytest.raises(PoolUnavailable, match="exited with code 3"):
+            crash.result(timeout=30)
+        assert [f.result(timeout=30)[0] for f in after] == ["t0", "t1"]
+    finally:
+        p.shutdown()
+
+
+class CrashOnStartProvider:
+    def __init__(self):
+        import os
+        os._exit(4)  # e.g. a native import that segfaults
+
+
+def test_pool_gives_up_after_restart_budget():
+    p = OCRWorkerPool(1, models=[], factory="test_ocr_pool:CrashOnStartProvider", timeout=60, max_restarts=1).start()
+    try:
+        fut = p.submit("run", file_bytes=b"x", filename="a.png")
+        with pytest.raises(PoolUnavailable):
+            fut.result(timeout=30)
+        deadline = time.monotonic() + 30
+        while p.stats()["broken"] is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert p.stats()["restarts"] == 2 and "crashed 2 times" in p.stats()["broken"]
+        with pytest.raises(PoolUnavailable, match="crashed"):
+            p.submit("run", file_bytes=b"x", filename="a.png")
+    finally:
+        p.shutdown()
+
+def test_one_pool_per_host(monkeypatch, tmp_path):
+    from backend.ocr import pool as pool_mod
+
+    if pool_mod.fcntl is None:
+        pytest.skip("host lock needs fcntl")
+    lock = tmp_path / "pool.lock"
+    monkeypatch.setenv("OCR_POOL_LOCK", str(lock))
+    with open(lock, "a+") as other:  # another process's pool holds the lock
+        pool_mod.fcntl.flock(other, pool_mod.fcntl.LOCK_EX | pool_mod.fcntl.LOCK_NB)
+        monkeypatch.setenv("OCR_POOL_WORKERS", "1")
+        assert pool_mod.start_from_env() is None
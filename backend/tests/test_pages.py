@@ -0,0 +1,87 @@
+import importlib
+import io
+
+import fitz
+import pytest
+from PIL import Image
+
+from backend.ocr.pages import iter_pages
+
+
+def _pdf(n_pages, size=(144, 72)):
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page(width=size[0], height=size[1])
+        page.insert_text((10, 40), f"page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_iter_pages_streams_every_pdf_page_at_dpi():
+    seen = []
+    prev = None
+    for number, img in iter_pages(_pdf(3), "packet.pdf", dpi=144):
+        if prev is not None:
+            # previous page was released before this one was rendered
+            with pytest.raises(ValueError):
+                prev.load()
+        seen.append((number, img.size, img.mode))
+        prev = img
+    assert seen == [(n, (288, 144), "RGB") for n in (1, 2, 3)]
+
+
+def test_iter_pages_image_single_page_in_mode():
+    buf = io.BytesIO()
+    Image.new("RGB", (5, 4), (255, 255, 255)).save(buf, format="PNG")
+    out = [(n, im.size, im.mode) for n, im in iter_pages(buf.getvalue(), "a.png", mode="L")]
+    assert out == [(1, (5, 4), "L")]
+
+
+def test_trocr_run_merges_pages(monkeypatch):
+    tl = importlib.import_module("backend.ocr.providers.trocr_local")
+    monkeypatch.setattr(tl.TrOCRLocal, "_pipelines", {})
+    monkeypatch.delenv("OCR_MODE", raising=False)
+    monkeypatch.delenv("OCR_SEGMENT", raising=False)
+    counter = iter(range(100))
+
+    class FakePipe:
+        def __call__(self, image):
+            return [{"generated_text": f"text {next(counter)}"}]
+
+    monkeypatch.setattr(tl, "pipeline", lambda *a, **k: FakePipe())
+    text, meta = tl.TrOCRLocal().run(file_bytes=_pdf(3), filename="packet.pdf")
+    assert text == "text 0\n\ntext 1\n\ntext 2"
+    assert meta["page_count"] == 3
+    assert [p["number"] for p in meta["pages"]] == [1, 2, 3]
+
+
+def test_tesseract_ocr_reports_per_page(monkeypatch):
+    import backend.app as app_mod
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.ocr import tesseract as tess
+
+    monkeypatch.setattr(app_mod, "_download_bytes_from_storage", lambda p: _pdf(2))
+    monkeypatch.setattr(tess, "get_pool", lambda: ThreadPoolExecutor(max_workers=2))
+
+    def fake_data(im, config, output_type):
+        return {"text": ["hi"], "conf": ["90"], "page_num": [1], "block_num": [1], "par_num": [1],
+                "line_num": [1], "left": [10], "top": [20], "width": [30], "height": [8]}
+
+    monkeypatch.setattr(app_mod.pytesseract, "image_to_data", fake_data)
+    out = app_mod.run_ocr_tesseract("submissions/o/packet.pdf")
+    assert out["meta"]["page_count"] == 2
+    assert [p["number"] for p in out["boxes"]["pages"]] == [1, 2]
+    assert out["text"] == "hi\n\nhi"
+    # line boxes are mapped back from the 2x upsampled image
+    assert out["boxes"]["pages"][0]["lines"] == [{"text": "hi", "bbox": [5, 10, 15, 4]}]
+
+
+def test_page_count_without_rasterizing():
+    from backend.ocr.pages import page_count
+
+    assert page_count(_pdf(4), "packet.pdf") == 4
+    buf = io.BytesIO()
+    Image.new("RGB", (5, 4)).save(buf, format="PNG")
+    assert page_count(buf.getvalue(), "a.png") == 1
+    assert page_count(b"not an image", "x.bin") == 1
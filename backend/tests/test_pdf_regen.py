@@ -0,0 +1,155 @@
+import importlib
+
+import fitz
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services import pdf_regen
+
+
+def _pdf(n_pages=2):
+    doc = fitz.open()
+    for i in range(n_pages):
+        doc.new_page(width=612, height=792).insert_text((72, 72), f"page {i + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+BOXES = {"unit": "pixel", "pages": [{"number": 1, "width": 612, "lines": []}, {"number": 2, "width": 612, "lines": []}]}
+REGIONS = {"q1": [(100, 100, 100, 100)], "q2": [(100, 400, 100, 100)], "q3": [(100, 100, 100, 100, 2)]}
+
+
+def _marks(pdf):
+    with fitz.open(stream=pdf, filetype="pdf") as doc:
+        return sorted((p.number + 1, a.info["subject"], a.info["content"]) for p in doc for a in p.annots())
+
+
+def test_diff_verdicts():
+    assert pdf_regen.diff_verdicts({"a": "correct", "b": "partial"}, {"a": "correct", "b": "incorrect", "c": "correct"}) == {
+        "b": "incorrect", "c": "correct"}
+    assert pdf_regen.diff_verdicts({"a": "correct"}, {}) == {"a": None}
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, sb):
+        self.sb = sb
+        self._id = None
+        self._payload = None
+
+    def select(self, sel):
+        return self
+
+    def eq(self, col, val):
+        self._id = val
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        row = self.sb.rows.get(self._id)
+        if self._payload is not None:
+            row.update(self._payload)
+            return _Resp([dict(row)])
+        return _Resp(dict(row) if row else None)
+
+
+class FakeBucket:
+    def __init__(self, sb, name):
+        self.sb, self.name = sb, name
+
+    def list(self, d):
+        return []
+
+    def download(self, path):
+        self.sb.downloads.append(path)
+        return self.sb.original
+
+    def upload(self, key, data, opts=None):
+        self.sb.uploaded.append((key, data))
+
+    def create_signed_url(self, key, ttl):
+        return {"signedURL": f"https://signed.example/{key}"}
+
+
+class FakeStorage:
+    def __init__(self, sb):
+        self.sb = sb
+
+    def from_(self, name):
+        return FakeBucket(self.sb, name)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.original = _pdf()
+        self.rows = {"u1": {"id": "u1", "owner_id": "t1", "storage_path": "t1/u1.pdf", "ocr_boxes": BOXES,
+                            "verdicts": {"q1": "correct", "q2": "incorrect", "q3": "correct"}}}
+        self.downloads, self.uploaded = [], []
+        self.storage = FakeStorage(self)
+
+    def table(self, name):
+        return FakeTable(self)
+
+
+@pytest.fixture()
+def client(monkeypatch, tmp_path):
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("PDF_REGEN_CACHE_DIR", str(tmp_path / "stamped"))
+    monkeypatch.setattr(pdf_regen, "_stats", pdf_regen._Stats())
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    monkeypatch.setattr(app_mod, "infer_regions", lambda boxes: REGIONS)
+    fake = FakeSupabase()
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    return TestClient(app_mod.app), fake
+
+
+def test_override_restamps_only_changed_marks_and_skips_noop(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+
+    r = c.post("/api/uploads/u1/pdf", headers=h).json()
+    assert r["mode"] == "full" and r["path"] == "graded/t1/u1.pdf"
+    assert set(r["timings_ms"]) >= {"download_ms", "stamp_ms", "upload_ms", "total_ms"}
+    first = fake.uploaded[-1][1]
+    assert _marks(first) == [(1, "graderai:q1", "correct"), (1, "graderai:q2", "incorrect"), (2, "graderai:q3", "correct")]
+
+    assert c.post("/api/uploads/u1/verdicts", json={"per_question": {"q1": "correct", "q2": "correct", "q3": "correct"}},
+                  headers=h).status_code == 200
+    r = c.post("/api/uploads/u1/pdf", headers=h).json()
+    assert r["mode"] == "incremental" and r["changed"] == ["q2"]
+    assert "download_ms" not in r["timings_ms"]
+    second = fake.uploaded[-1][1]
+    assert second.startswith(first)  # appended update, original stamp untouched
+    assert _marks(second) == [(1, "graderai:q1", "correct"), (1, "graderai:q2", "correct"), (2, "graderai:q3", "correct")]
+
+    r = c.post("/api/uploads/u1/pdf", headers=h).json()
+    assert r["mode"] == "unchanged" and "upload_ms" not in r["timings_ms"]
+    assert len(fake.uploaded) == 2
+    assert fake.downloads == ["t1/u1.pdf"]
+
+    stats = c.get("/api/debug/pdf_regen").json()["modes"]
+    assert {m: s["count"] for m, s in stats.items()} == {"full": 1, "incremental": 1, "unchanged": 1}
+
+
+def test_new_ocr_boxes_force_a_full_rebuild(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+    assert c.post("/api/uploads/u1/pdf", headers=h).json()["mode"] == "full"
+    fake.rows["u1"]["ocr_boxes"] = {**BOXES, "rerun": 1}
+    import backend.app as app_mod
+    app_mod.uploads_repo.invalidate("u1")
+    assert c.post("/api/uploads/u1/pdf", headers=h).json()["mode"] == "full"
+    assert len(fake.downloads) == 2
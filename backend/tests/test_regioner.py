@@ -0,0 +1,142 @@
+import time
+
+from backend.regioner import answer_sections, infer_regions
+from backend.services.grader import parse_questions
+from backend.stamper import verdict_map
+
+
+def _line(text, y, x=100, w=800, h=40):
+    return {"text": text, "bbox": [x, y, w, h]}
+
+
+def _packet():
+    return {
+        "unit": "pixel",
+        "pages": [
+            {"number": 1, "width": 1700, "height": 2200, "lines": [
+                _line("Name: Ada", 100),
+                _line("1. Add 2 + 2", 200),
+                _line("4", 260),
+                _line("Q2: Name a prime", 500),
+                _line("7", 560),
+                _line("3) Explain", 1500),
+                _line("because", 1560),
+            ]},
+            {"number": 2, "width": 1700, "height": 2200, "lines": [
+                _line("continued", 100),
+                _line("4. Last one", 900),
+                _line("done", 960, w=400),
+            ]},
+        ],
+    }
+
+
+def test_regions_for_every_numbering_style_across_pages():
+    ocr = _packet()
+    regions = infer_regions(ocr)
+    text = "\n".join(ln["text"] for p in ocr["pages"] for ln in p["lines"])
+    ids = [q.id for q in parse_questions(text)]
+    assert ids == ["1", "2", "3", "4"]
+    assert set(ids) <= set(regions)
+    assert {"q5", "q6a", "q6b"} <= set(regions)
+
+    # runs from the anchor to just above the next anchor
+    assert regions["1"] == [(110, 200, 780, 290, 1)]
+    assert regions["2"][0][1:] == (500, 780, 990, 1)
+    # 3 continues onto page 2 up to question 4
+    assert [b[4] for b in regions["3"]] == [1, 2]
+    assert regions["3"][0][1] + regions["3"][0][3] == 1600
+    assert regions["3"][1][1:4:2] == (100, 790)
+    # the last question runs to the end of its page
+    assert regions["4"] == [(110, 900, 780, 100, 2)]
+
+
+def test_question_ids_filter_and_first_anchor_wins():
+    ocr = _packet()
+    ocr["pages"][1]["lines"].append(_line("1. a step inside the answer", 1100))
+    regions = infer_regions(ocr, question_ids=["1", "4"])
+    assert {"1", "4"} <= set(regions)
+    assert not {"2", "3"} & set(regions)
+    assert regions["1"][0][4] == 1
+    # 1 now extends to 4 (2 and 3 were filtered out)
+    assert [b[4] for b in regions["1"]] == [1, 2]
+
+
+def test_legacy_worksheet_regions_unchanged():
+    ocr = {"pages": [{"lines": [
+        _line("5. Solve", 100, x=50, w=1000),
+        _line("6. Draw", 600, x=50, w=1000),
+        _line("end", 1400, x=50, w=1000),
+    ]}]}
+    regions = infer_regions(ocr)
+    assert regions["q5"] == [(60, 150, 980, 440)]
+    assert regions["q6a"] == [(60, 650, 490, 780)]
+    assert regions["q6b"] == [(550, 650, 490, 780)]
+    assert regions["5"][0][4] == 1
+
+
+def test_no_lines_falls_back_to_page_size():
+    regions = infer_regions({"width": 1000, "height": 2000, "pages": [{"lines": []}]})
+    assert set(regions) == {"q5", "q6a", "q6b"}
+    assert regions["q5"] == [(10, 410, 980, 780)]
+
+
+def test_large_pages_stay_fast():
+    pages = []
+    for n in range(1, 6):
+        lines = []
+        for i in range(500):
+            text = f"{i // 25 + 1}. question" if i % 25 == 0 else f"answer line {i}"
+            lines.append(_line(text, 20 + i * 4, h=3))
+        pages.append({"number": n, "width": 1700, "height": 2200, "lines": lines})
+    t0 = time.perf_counter()
+    regions = infer_regions({"pages": pages})
+    elapsed = time.perf_counter() - t0
+    assert {str(i) for i in range(1, 21)} <= set(regions)
+    assert elapsed < 0.5
+
+
+def test_answer_sections_group_lines_by_question():
+    sections = answer_sections(_packet())
+    answers = {q: sections.text[a:b] for q, (a, b) in sections.spans.items()}
+    # the name line belongs to no question; page 2's first line continues q3
+    assert answers == {"1": "4", "2": "7", "3": "because\ncontinued", "4": "done"}
+    assert "Name: Ada" in sections.text
+    assert set(answer_sections(_packet(), ["2"]).spans) == {"2"}
+
+
+def test_answer_sections_single_line_answers_and_no_anchors():
+    ocr = {"pages": [{"number": 1, "lines": [_line("1) 42", 100), _line("2) (B)", 200)]}]}
+    sections = answer_sections(ocr)
+    assert {q: sections.text[a:b].strip() for q, (a, b) in sections.spans.items()} == {"1": "42", "2": "(B)"}
+    plain = answer_sections({"pages": [{"lines": [_line("just text", 100)]}]})
+    assert plain.spans == {} and plain.text == "just text"
+
+
+
+def test_numeric_answers_are_not_anchors():
+    lines = ["1. What is pi?", "3.14", "2. Meeting time?", "12:30", "3. Name a color", "blue"]
+    ocr = {"pages": [{"number": 1, "lines": [_line(t, 100 + 60 * i) for i, t in enumerate(lines)]}]}
+    expected = {"1": "3.14", "2": "12:30", "3": "blue"}
+    for ids in (None, ["1", "2", "3"]):
+        sections = answer_sections(ocr, ids)
+        assert {q: sections.text[a:b] for q, (a, b) in sections.spans.items()} == expected
+    assert set(infer_regions(ocr)) - {"q5", "q6a", "q6b"} == {"1", "2", "3"}
+
+
+def test_numbered_line_in_an_answer_does_not_take_a_later_question():
+    lines = ["1. List the steps", "3) add tea", "2. Why", "because", "3. When", "now"]
+    ocr = {"pages": [{"number": 1, "lines": [_line(t, 100 + 60 * i) for i, t in enumerate(lines)]}]}
+    for ids in (None, ["1", "2", "3"]):
+        sections = answer_sections(ocr, ids)
+        answers = {q: sections.text[a:b] for q, (a, b) in sections.spans.items()}
+        assert answers == {"1": "3) add tea", "2": "because", "3": "now"}
+
+def test_verdict_map_accepts_grader_items():
+    items = [
+        {"question_id": "1", "correct": True, "score": 1, "max_score": 1},
+        {"question_id": "2", "correct": False, "score": 0.5, "max_score": 1},
+        {"question_id": "3", "correct": False, "score": 0, "max_score": 1},
+    ]
+    assert verdict_map(items) == {"1": "correct", "2": "partial", "3": "incorrect"}
+    assert verdict_map({"q5": "correct"}) == {"q5": "correct"}
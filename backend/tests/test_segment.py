@@ -0,0 +1,53 @@
+import importlib
+
+from PIL import Image, ImageDraw
+
+from backend.ocr.segment import crop_lines, find_text_lines
+
+
+def _page():
+    im = Image.new("L", (400, 300), 255)
+    d = ImageDraw.Draw(im)
+    d.rectangle([20, 20, 300, 40], fill=0)     # line 1
+    d.rectangle([50, 100, 380, 125], fill=0)   # line 2
+    d.point((10, 70), fill=0)                  # speck between lines
+    return im
+
+
+def test_find_text_lines_boxes_in_order():
+    boxes = find_text_lines(_page(), pad=0)
+    assert boxes == [[20, 20, 281, 21], [50, 100, 331, 26]]
+
+
+def test_find_text_lines_blank_page_falls_back_to_full():
+    assert find_text_lines(Image.new("L", (30, 20), 255)) == [[0, 0, 30, 20]]
+
+
+def test_crop_lines_sizes():
+    boxes = find_text_lines(_page(), pad=0)
+    crops = crop_lines(_page(), boxes)
+    assert [c.size for c in crops] == [(281, 21), (331, 26)]
+
+
+def test_trocr_lines_mode_emits_ocr_boxes(monkeypatch):
+    tl = importlib.import_module("backend.ocr.providers.trocr_local")
+    monkeypatch.setattr(tl.TrOCRLocal, "_pipelines", {})
+    monkeypatch.setenv("OCR_SEGMENT", "lines")
+    monkeypatch.delenv("OCR_MODE", raising=False)
+
+    def fake_pipeline(*a, **k):
+        def _pipe(images, batch_size=None):
+            return [[{"generated_text": f"w{im.size[0]}"}] for im in images]
+        return _pipe
+
+    monkeypatch.setattr(tl, "pipeline", fake_pipeline)
+    monkeypatch.setattr(tl, "iter_pages", lambda b, f: iter([(1, _page().convert("RGB"))]))
+
+    text, meta = tl.TrOCRLocal().run(file_bytes=b"x", filename="p.png")
+    lines = meta["ocr_boxes"]["pages"][0]["lines"]
+    assert len(lines) == 2 == meta["lines"]
+    assert text == "\n".join(ln["text"] for ln in lines)
+    assert all(len(ln["bbox"]) == 4 for ln in lines)
+
+    regioner = importlib.import_module("backend.regioner")
+    assert set(regioner.infer_regions(meta["ocr_boxes"])) >= {"q5", "q6a", "q6b"}
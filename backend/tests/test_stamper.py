@@ -0,0 +1,76 @@
+import io
+
+import fitz
+from PIL import Image
+
+from backend.stamper import MARK_PREFIX, stamp_pdf
+
+
+def _pdf(n_pages, size=(612, 792)):
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page(width=size[0], height=size[1])
+        page.insert_text((72, 72), f"page {i + 1} " * 30)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def _marks(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        out = []
+        for page in doc:
+            for a in page.annots():
+                out.append((page.number + 1, a.info["subject"], a.info["content"], a.rect))
+        return out
+
+
+def test_pdf_pages_are_kept_and_marked_incrementally():
+    src = _pdf(3)
+    # OCR space: pages rasterized at 200 dpi -> 1700 x 2200 px
+    boxes = {"unit": "pixel", "pages": [{"number": n, "width": 1700, "height": 2200} for n in (1, 2, 3)]}
+    regions = {"q1": [(100, 200, 400, 300)], "q2": [(850, 1100, 400, 300, 3)], "q3": [(0, 0, 10, 10, 9)]}
+    out = stamp_pdf(src, regions, {"q1": "correct", "q2": "incorrect", "q3": "correct"}, boxes)
+
+    # original bytes untouched, marks appended as an incremental update
+    assert out.startswith(src)
+    assert len(out) - len(src) < 8 * 1024
+    marks = _marks(out)
+    assert [(p, s, c) for p, s, c, _ in marks] == [(1, f"{MARK_PREFIX}q1", "correct"), (3, f"{MARK_PREFIX}q2", "incorrect")]
+    # q2 centre (1050, 1250) px -> (378, 450) pt
+    r = marks[1][3]
+    assert abs((r.x0 + r.x1) / 2 - 378) < 2 and abs((r.y0 + r.y1) / 2 - 450) < 2
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        assert doc.page_count == 3
+        assert "page 3" in doc[2].get_text()
+
+
+def test_regions_without_verdicts_are_not_marked():
+    src = _pdf(1)
+    assert _marks(stamp_pdf(src, {"q5": [(10, 10, 50, 50)]}, {})) == []
+
+
+def test_image_submission_is_wrapped_without_rerendering():
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 1000), "white").save(buf, format="PNG")
+    out = stamp_pdf(buf.getvalue(), {"q5": [(400, 500, 100, 100)]}, {"q5": "correct"})
+    with fitz.open(stream=out, filetype="pdf") as doc:
+        page = doc[0]
+        assert page.get_images()  # still the embedded image, not a re-encode of the page
+        (annot,) = list(page.annots())
+        cx = (annot.rect.x0 + annot.rect.x1) / 2 / page.rect.width
+        assert abs(cx - 450 / 800) < 0.02
+
+
+def test_rotated_page_marks_land_where_ocr_saw_them():
+    doc = fitz.open()
+    doc.new_page(width=600, height=800).set_rotation(90)
+    src = doc.tobytes()
+    doc.close()
+    # displayed page is 800 x 600 pt; OCR at 1 px per pt
+    out = stamp_pdf(src, {"q1": [(50, 50, 100, 100)]}, {"q1": "incorrect"}, {"pages": [{"number": 1, "width": 800}]})
+    with fitz.open(stream=out, filetype="pdf") as d:
+        pix = d[0].get_pixmap(dpi=72)
+        red = [(x, y) for y in range(0, pix.height, 4) for x in range(0, pix.width, 4)
+               if pix.pixel(x, y)[0] > 150 and pix.pixel(x, y)[1] < 80]
+    assert red and all(50 <= x <= 150 and 50 <= y <= 150 for x, y in red)
@@ -0,0 +1,102 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db, queries):
+        self.db, self.queries = db, queries
+        self._ids = None
+
+    def select(self, sel):
+        return self
+
+    def in_(self, col, vals):
+        self._ids = list(vals)
+        return self
+
+    def eq(self, col, val):
+        return self.in_(col, [val])
+
+    def execute(self):
+        self.queries.append(self._ids)
+        return _Resp([dict(self.db[i]) for i in self._ids if i in self.db])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name):
+        return FakeTable(self.rows, self.queries)
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("DEV_MODE", "0")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    fake = FakeSupabase({
+        "a": {"id": "a", "owner_id": "t1", "extracted_text": "  hello  ", "ocr_completed_at": "x"},
+        "b": {"id": "b", "owner_id": "t1", "ocr_started_at": "x"},
+        "c": {"id": "c", "owner_id": "t1", "ocr_error": "timeout", "ocr_started_at": "x"},
+        "d": {"id": "d", "owner_id": "t1"},
+        "e": {"id": "e", "owner_id": "someone-else", "ocr_completed_at": "x"},
+    })
+    app_mod.supabase = fake
+    return TestClient(app_mod.app), fake, app_mod
+
+
+def test_batch_status_one_query_same_contract(client):
+    c, fake, _ = client
+    r = c.post("/api/ocr/status:batch", json={"upload_ids": ["a", "b", "c", "d", "e", "zz", "a"]},
+               headers={"X-Owner-Id": "t1"})
+    assert r.status_code == 200
+    assert fake.queries == [["a", "b", "c", "d", "e", "zz"]]
+    assert r.json() == {
+        "statuses": {
+            "a": {"status": "done", "text_len": 5},
+            "b": {"status": "processing", "text_len": 0},
+            "c": {"status": "failed", "text_len": 0, "error": "timeout"},
+            "d": {"status": "pending", "text_len": 0},
+        },
+        "not_found": ["e", "zz"],
+    }
+
+
+def test_batch_status_matches_single_endpoint(client):
+    c, _, _ = client
+    # the single endpoint goes through the same _derive_status
+    batch = c.post("/api/ocr/status:batch", json={"upload_ids": ["a", "c"]}, headers={"X-Owner-Id": "t1"}).json()
+    for uid in ("a", "c"):
+        single = c.get(f"/api/ocr/status/{uid}", headers={"X-Owner-Id": "t1"}).json()
+        assert batch["statuses"][uid] == single
+
+
+def test_batch_status_etag_round_trip(client):
+    c, fake, _ = client
+    body = {"upload_ids": ["a", "b"]}
+    h = {"X-Owner-Id": "t1"}
+    r1 = c.post("/api/ocr/status:batch", json=body, headers=h)
+    etag = r1.headers["etag"]
+    r2 = c.post("/api/ocr/status:batch", json=body, headers={**h, "If-None-Match": etag})
+    assert r2.status_code == 304 and r2.headers["etag"] == etag and r2.content == b""
+
+    fake.rows["b"]["ocr_completed_at"] = "y"
+    r3 = c.post("/api/ocr/status:batch", json=body, headers={**h, "If-None-Match": etag})
+    assert r3.status_code == 200 and r3.headers["etag"] != etag
+    assert r3.json()["statuses"]["b"]["status"] == "done"
+
+
+def test_batch_status_chunks_large_requests(client, monkeypatch):
+    c, fake, app_mod = client
+    monkeypatch.setattr(app_mod, "STATUS_BATCH_CHUNK", 2)
+    c.post("/api/ocr/status:batch", json={"upload_ids": ["a", "b", "c", "d", "e"]}, headers={"X-Owner-Id": "t1"})
+    assert fake.queries == [["a", "b"], ["c", "d"], ["e"]]
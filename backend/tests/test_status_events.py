@@ -0,0 +1,172 @@
+import asyncio
+import importlib
+import json
+
+from backend.services import events
+from backend.services.events import StatusHub
+
+
+def _frames(chunks):
+    """Parse SSE chunks into (event, id, data) tuples, skipping comments/retry."""
+    out = []
+    for chunk in chunks:
+        fields = dict(
+            line.split(": ", 1) for line in chunk.strip().splitlines() if ": " in line and not line.startswith(":")
+        )
+        if "event" in fields:
+            out.append((fields["event"], int(fields["id"]), json.loads(fields["data"])))
+    return out
+
+
+async def _never():
+    return False
+
+
+def test_publish_needs_known_owner_and_maps_status():
+    hub = StatusHub()
+    assert hub.publish("u1", {"ocr_status": "running"}) is None  # owner unknown
+    ev = hub.publish("u1", {"ocr_status": "running"}, owner_id="t1")
+    assert (ev["id"], ev["status"], ev["owner_id"]) == (1, "processing", "t1")
+    # owner is remembered for later writes
+    ev = hub.publish("u1", {"ocr_status": "done", "extracted_text": " hi "})
+    assert (ev["status"], ev["text_len"]) == ("done", 2)
+
+
+
+def test_known_owners_are_bounded():
+    hub = StatusHub(owners_max=2)
+    for uid in ("u1", "u2", "u3"):
+        hub.publish(uid, {"ocr_status": "running"}, owner_id="t1")
+    assert hub.stats()["known_uploads"] == 2
+    assert hub.publish("u1", {"ocr_status": "done"}) is None  # least recently published: forgotten
+    assert hub.publish("u3", {"ocr_status": "done"})["owner_id"] == "t1"
+
+def test_stream_delivers_live_events_for_owner_only():
+    hub = StatusHub()
+
+    async def main():
+        gen = events.stream(hub, "t1", None, _never, heartbeat=5)
+        assert await gen.__anext__() == "retry: 3000\n\n"
+        nxt = asyncio.ensure_future(gen.__anext__())
+        await asyncio.sleep(0)
+        hub.publish("other", {"ocr_status": "running"}, owner_id="t2")
+        # publishing from another thread is delivered on the subscriber's loop
+        await asyncio.to_thread(hub.publish, "u1", {"ocr_status": "error", "ocr_error": "boom"}, "t1")
+        chunk = await asyncio.wait_for(nxt, 2)
+        assert hub.stats()["subscribers"] == 1
+        await gen.aclose()
+        assert hub.stats()["subscribers"] == 0
+        return chunk
+
+    [(kind, eid, data)] = _frames([asyncio.run(main())])
+    assert kind == "status" and eid == 2
+    assert (data["upload_id"], data["status"], data["error"]) == ("u1", "failed", "boom")
+
+
+def test_resume_from_last_event_id_and_reset_when_evicted():
+    hub = StatusHub(buffer_size=3)
+    for i in range(5):
+        hub.publish(f"u{i}", {"ocr_status": "done"}, owner_id="t1")
+
+    async def first_frames(last_id, n):
+        gen = events.stream(hub, "t1", last_id, _never, heartbeat=5)
+        chunks = [await gen.__anext__() for _ in range(n)]
+        await gen.aclose()
+        return _frames(chunks)
+
+    # ids 3..5 are buffered: resuming after 3 replays 4 and 5
+    assert [(k, i) for k, i, _ in asyncio.run(first_frames(3, 3))] == [("status", 4), ("status", 5)]
+    # id 1 was evicted: client is told to refetch, then gets what's left
+    frames = asyncio.run(first_frames(1, 5))
+    assert frames[0][0] == "reset"
+    assert [i for k, i, _ in frames[1:]] == [3, 4, 5]
+    # an id from before a server restart also resets
+    assert asyncio.run(first_frames(99, 2))[0][0] == "reset"
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+        self._where, self._payload = {}, None
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def execute(self):
+        row = self.db[self._where["id"]]
+        row.update(self._payload)
+        return _Resp([dict(row)])
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def table(self, name):
+        return FakeTable(self.rows)
+
+
+def test_update_upload_sr_publishes_ocr_status_writes():
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    app_mod.supabase_sr = FakeSupabase({"u9": {"id": "u9", "owner_id": "t9"}})
+    before = events.hub.last_id()
+
+    app_mod._update_upload_sr("u9", {"ocr_meta": {}})  # no ocr_status: nothing published
+    assert events.hub.last_id() == before
+    app_mod._update_upload_sr("u9", {"ocr_status": "running", "ocr_error": None})
+    assert events.hub.last_id() == before + 1
+    ev = list(events.hub._buffer)[-1]
+    assert (ev["upload_id"], ev["owner_id"], ev["status"]) == ("u9", "t9", "processing")
+
+
+def test_events_endpoint_requires_owner():
+    from fastapi.testclient import TestClient
+    import backend.app as app_mod
+
+    assert TestClient(app_mod.app).get("/api/ocr/events").status_code == 401
+
+
+def test_worker_status_writes_reach_the_app_through_the_job_store(tmp_path, monkeypatch):
+    from backend.services.jobs import SQLiteJobStore
+
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.add_event("old", {"ocr_status": "done"}, "t1")  # before the app started: not replayed
+    # worker process: status writes are recorded in the store
+    monkeypatch.setattr(events, "hub", StatusHub())
+    events.forward_to(store.add_event)
+    try:
+        events.publish("u1", {"ocr_status": "done", "extracted_text": " hi ", "ocr_meta": {}}, [{"owner_id": "t1"}])
+    finally:
+        events.forward_to(None)
+    [row] = store.events_since(1)
+    assert (row["upload_id"], row["owner_id"], row["fields"]) == ("u1", "t1", {"ocr_status": "done", "text_len": 2})
+
+    # app process: relay republishes what workers record from now on
+    app_hub = StatusHub()
+    monkeypatch.setattr(events, "hub", app_hub)
+    dropped = []
+
+    async def main():
+        sub, _, _ = app_hub.subscribe("t1")
+        task = asyncio.create_task(events.relay(store, interval=0.01, on_event=lambda r: dropped.append(r["upload_id"])))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(store.add_event, "u2", {"ocr_status": "running"}, "t1")
+        ev = await asyncio.wait_for(sub.queue.get(), 2)
+        task.cancel()
+        app_hub.unsubscribe(sub)
+        return ev
+
+    ev = asyncio.run(main())
+    assert (ev["upload_id"], ev["status"]) == ("u2", "processing")
+    assert dropped == ["u2"]
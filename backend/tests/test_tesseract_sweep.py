@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+
+from backend.ocr import tesseract as tess
+
+
+def _data(words, conf):
+    n = len(words)
+    return {
+        "text": words, "conf": [str(conf)] * n, "page_num": [1] * n, "block_num": [1] * n,
+        "par_num": [1] * n, "line_num": list(range(1, n + 1)), "left": [0] * n,
+        "top": [i * 10 for i in range(n)], "width": [5] * n, "height": [8] * n,
+    }
+
+
+def test_sweep_early_exits_on_confident_config(monkeypatch):
+    release = threading.Event()
+
+    def fake(im, config, output_type):
+        if "--psm 6" in config:
+            return _data(["clear", "answer"], 96)
+        release.wait(5)  # the other configs are slow
+        return _data(["slow"], 40)
+
+    monkeypatch.setattr(pytesseract, "image_to_data", fake)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        out = tess.sweep(object(), executor=ex, min_conf=90, parallel=4)
+        release.set()
+
+    assert out["text"] == "clear\nanswer"
+    assert out["meta"]["chosen"] == "--oem 1 --psm 6 -l eng"
+    assert out["meta"]["early_exit"] is True
+    assert list(out["meta"]["timings_ms"]) == ["--oem 1 --psm 6 -l eng"]
+    assert [ln["bbox"] for ln in out["lines"]] == [[0, 0, 5, 8], [0, 10, 5, 8]]
+
+
+def test_sweep_without_confident_config_keeps_longest(monkeypatch):
+    texts = {"7": ["a"], "11": ["a", "bb", "ccc"], "6": ["a", "bb"], "13": []}
+
+    def fake(im, config, output_type):
+        psm = config.split("--psm ")[1].split()[0]
+        if psm == "13":
+            raise RuntimeError("boom")
+        return _data(texts[psm], 50)
+
+    monkeypatch.setattr(pytesseract, "image_to_data", fake)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        out = tess.sweep(object(), executor=ex, min_conf=90)
+
+    assert out["meta"]["chosen"] == "--oem 1 --psm 11 -l eng"
+    assert out["meta"]["early_exit"] is False
+    assert set(out["meta"]["timings_ms"]) == {f"--oem 1 --psm {p} -l eng" for p in ("7", "11", "6")}
+    assert out["meta"]["errors"] == ["--oem 1 --psm 13 -l eng: boom"]
+
+
+def test_early_exit_skips_configs_not_yet_started(monkeypatch):
+    calls = []
+
+    def fake(im, config, output_type):
+        calls.append(config)
+        return _data(["clear"], 96) if "--psm 6" in config else _data(["meh"], 40)
+
+    monkeypatch.setattr(pytesseract, "image_to_data", fake)
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        out = tess.sweep(object(), executor=ex, min_conf=90, parallel=1)
+
+    # the block config runs first; once it clears the threshold nothing else runs
+    assert calls == ["--oem 1 --psm 6 -l eng"]
+    assert out["meta"]["early_exit"] is True and out["meta"]["submitted"] == 1
+    assert len(out["meta"]["skipped"]) == 3
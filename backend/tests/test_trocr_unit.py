@@ -53,3 +53,73 @@ def test_bytes_to_image_pdf(monkeypatch):
     assert isinstance(out, Image.Image)
     assert out.size == (3, 2)
 
+
+
+class _FakeBatchPipe:
+    """Echoes a per-image label; records batch sizes it was called with."""
+
+    def __init__(self, labels, calls):
+        self.labels = labels
+        self.calls = calls
+
+    def __call__(self, images, batch_size=None):
+        if isinstance(images, list):
+            self.calls.append(batch_size)
+            return [[{"generated_text": self.labels[im.size]}] for im in images]
+        return [{"generated_text": self.labels[images.size]}]
+
+
+def _jpg(size):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (255, 255, 255)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_run_batch_matches_single_path(monkeypatch):
+    tl = importlib.import_module("backend.ocr.providers.trocr_local")
+    labels = {(4, 1): "alpha", (5, 1): "beta", (6, 1): "gamma"}
+    calls = []
+    monkeypatch.setattr(tl, "pipeline", lambda *a, **k: _FakeBatchPipe(labels, calls))
+    monkeypatch.setattr(tl.TrOCRLocal, "_pipelines", {})
+    monkeypatch.delenv("OCR_MODE", raising=False)
+
+    prov = tl.TrOCRLocal(default_model=tl.HANDWRITTEN, batch_size=2)
+    items = [(_jpg((4, 1)), "a.jpg"), Image.new("L", (5, 1)), (_jpg((6, 1)), "c.jpg")]
+    out = prov.run_batch(items)
+
+    assert calls == [2]
+    assert [t for t, _ in out["results"]] == ["alpha", "beta", "gamma"]
+    single_text, single_meta = prov.run(file_bytes=_jpg((4, 1)), filename="a.jpg")
+    batch_text, batch_meta = out["results"][0]
+    assert batch_text == single_text
+    assert set(batch_meta) == set(single_meta)
+    assert batch_meta["tried"] == single_meta["tried"]
+    assert out["meta"]["count"] == 3
+    assert out["meta"]["batch_size"] == 2
+    assert out["meta"]["images_per_sec"] > 0
+
+
+def test_run_batch_auto_mode_falls_back_per_item(monkeypatch):
+    tl = importlib.import_module("backend.ocr.providers.trocr_local")
+    monkeypatch.setattr(tl.TrOCRLocal, "_pipelines", {})
+    monkeypatch.setenv("OCR_MODE", "auto")
+    seen = []
+
+    def fake_pipeline(task, model, device):
+        text = {tl.HANDWRITTEN: {(4, 1): "hand written", (5, 1): "x"},
+                tl.PRINTED: {(4, 1): "unused", (5, 1): "printed text"}}[model]
+
+        def _pipe(images, batch_size=None):
+            seen.append((model, len(images)))
+            return [[{"generated_text": text[im.size]}] for im in images]
+        return _pipe
+
+    monkeypatch.setattr(tl, "pipeline", fake_pipeline)
+    prov = tl.TrOCRLocal(default_model=tl.HANDWRITTEN)
+    out = prov.run_batch([Image.new("RGB", (4, 1)), Image.new("RGB", (5, 1))])
+
+    # only the item with a too-short result is re-run on the second model
+    assert seen == [(tl.HANDWRITTEN, 2), (tl.PRINTED, 1)]
+    (t0, m0), (t1, m1) = out["results"]
+    assert t0 == "hand written" and [x["model"] for x in m0["tried"]] == [tl.HANDWRITTEN]
+    assert t1 == "printed text" and [x["model"] for x in m1["tried"]] == [tl.HANDWRITTEN, tl.PRINTED]
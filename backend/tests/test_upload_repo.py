@@ -0,0 +1,131 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.services.uploads import UploadRepository
+
+
+class _Resp:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeTable:
+    def __init__(self, db, log):
+        self.db, self.log = db, log
+        self._where = {}
+        self._payload = None
+
+    def select(self, sel):
+        self.log.append(("select", sel))
+        return self
+
+    def eq(self, col, val):
+        self._where[col] = val
+        return self
+
+    def maybe_single(self):
+        return self
+
+    def update(self, payload):
+        self._payload = payload
+        return self
+
+    def execute(self):
+        uid = self._where.get("id")
+        if self._payload is not None:
+            self.db[uid].update(self._payload)
+            return _Resp([dict(self.db[uid])])
+        row = self.db.get(uid)
+        return _Resp(dict(row) if row else None)
+
+
+class FakeSupabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.log = []
+
+    def table(self, name):
+        return FakeTable(self.rows, self.log)
+
+    def selects(self):
+        return [e for e in self.log if e[0] == "select"]
+
+
+def test_read_through_copies_and_expiry(monkeypatch):
+    fake = FakeSupabase({"u1": {"id": "u1", "owner_id": "t1", "ocr_boxes": [{"text": "a"}]}})
+    repo = UploadRepository(lambda: fake, ttl=60)
+
+    row = repo.get("u1")
+    row["ocr_boxes"].append({"text": "mutated"})
+    again = repo.get("u1")
+    assert again["ocr_boxes"] == [{"text": "a"}]
+    assert fake.selects() == [("select", "*")]
+    assert repo.get("missing") is None
+    assert repo.stats()["hits"] == 1 and repo.stats()["misses"] == 2
+
+    # expired rows are refetched
+    import backend.services.uploads as uploads
+    real = uploads.time.monotonic
+    monkeypatch.setattr(uploads.time, "monotonic", lambda: real() + 120)
+    repo.get("u1")
+    assert len(fake.selects()) == 3
+
+
+
+def test_counters_stay_consistent_across_threads():
+    from concurrent.futures import ThreadPoolExecutor
+
+    fake = FakeSupabase({f"u{i}": {"id": f"u{i}"} for i in range(8)})
+    repo = UploadRepository(lambda: fake, ttl=60)
+    with ThreadPoolExecutor(8) as ex:
+        list(ex.map(lambda n: repo.get(f"u{n % 8}"), range(2000)))
+    st = repo.stats()
+    assert st["hits"] + st["misses"] == 2000
+    assert st["misses"] == len(fake.selects())
+
+def test_write_through_and_invalidate():
+    fake = FakeSupabase({"u1": {"id": "u1", "ocr_status": "queued"}})
+    repo = UploadRepository(lambda: fake, ttl=60)
+    repo.get("u1")
+    repo.write_through("u1", {"ocr_status": "done", "extracted_text": "x"})
+    assert repo.get("u1")["ocr_status"] == "done"
+    repo.invalidate("u1")
+    assert repo.get("u1")["ocr_status"] == "queued"
+    assert len(fake.selects()) == 2
+
+    off = UploadRepository(lambda: fake, ttl=0)
+    off.get("u1")
+    off.get("u1")
+    assert off.stats()["hits"] == 0
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setenv("DEV_MODE", "0")
+    monkeypatch.setenv("UPLOAD_CACHE_TTL_S", "30")
+    import backend.app as app_mod
+    importlib.reload(app_mod)
+    fake = FakeSupabase({"u1": {"id": "u1", "owner_id": "t1", "verdicts": {}, "extracted_text": "1) 2+2=4"}})
+    app_mod.supabase = fake
+    app_mod.supabase_sr = fake
+    return TestClient(app_mod.app), fake
+
+
+def test_endpoints_share_one_select_and_see_writes(client):
+    c, fake = client
+    h = {"X-Owner-Id": "t1"}
+    assert c.post("/api/uploads/u1/verdicts", json={"per_question": {"1": "correct"}}, headers=h).status_code == 200
+    r = c.get("/api/uploads/u1/ocr", headers=h)
+    assert r.status_code == 200
+    assert c.post("/api/uploads/u1/verdicts", json={"per_question": {"1": "partial"}}, headers=h).status_code == 200
+    assert len(fake.selects()) == 1
+    # the verdicts update was written through to the cached row
+    assert fake.rows["u1"]["verdicts"] == {"1": "partial"}
+
+    stats = c.get("/api/debug/uploads_cache").json()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["hit_rate"] == pytest.approx(0.667)
+
+    assert c.get("/api/uploads/u1/ocr", headers={"X-Owner-Id": "intruder"}).status_code == 403
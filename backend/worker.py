@@ -0,0 +1,148 @@
+"""
+Background job worker (JOBS_MODE=queue).
+
+    python -m backend.worker [--concurrency 2] [--kinds ocr,grade]
+
+Claims jobs from the queue in backend.services.jobs, runs the matching
+handler from backend.app.JOB_HANDLERS, heartbeats the lease while the
+handler works and records completion or failure. Run as many worker
+processes as the providers can take; they coordinate through the store.
+Status writes are recorded in the store too, so the app can push them to
+its /api/ocr/events subscribers.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .services import events, jobs
+
+logger = logging.getLogger("backend.worker")
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+OnFailure = Callable[[Dict[str, Any], str, bool], None]
+
+
+def _error_text(e: BaseException) -> str:
+    return str(getattr(e, "detail", None) or e or type(e).__name__)
+
+
+async def _heartbeat(store: jobs.JobStore, job_id: str, worker_id: str, lease_s: float) -> None:
+    while True:
+        await asyncio.sleep(lease_s / 3)
+        if not await asyncio.to_thread(store.heartbeat, job_id, worker_id, lease_s):
+            logger.warning("lost lease job=%s worker=%s", job_id, worker_id)
+            return
+
+
+async def process_one(
+    store: jobs.JobStore,
+    handlers: Dict[str, Handler],
+    worker_id: str,
+    *,
+    on_failure: Optional[OnFailure] = None,
+    lease_s: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """Claim and run one job; returns the job's final row, or None if idle."""
+    lease_s = jobs.lease_seconds() if lease_s is None else lease_s
+    job = await asyncio.to_thread(store.claim, worker_id, list(handlers), lease_s)
+    if job is None:
+        return None
+    logger.info("job start id=%s kind=%s upload=%s attempt=%s", job["id"], job["kind"], job.get("upload_id"), job["attempts"])
+    hb = asyncio.create_task(_heartbeat(store, job["id"], worker_id, lease_s))
+    try:
+        result = await handlers[job["kind"]](job)
+    except Exception as e:
+        err = _error_text(e)
+        # 4xx-style errors (missing row, bad input) won't get better on retry
+        retry = int(getattr(e, "status_code", 500) or 500) >= 500
+        released = await asyncio.to_thread(store.fail, job["id"], worker_id, err, retry=retry)
+        final = (released or {}).get("status") == jobs.FAILED
+        logger.warning("job failed id=%s final=%s: %s", job["id"], final, err)
+        if on_failure is not None:
+            on_failure(job, err, final)
+        return released
+    finally:
+        hb.cancel()
+    await asyncio.to_thread(store.complete, job["id"], worker_id, result if isinstance(result, dict) else {"result": result})
+    logger.info("job done id=%s", job["id"])
+    return await asyncio.to_thread(store.get, job["id"])
+
+
+async def run(
+    store: jobs.JobStore,
+    handlers: Dict[str, Handler],
+    *,
+    concurrency: int = 1,
+    poll_interval: float = 1.0,
+    on_failure: Optional[OnFailure] = None,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
+    stop = stop or asyncio.Event()
+    base = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    async def loop(slot: int) -> None:
+        worker_id = f"{base}:{slot}"
+        while not stop.is_set():
+            try:
+                job = await process_one(store, handlers, worker_id, on_failure=on_failure)
+            except Exception:
+                logger.exception("worker loop error")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    await asyncio.gather(*(loop(i) for i in range(max(1, concurrency))))
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="GraderAI background job worker")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("JOBS_CONCURRENCY") or 2))
+    ap.add_argument("--kinds", default="", help="comma-separated job kinds (default: all)")
+    ap.add_argument("--poll-interval", type=float, default=1.0)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from . import app as app_mod
+
+    app_mod.init_clients()
+    store = jobs.get_store()
+    events.forward_to(store.add_event)
+    handlers = dict(app_mod.JOB_HANDLERS)
+    if args.kinds:
+        wanted = {k.strip() for k in args.kinds.split(",") if k.strip()}
+        handlers = {k: h for k, h in handlers.items() if k in wanted}
+
+    async def _main() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:  # Windows
+                pass
+        logger.info("worker started kinds=%s concurrency=%s db=%s", sorted(handlers), args.concurrency, jobs.default_db_path())
+        try:
+            await run(
+                store,
+                handlers,
+                concurrency=args.concurrency,
+                poll_interval=args.poll_interval,
+                on_failure=app_mod._job_failed,
+                stop=stop,
+            )
+        finally:
+            await app_mod.shared_http.aclose()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
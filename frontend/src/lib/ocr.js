@@ -36,6 +36,84 @@ export async function startOCR(uploadId, ownerIdParam) {
   return r.json();
 }
 
+/**
+ * Queue OCR for many uploads in one request (e.g. a whole class set).
+ * Resolves right away with { batch_id, total, status, ... }; follow progress
+ * with getOCRBatchStatus / pollOCRBatch.
+ */
+export async function startOCRBatch(uploadIds, ownerIdParam) {
+  if (!Array.isArray(uploadIds) || uploadIds.length === 0) {
+    throw new Error("uploadIds is required");
+  }
+  const ownerId = ownerIdParam || (await getOwnerId());
+
+  const r = await fetch(`${API_BASE}/api/ocr/batch`, {
+    method: "POST",
+    mode: "cors",
+    headers: {
+      "Content-Type": "application/json",
+      "x-owner-id": ownerId,
+    },
+    body: JSON.stringify({ upload_ids: uploadIds }),
+  });
+
+  if (!r.ok) {
+    let body;
+    try { body = await r.json(); } catch { body = await r.text().catch(() => ""); }
+    throw new Error(JSON.stringify({ status: r.status, body }));
+  }
+  return r.json();
+}
+
+/** Aggregate batch progress; pass withItems=true for per-upload states */
+export async function getOCRBatchStatus(batchId, withItems = false) {
+  if (!batchId) throw new Error("batchId is required");
+  const ownerId = await getOwnerId();
+
+  const r = await fetch(`${API_BASE}/api/ocr/batch/${batchId}${withItems ? "?items=1" : ""}`, {
+    method: "GET",
+    mode: "cors",
+    headers: {
+      "X-Owner-Id": ownerId,
+      "X-User-Id": ownerId,
+    },
+  });
+
+  if (!r.ok) {
+    let body;
+    try { body = await r.json(); } catch { body = await r.text().catch(() => ""); }
+    throw new Error(JSON.stringify({ status: r.status, body }));
+  }
+  return r.json();
+}
+
+/**
+ * Poll a batch until every upload is done or failed.
+ * Returns a stop() function to cancel polling.
+ */
+export function pollOCRBatch(batchId, onTick, intervalMs = 2000) {
+  let stopped = false;
+
+  (async function loop() {
+    try {
+      while (!stopped) {
+        const json = await getOCRBatchStatus(batchId);
+        if (typeof onTick === "function") onTick(json);
+        if (json.status === "done") break;
+        await new Promise((res) => setTimeout(res, intervalMs));
+      }
+    } catch (e) {
+      if (typeof onTick === "function") {
+        onTick({ status: "failed", error: String(e?.message || e) });
+      }
+    }
+  })();
+
+  return () => {
+    stopped = true;
+  };
+}
+
 /** One-shot status fetch */
 export async function getOCRStatus(uploadId) {
   if (!uploadId) throw new Error("uploadId is required");
@@ -59,13 +137,102 @@ export async function getOCRStatus(uploadId) {
 }
 
 /**
- * Poll status until done/failed.
- * Returns a stop() function to cancel polling.
+ * Statuses for many uploads in one request.
+ * Resolves { statuses: { [id]: { status, text_len, error? } }, not_found, etag }.
+ * Pass the previous etag to get { notModified: true } when nothing changed.
+ */
+export async function getOCRStatuses(uploadIds, etag) {
+  if (!Array.isArray(uploadIds) || uploadIds.length === 0) {
+    return { statuses: {}, not_found: [], etag: null };
+  }
+  const ownerId = await getOwnerId();
+
+  const r = await fetch(`${API_BASE}/api/ocr/status:batch`, {
+    method: "POST",
+    mode: "cors",
+    headers: {
+      "Content-Type": "application/json",
+      "X-Owner-Id": ownerId,
+      "X-User-Id": ownerId,
+      ...(etag ? { "If-None-Match": etag } : {}),
+    },
+    body: JSON.stringify({ upload_ids: uploadIds }),
+  });
+
+  if (r.status === 304) return { notModified: true, etag };
+  if (!r.ok) {
+    let body;
+    try { body = await r.json(); } catch { body = await r.text().catch(() => ""); }
+    throw new Error(JSON.stringify({ status: r.status, body }));
+  }
+  return { ...(await r.json()), etag: r.headers.get("ETag") };
+}
+
+/**
+ * Subscribe to OCR status transitions for all of the caller's uploads via
+ * Server-Sent Events. onEvent receives { upload_id, status, text_len?, error? };
+ * a { type: "reset" } event means transitions were missed and statuses should
+ * be refetched. Returns a close() function.
+ */
+export function subscribeOCREvents(ownerId, onEvent, onError) {
+  const url = `${API_BASE}/api/ocr/events?owner_id=${encodeURIComponent(ownerId)}`;
+  const es = new EventSource(url);
+  es.addEventListener("status", (ev) => {
+    try {
+      onEvent(JSON.parse(ev.data));
+    } catch {
+      /* ignore malformed frames */
+    }
+  });
+  es.addEventListener("reset", () => onEvent({ type: "reset" }));
+  if (typeof onError === "function") es.onerror = onError;
+  return () => es.close();
+}
+
+/**
+ * Watch status until done/failed: pushed over SSE when the browser supports
+ * EventSource, otherwise (or if the stream errors) by polling.
+ * Returns a stop() function.
  */
 export function pollOCR(uploadId, onTick, intervalMs = 1500) {
   let stopped = false;
+  let close = null;
 
-  (async function loop() {
+  const emit = (json) => {
+    if (typeof onTick === "function") onTick(json);
+    if (json.status !== "processing" && json.status !== "pending") {
+      stopped = true;
+      if (close) close();
+    }
+  };
+
+  (async function watch() {
+    if (typeof EventSource === "undefined") return loop();
+    try {
+      const ownerId = await getOwnerId();
+      close = subscribeOCREvents(
+        ownerId,
+        async (ev) => {
+          if (stopped) return;
+          if (ev.type === "reset") return emit(await getOCRStatus(uploadId));
+          if (ev.upload_id === uploadId) emit(ev);
+        },
+        () => {
+          // stream unavailable: fall back to polling
+          if (close) close();
+          close = null;
+          if (!stopped) loop();
+        },
+      );
+      // catch up on anything that happened before the stream opened
+      const first = await getOCRStatus(uploadId);
+      if (!stopped) emit(first);
+    } catch (e) {
+      if (!stopped) loop();
+    }
+  })();
+
+  async function loop() {
     try {
       const ownerId = await getOwnerId();
       // simple polling loop
@@ -96,9 +263,10 @@ export function pollOCR(uploadId, onTick, intervalMs = 1500) {
         onTick({ status: "failed", error: String(e?.message || e) });
       }
     }
-  })();
+  }
 
   return () => {
     stopped = true;
+    if (close) close();
   };
 }
@@ -0,0 +1,22 @@
+-- Migration: assignment answer keys (backend/services/answer_keys.py)
+-- One compiled key per assignment and rubric version; grading reads the
+-- most recently updated one.
+-- Safe to run multiple times due to IF NOT EXISTS
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS answer_keys (
+  assignment_id  uuid NOT NULL,
+  rubric_version text NOT NULL,
+  owner_id       uuid,
+  source_text    text NOT NULL,
+  questions      jsonb NOT NULL DEFAULT '[]'::jsonb,
+  keys           jsonb NOT NULL DEFAULT '[]'::jsonb,
+  created_at     timestamptz NOT NULL DEFAULT now(),
+  updated_at     timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (assignment_id, rubric_version)
+);
+
+CREATE INDEX IF NOT EXISTS answer_keys_latest_idx ON answer_keys (assignment_id, updated_at DESC);
+
+COMMIT;